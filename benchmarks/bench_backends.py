@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пула серверов ASR (src/backends.py).
+
+Поднимает N стендов (src/mock_server.py), каждый из которых одновременно
+обрабатывает не больше --capacity запросов (сверх - 503), и прогоняет
+задачи полного цикла (загрузка, ожидание, скачивание) через пул из 1, 2,
+..., N серверов. Печатает задачи в секунду и распределение задач по
+серверам: пропускная способность должна расти с числом серверов.
+
+Запуск:
+    python benchmarks/bench_backends.py --servers 3 --tasks 120
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from mock_server import start_in_thread  # noqa: E402
+
+
+def run(count, args, work_dir, file_path):
+    from backends import backend_count, make_asr_client
+
+    # Новые стенды на каждый замер: ограничители не переносят оценку между замерами
+    servers = [start_in_thread(latency=args.latency, max_concurrent=args.capacity,
+                               processing_time=args.processing_time) for _ in range(count)]
+    config_path = os.path.join(work_dir, f"backends_{count}.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({"routing": args.routing,
+                   "asr": [{"url": f"http://127.0.0.1:{server.server_port}", "token": f"token{i}"}
+                           for i, server in enumerate(servers)]}, f)
+    client = make_asr_client(f"http://127.0.0.1:{servers[0].server_port}", "bench",
+                             pool_size=args.threads, path=config_path)
+    threads = args.threads * backend_count(client)
+
+    def one(index):
+        task = client.start_transcribing(file_path)
+        if not task:
+            return False
+        try:
+            client.poller.wait(task["task_id"], timeout=120)
+        except Exception:
+            return False
+        return client.get_file(task["task_id"], os.path.join(work_dir, f"result_{count}_{index}.json"))
+
+    started = time.monotonic()
+    # Сообщения клиентов ("Файл сохранен", повторы) не выводятся
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(one, range(args.tasks)))
+    elapsed = time.monotonic() - started
+
+    spread = [server.RequestHandlerClass.state.stats()["tasks"] for server in servers]
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    ok = sum(1 for result in results if result)
+    print(f"серверов={count}  ok={ok}/{len(results)}  время={elapsed:6.2f} с  задач/с={ok / elapsed:6.1f}  "
+          f"по серверам={spread}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пула серверов ASR")
+    parser.add_argument("--servers", type=int, default=3, help="Максимум серверов в пуле (по умолчанию: 3)")
+    parser.add_argument("--tasks", type=int, default=120, help="Число задач на замер (по умолчанию: 120)")
+    parser.add_argument("--threads", type=int, default=16,
+                        help="Потоков на один сервер пула (по умолчанию: 16)")
+    parser.add_argument("--capacity", type=int, default=4,
+                        help="Сколько запросов стенд обрабатывает одновременно (по умолчанию: 4)")
+    parser.add_argument("--latency", type=float, default=0.1,
+                        help="Время обработки запроса на стенде в секундах (по умолчанию: 0.1)")
+    parser.add_argument("--processing-time", type=float, default=0.5,
+                        help="Время 'обработки' задачи на стенде в секундах (по умолчанию: 0.5)")
+    parser.add_argument("--routing", default="least", choices=["least", "weighted"],
+                        help="Выбор сервера для новой задачи (по умолчанию: least)")
+    parser.add_argument("--file-kb", type=int, default=64, help="Размер тестового файла в КБ (по умолчанию: 64)")
+    args = parser.parse_args()
+
+    print(f"Задач: {args.tasks}, стенд: {args.capacity} запросов одновременно, {args.latency} с на запрос, "
+          f"выбор сервера: {args.routing}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        file_path = os.path.join(work_dir, "bench.wav")
+        with open(file_path, "wb") as f:
+            f.write(os.urandom(args.file_kb * 1024))
+        for count in range(1, args.servers + 1):
+            run(count, args, work_dir, file_path)
+
+
+if __name__ == "__main__":
+    main()
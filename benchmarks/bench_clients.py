@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности клиентов ASR: синхронный путь
+(ASRClient, пул потоков) против асинхронного (AsyncASRClient, один поток).
+
+Поднимает локальный стенд (src/mock_server.py) в отдельном процессе и
+прогоняет N задач полного цикла: загрузка небольшого файла, ожидание
+статуса, скачивание результата. Печатает задачи в секунду и число
+потоков процесса.
+
+Запуск:
+    python benchmarks/bench_clients.py --tasks 300 --threads 16
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+
+class ThreadCounter:
+    """Фоновый замер максимального числа потоков процесса."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.05):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_sync(base_url, files, out_dir, threads):
+    from client import ASRClient
+
+    client = ASRClient(base_url=base_url, token="bench", pool_size=threads)
+
+    def one(index, file_path):
+        task = client.start_transcribing(file_path)
+        if not task:
+            return False
+        client.poller.wait(task["task_id"], timeout=120)
+        return client.get_file(task["task_id"], os.path.join(out_dir, f"sync_{index}.json"))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(one, range(len(files)), files))
+
+
+def run_async(base_url, files, out_dir, limit_per_host):
+    from aclient import AsyncASRClient
+    from http_pool import AsyncHttpPool
+
+    async def main():
+        async with AsyncHttpPool(limit_per_host=limit_per_host) as pool:
+            client = AsyncASRClient(base_url=base_url, token="bench", pool=pool)
+
+            async def one(index, file_path):
+                task = await client.start_transcribing(file_path)
+                if not task:
+                    return False
+                await client.poller.wait(task["task_id"], timeout=120)
+                return await client.get_file(task["task_id"], os.path.join(out_dir, f"async_{index}.json"))
+
+            return await asyncio.gather(*(one(i, f) for i, f in enumerate(files)))
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронного и асинхронного клиентов")
+    parser.add_argument("--tasks", type=int, default=200, help="Число задач (по умолчанию: 200)")
+    parser.add_argument("--threads", type=int, default=16,
+                        help="Потоков для синхронного пути и соединений на хост для асинхронного (по умолчанию: 16)")
+    parser.add_argument("--processing-time", type=float, default=1.0,
+                        help="Время 'обработки' задачи на стенде в секундах (по умолчанию: 1)")
+    parser.add_argument("--file-kb", type=int, default=64, help="Размер тестового файла в КБ (по умолчанию: 64)")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"],
+                        help="Какие клиенты сравнивать")
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(SRC_DIR, "mock_server.py"), "--port", "0",
+         "--processing-time", str(args.processing_time)],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = server.stdout.readline().strip().split()[-1]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = []
+            for i in range(args.tasks):
+                path = os.path.join(tmp_dir, f"bench_{i}.wav")
+                with open(path, "wb") as f:
+                    f.write(os.urandom(args.file_kb * 1024))
+                files.append(path)
+
+            print(f"Задач: {args.tasks}, файл: {args.file_kb} КБ, обработка: {args.processing_time} с, "
+                  f"стенд: {base_url}")
+            for mode in args.modes:
+                if mode == "async":
+                    try:
+                        import aiohttp  # noqa: F401
+                    except ImportError:
+                        print("async   пропущен: не установлен aiohttp")
+                        continue
+                started = time.monotonic()
+                # Сообщения клиентов ("Файл сохранен" и т.п.) не выводятся
+                with ThreadCounter() as counter, open(os.devnull, "w") as devnull, \
+                        contextlib.redirect_stdout(devnull):
+                    if mode == "sync":
+                        results = run_sync(base_url, files, tmp_dir, args.threads)
+                    else:
+                        results = run_async(base_url, files, tmp_dir, args.threads)
+                elapsed = time.monotonic() - started
+                ok = sum(1 for r in results if r)
+                print(f"{mode:<7} ok={ok}/{len(results)}  время={elapsed:6.2f} с  "
+                      f"задач/с={ok / elapsed:7.1f}  пик потоков={counter.peak}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк фонового демона (src/daemon.py): время от запуска команды до
+начала загрузки файла и общее время для одного файла.
+
+Сравниваются обычный запуск `transcribe.py` и `daemon.py run transcribe`
+против локального стенда src/mock_server.py. Начало загрузки - момент,
+когда в выводе появляется строка "Запуск транскрибации". Запуски идут с
+отдельным HOME, демон запускается и останавливается бенчмарком.
+
+Запуск:
+    python benchmarks/bench_daemon.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+MARKER = "Запуск транскрибации"
+
+
+def timed_run(command, env, cwd):
+    """(секунды до начала загрузки, общее время, код выхода)."""
+    started = time.perf_counter()
+    first_byte = None
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, cwd=cwd,
+                               text=True, encoding="utf-8")
+    for line in process.stdout:
+        if first_byte is None and MARKER in line:
+            first_byte = time.perf_counter() - started
+    process.wait()
+    return first_byte, time.perf_counter() - started, process.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска transcribe через демон")
+    parser.add_argument("--runs", type=int, default=5, help="Запусков каждого варианта (по умолчанию: 5)")
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, "mock_server.py"), "--port", "0",
+                               "--processing-time", "0"], stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = server.stdout.readline().strip().split()[-1]
+        with tempfile.TemporaryDirectory() as work_dir:
+            env = dict(os.environ, HOME=work_dir, USERPROFILE=work_dir)
+            audio = os.path.join(work_dir, "bench.wav")
+            with wave.open(audio, "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(16000)
+                w.writeframes(b"\0" * 32000)
+            options = [audio, "--token", "bench", "--asr-url", base_url, "--keep-original", "--no-cache"]
+
+            daemon = [sys.executable, os.path.join(SRC_DIR, "daemon.py")]
+            subprocess.run(daemon + ["start"], env=env, check=True, stdout=subprocess.DEVNULL)
+            variants = {
+                "transcribe.py": [sys.executable, os.path.join(SRC_DIR, "transcribe.py")],
+                "daemon.py run": daemon + ["run", "transcribe"],
+            }
+            try:
+                print(f"{'Вариант':<16} {'До загрузки, мс':>16} {'Всего, мс':>10}")
+                for title, command in variants.items():
+                    first, total = [], []
+                    for i in range(args.runs):
+                        output_dir = os.path.join(work_dir, f"out_{title[:6]}_{i}")
+                        first_byte, elapsed, code = timed_run(command + options + ["--output-dir", output_dir],
+                                                              env, work_dir)
+                        if code != 0 or first_byte is None:
+                            print(f"{title}: запуск завершился с кодом {code}")
+                            continue
+                        first.append(first_byte)
+                        total.append(elapsed)
+                    if first:
+                        print(f"{title:<16} {statistics.median(first) * 1000:16.0f} "
+                              f"{statistics.median(total) * 1000:10.0f}")
+            finally:
+                subprocess.run(daemon + ["stop"], env=env, stdout=subprocess.DEVNULL)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк шаблонов имен файлов (src/normalization.py).
+
+Генерирует N имен (записи Телемоста, имена под пользовательские шаблоны и
+имена, которые не подходят ни под один шаблон) и измеряет нормализацию
+через таблицу шаблонов по первому символу и через проверку всех шаблонов
+по очереди.
+С --files создает столько же пустых файлов и измеряет планирование
+массового переименования (transcribe rename-preview) по папке.
+
+Запуск:
+    python benchmarks/bench_normalization.py --names 50000 --patterns 20 --files 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from normalization import TELEMOST_PATTERN, PatternEngine, plan_renames  # noqa: E402
+
+
+def make_patterns(count):
+    """Пользовательские шаблоны вида "Запись<N> 2025-01-31 Название"."""
+    return [{
+        "name": f"source{i}",
+        "regex": rf"^Запись{i} (?P<y>\d{{4}})-(?P<m>\d{{2}})-(?P<d>\d{{2}}) (?P<rest>.*)",
+        "template": "{y}{m}{d}0000 {rest}",
+    } for i in range(count)]
+
+
+def make_names(count, patterns):
+    names = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            names.append(f"Встреча в Телемосте {i % 28 + 1:02d}.11.25 11-{i % 60:02d}-32 — запись Встреча {i}.mp3")
+        elif kind == 1 and patterns:
+            names.append(f"Запись{i % patterns} 2025-01-{i % 28 + 1:02d} Планерка {i}.m4a")
+        else:
+            names.append(f"voice_note_{i}.wav")
+    return names
+
+
+def measure(title, engine, names):
+    started = time.perf_counter()
+    renamed = sum(1 for name in names if engine.rename(name) != name)
+    elapsed = time.perf_counter() - started
+    print(f"  {title:<24} {elapsed * 1000:8.0f} мс  ({elapsed / len(names) * 1e6:.1f} мкс на имя, "
+          f"переименовано: {renamed})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк шаблонов имен файлов")
+    parser.add_argument("--names", type=int, default=50000, help="Количество имен (по умолчанию: 50000)")
+    parser.add_argument("--patterns", type=int, default=20,
+                        help="Количество пользовательских шаблонов (по умолчанию: 20)")
+    parser.add_argument("--files", type=int, default=0,
+                        help="Создать столько файлов и измерить план переименования папки (по умолчанию: 0)")
+    args = parser.parse_args()
+
+    patterns = make_patterns(args.patterns) + [TELEMOST_PATTERN]
+    names = make_names(args.names, args.patterns)
+
+    started = time.perf_counter()
+    engine = PatternEngine(patterns)
+    print(f"Шаблонов: {len(patterns)}, компиляция: {(time.perf_counter() - started) * 1000:.1f} мс, "
+          f"имен: {len(names)}")
+    measure("таблица по префиксу", engine, names)
+    sequential = PatternEngine(patterns)
+    sequential._dispatch, sequential._any = {}, sequential.patterns
+    measure("все шаблоны по очереди", sequential, names)
+
+    if args.files:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name in make_names(args.files, args.patterns):
+                open(os.path.join(work_dir, name), "wb").close()
+            paths = [entry.path for entry in os.scandir(work_dir)]
+            started = time.perf_counter()
+            renames, conflicts = plan_renames(paths)
+            elapsed = time.perf_counter() - started
+            print(f"План переименования {len(paths)} файлов: {elapsed * 1000:.0f} мс "
+                  f"(переименований: {len(renames)}, конфликтов: {len(conflicts)})")
+
+
+if __name__ == "__main__":
+    main()
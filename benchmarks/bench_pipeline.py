@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк пакетной обработки (transcribe) на локальном стенде.
+
+Поднимает src/mock_server.py с заданной моделью поведения (время обработки,
+задержка, ошибки, 429), для каждого размера пакета создает N тестовых
+файлов и запускает transcribe.py отдельным процессом с --asr-url и
+--summarizer-url, указывающими на стенд. Каждый запуск идет с отдельным
+HOME, поэтому кэш, журнал и история опроса не переносятся между запусками.
+
+Для каждого размера пакета печатает:
+  - файлов в час;
+  - p50/p95 времени обработки одного файла (от начала загрузки до записи результата);
+  - запросов к стенду на один файл (по эндпоинтам);
+  - пиковый RSS процесса transcribe.
+
+Запуск:
+    python benchmarks/bench_pipeline.py --sizes 1 10 100 1000 --processing-time 2 --summarize
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import wave
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def percentile(values, p):
+    """Перцентиль p (0..100) с линейной интерполяцией."""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def fetch_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+        return json.load(response)
+
+
+def diff_counts(after, before):
+    return {key: value - before.get(key, 0) for key, value in after.items() if value - before.get(key, 0)}
+
+
+def run_batch(size, base_url, args, work_dir):
+    """Один запуск transcribe на size файлах. Возвращает словарь с метриками."""
+    batch_dir = os.path.join(work_dir, f"batch_{size}")
+    input_dir = os.path.join(batch_dir, "input")
+    home_dir = os.path.join(batch_dir, "home")
+    os.makedirs(input_dir)
+    os.makedirs(home_dir)
+    for i in range(size):
+        # Корректный заголовок WAV: transcribe отклоняет файлы, которые не проходят пробу
+        with wave.open(os.path.join(input_dir, f"bench_{i:04d}.wav"), "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(os.urandom(args.file_kb * 1024))
+
+    report_path = os.path.join(batch_dir, "report.json")
+    command = [sys.executable, os.path.join(SRC_DIR, "transcribe.py"), input_dir,
+               "--token", "bench", "--asr-url", base_url, "--summarizer-url", base_url,
+               "--output-dir", os.path.join(batch_dir, "output"), "--no-cache",
+               "--jobs", str(args.jobs), "--download-jobs", str(args.jobs),
+               "--report-json", report_path]
+    if args.summarize:
+        command += ["--summarize", "--default", "--prompt-id", "meeting_detailed", "--model", "llama",
+                    "--summarize-jobs", str(args.summarize_jobs)]
+
+    env = dict(os.environ, HOME=home_dir, USERPROFILE=home_dir)
+    before = fetch_stats(base_url)
+    started = time.monotonic()
+    with open(os.path.join(batch_dir, "transcribe.log"), "w") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+        # wait4 возвращает ресурсы именно этого процесса (ru_maxrss - пиковый RSS)
+        _, exit_status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(exit_status)
+    elapsed = time.monotonic() - started
+    after = fetch_stats(base_url)
+
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    latencies = [item["elapsed"] for item in report if item["status"] == "ok" and item["elapsed"] is not None]
+    ok = len(latencies)
+    peak_rss = usage.ru_maxrss / 1024 / 1024 if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return {
+        "size": size,
+        "ok": ok,
+        "exit_code": process.returncode,
+        "elapsed": elapsed,
+        "files_per_hour": ok / elapsed * 3600 if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "requests": diff_counts(after["requests"], before["requests"]),
+        "responses": diff_counts(after["responses"], before["responses"]),
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def print_result(result):
+    size = result["size"]
+    total_requests = sum(result["requests"].values())
+    p50 = f"{result['p50']:.2f}" if result["p50"] is not None else "-"
+    p95 = f"{result['p95']:.2f}" if result["p95"] is not None else "-"
+    print(f"{size:>6}  {result['ok']:>6}  {result['elapsed']:8.1f}  {result['files_per_hour']:10.0f}  "
+          f"{p50:>7}  {p95:>7}  {total_requests / size:9.1f}  {result['peak_rss_mb']:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк transcribe на локальном стенде")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100],
+                        help="Размеры пакетов (по умолчанию: 1 10 100)")
+    parser.add_argument("--file-kb", type=int, default=64, help="Размер тестового файла в КБ (по умолчанию: 64)")
+    parser.add_argument("--jobs", type=int, default=4, help="--jobs и --download-jobs для transcribe (по умолчанию: 4)")
+    parser.add_argument("--summarize", action="store_true", help="Включить саммаризацию")
+    parser.add_argument("--summarize-jobs", type=int, default=2, help="--summarize-jobs (по умолчанию: 2)")
+    parser.add_argument("--processing-time", type=float, default=1.0,
+                        help="Время 'обработки' задачи на стенде в секундах (по умолчанию: 1)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Разброс времени обработки (по умолчанию: 0.2)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответов стенда в секундах")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Доля задач со статусом failed")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Лимит запросов в секунду (сверх него 429)")
+    parser.add_argument("--json", metavar="FILE", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    server_command = [sys.executable, os.path.join(SRC_DIR, "mock_server.py"), "--port", "0",
+                      "--processing-time", str(args.processing_time), "--jitter", str(args.jitter),
+                      "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+                      "--fail-rate", str(args.fail_rate), "--seed", "1"]
+    if args.rate_limit:
+        server_command += ["--rate-limit", str(args.rate_limit)]
+    server = subprocess.Popen(server_command, stdout=subprocess.PIPE, text=True)
+
+    results = []
+    try:
+        base_url = server.stdout.readline().strip().split()[-1]
+        print(f"Стенд: {base_url}, обработка: {args.processing_time} с, файл: {args.file_kb} КБ, "
+              f"jobs: {args.jobs}, саммаризация: {'да' if args.summarize else 'нет'}")
+        print(f"{'Файлов':>6}  {'OK':>6}  {'Время,с':>8}  {'Файлов/ч':>10}  {'p50,с':>7}  {'p95,с':>7}  "
+              f"{'Запр/файл':>9}  {'RSS,МБ':>8}")
+        with tempfile.TemporaryDirectory() as work_dir:
+            for size in args.sizes:
+                result = run_batch(size, base_url, args, work_dir)
+                results.append(result)
+                print_result(result)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print("\nЗапросов на файл по эндпоинтам:")
+    for result in results:
+        per_endpoint = ", ".join(f"{path} {count / result['size']:.1f}"
+                                 for path, count in sorted(result["requests"].items()))
+        codes = ", ".join(f"{code}: {count}" for code, count in sorted(result["responses"].items()))
+        print(f"  {result['size']:>6}: {per_endpoint}  (ответы {codes})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк размещения исходного аудио (src/placement.py) против shutil.copy2.
+
+Создает файл заданного размера и копирует его в целевую папку каждым
+доступным способом: shutil.copy2, place_file(keep_original=True) и
+copy_file() (без жесткой ссылки). Целевая папка может быть на другой
+файловой системе (--target-dir), например на NAS.
+
+Запуск:
+    python benchmarks/bench_placement.py --size-mb 1024 --target-dir /mnt/nas/tmp
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from placement import copy_file, place_file  # noqa: E402
+
+
+def measure(title, action, target):
+    started = time.perf_counter()
+    strategy = action()
+    elapsed = time.perf_counter() - started
+    print(f"  {title:<28} {elapsed:8.3f} с  ({strategy})")
+    os.remove(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк размещения аудио в папке результатов")
+    parser.add_argument("--size-mb", type=int, default=512, help="Размер файла в МБ (по умолчанию: 512)")
+    parser.add_argument("--target-dir", help="Папка назначения (по умолчанию: рядом с исходным файлом)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "source.wav")
+        block = os.urandom(1024 * 1024)
+        with open(source, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(block)
+        target_dir = args.target_dir or work_dir
+        target = os.path.join(target_dir, "bench_target.wav")
+
+        print(f"Файл: {args.size_mb} МБ, назначение: {target_dir}")
+        measure("shutil.copy2", lambda: shutil.copy2(source, target) and "copy2", target)
+        measure("place_file(keep_original)", lambda: place_file(source, target, keep_original=True), target)
+        measure("copy_file", lambda: copy_file(source, target), target)
+
+
+if __name__ == "__main__":
+    main()
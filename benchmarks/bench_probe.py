@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пробы заголовков аудиофайлов (src/probe.py).
+
+Создает N синтетических файлов разных форматов (WAV, MP3 с тегом ID3,
+OGG/Opus, M4A с атомом moov в конце, как у записи без faststart) и
+измеряет время пробы всех файлов. Содержимое файлов - тишина/нули:
+проба читает только заголовки, поэтому для нее это не имеет значения.
+
+Запуск:
+    python benchmarks/bench_probe.py --files 1000 --file-kb 512
+"""
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from probe import probe_file  # noqa: E402
+
+
+def write_wav(path, size):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b"\0" * size)
+
+
+def write_mp3(path, size):
+    # ID3v2 (1 КБ) и кадры MPEG-1 Layer III 128 кбит/с 44.1 кГц
+    frame = b"\xff\xfb\x90\x00" + b"\0" * 413
+    with open(path, "wb") as f:
+        f.write(b"ID3\x03\x00\x00\x00\x00\x08\x00" + b"\0" * 1024)
+        f.write(frame * (size // len(frame)))
+
+
+def _ogg_page(granule, sequence, payload, header_type=0):
+    lacing = [255] * (len(payload) // 255) + [len(payload) % 255]
+    return (b"OggS" + bytes([0, header_type]) + struct.pack("<qIII", granule, 1, sequence, 0)
+            + bytes([len(lacing)]) + bytes(lacing) + payload)
+
+
+def write_opus(path, size):
+    head = b"OpusHead" + bytes([1, 1]) + struct.pack("<HIhB", 312, 16000, 0, 0)
+    pages = [_ogg_page(0, 0, head, 2), _ogg_page(0, 1, b"OpusTags" + b"\0" * 8)]
+    body = b"\0" * 4000
+    count = max(1, size // len(body))
+    pages += [_ogg_page((i + 1) * 48000, i + 2, body, 4 if i == count - 1 else 0) for i in range(count)]
+    with open(path, "wb") as f:
+        f.write(b"".join(pages))
+
+
+def _atom(atom_type, payload):
+    return struct.pack(">I", 8 + len(payload)) + atom_type + payload
+
+
+def write_m4a(path, size):
+    mvhd = _atom(b"mvhd", b"\0" * 4 + struct.pack(">IIII", 0, 0, 1000, size // 16) + b"\0" * 80)
+    hdlr = _atom(b"hdlr", b"\0" * 8 + b"soun" + b"\0" * 13)
+    entry = (struct.pack(">I4s6sH", 36, b"mp4a", b"\0" * 6, 1) + b"\0" * 8
+             + struct.pack(">HHHHI", 1, 16, 0, 0, 44100 << 16))
+    stsd = _atom(b"stsd", b"\0" * 4 + struct.pack(">I", 1) + entry)
+    stbl = _atom(b"stbl", stsd + _atom(b"stsz", b"\0" * 4096))
+    trak = _atom(b"trak", _atom(b"tkhd", b"\0" * 84) + _atom(b"mdia", hdlr + _atom(b"minf", stbl)))
+    with open(path, "wb") as f:
+        f.write(_atom(b"ftyp", b"M4A \0\0\0\0isom"))
+        f.write(_atom(b"mdat", b"\0" * size))
+        f.write(_atom(b"moov", mvhd + trak))
+
+
+WRITERS = {".wav": write_wav, ".mp3": write_mp3, ".opus": write_opus, ".m4a": write_m4a}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пробы заголовков аудиофайлов")
+    parser.add_argument("--files", type=int, default=1000, help="Количество файлов (по умолчанию: 1000)")
+    parser.add_argument("--file-kb", type=int, default=256, help="Размер файла в КБ (по умолчанию: 256)")
+    parser.add_argument("--repeat", type=int, default=3, help="Сколько раз повторить измерение (по умолчанию: 3)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        extensions = list(WRITERS)
+        paths = []
+        for i in range(args.files):
+            ext = extensions[i % len(extensions)]
+            path = os.path.join(work_dir, f"bench_{i:05d}{ext}")
+            WRITERS[ext](path, args.file_kb * 1024)
+            paths.append(path)
+
+        print(f"Файлов: {args.files} ({', '.join(extensions)}), размер: {args.file_kb} КБ")
+        for attempt in range(args.repeat):
+            started = time.perf_counter()
+            infos = [probe_file(path) for path in paths]
+            elapsed = time.perf_counter() - started
+            unknown = sum(1 for info in infos if info.duration is None)
+            print(f"  попытка {attempt + 1}: {elapsed * 1000:.0f} мс "
+                  f"({elapsed / args.files * 1e6:.0f} мкс на файл, без длительности: {unknown})")
+
+
+if __name__ == "__main__":
+    main()
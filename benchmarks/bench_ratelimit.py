@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк адаптивного ограничения запросов (src/ratelimit.py).
+
+Поднимает стенд (src/mock_server.py), который одновременно обрабатывает не
+больше --capacity запросов (сверх - 503 с Retry-After), и отправляет всплеск
+из N запросов создания задачи саммаризации из --threads потоков. Сравнивает:
+- без ограничителя: прямой POST, как раньше (ответы 503 теряются);
+- с фиксированным лимитом (--fixed): ограничитель с повторами, лимит не меняется;
+- адаптивный: лимит подбирается по ответам сервера.
+Печатает созданные и потерянные задачи, число ответов 503/429, время и
+итоговый лимит.
+
+Запуск:
+    python benchmarks/bench_ratelimit.py --tasks 300 --threads 64 --capacity 8
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from mock_server import start_in_thread  # noqa: E402
+
+
+def run_mode(mode, args):
+    from summarizer import SummarizerClient
+
+    # Новый стенд (и порт) на каждый режим: ограничители не делят оценку между режимами
+    server = start_in_thread(latency=args.latency, max_concurrent=args.capacity, rate_limit=args.rate_limit)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    client = SummarizerClient(base_url=base_url, token="bench", pool_size=args.threads)
+    limiter = client.create_limiter
+    if mode == "fixed":
+        limiter.configure(initial=args.fixed, min_limit=args.fixed, max_limit=args.fixed)
+    url = f"{base_url}/api/v1/tasks"
+
+    def one(index):
+        payload = {"text": f"Текст {index}", "prompt_id": "meeting_short", "model": "llama"}
+        if mode == "none":
+            response = client.session.post(url, json=payload)
+            return response.status_code == 200
+        return client.create_task(payload["text"], payload["prompt_id"]) is not None
+
+    started = time.monotonic()
+    # Сообщения о повторах и ошибках не выводятся
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(one, range(args.tasks)))
+    elapsed = time.monotonic() - started
+
+    responses = server.RequestHandlerClass.state.stats()["responses"]
+    server.shutdown()
+    server.server_close()
+    ok = sum(results)
+    limit = "-" if mode == "none" else f"{int(limiter.limit)} (от {limiter.lowest} до {limiter.highest})"
+    print(f"{mode:<9} создано={ok}/{len(results)}  потеряно={len(results) - ok}  "
+          f"503={responses.get(503, 0)}  429={responses.get(429, 0)}  "
+          f"время={elapsed:6.2f} с  лимит={limit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк адаптивного ограничения запросов")
+    parser.add_argument("--tasks", type=int, default=300, help="Число запросов (по умолчанию: 300)")
+    parser.add_argument("--threads", type=int, default=64, help="Потоков-отправителей (по умолчанию: 64)")
+    parser.add_argument("--capacity", type=int, default=8,
+                        help="Сколько запросов стенд обрабатывает одновременно (по умолчанию: 8)")
+    parser.add_argument("--latency", type=float, default=0.1,
+                        help="Время обработки запроса на стенде в секундах (по умолчанию: 0.1)")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="Дополнительно: максимум запросов в секунду на стенде (429)")
+    parser.add_argument("--fixed", type=int, default=32,
+                        help="Лимит для режима с фиксированной параллельностью (по умолчанию: 32)")
+    parser.add_argument("--modes", nargs="+", default=["none", "fixed", "adaptive"],
+                        choices=["none", "fixed", "adaptive"], help="Какие режимы сравнивать")
+    args = parser.parse_args()
+
+    print(f"Запросов: {args.tasks}, потоков: {args.threads}, стенд: {args.capacity} одновременно, "
+          f"{args.latency} с на запрос, лимит в секунду: {args.rate_limit or 'нет'}")
+    print(f"Идеальное время: {args.tasks / args.capacity * args.latency:.2f} с")
+    for mode in args.modes:
+        run_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
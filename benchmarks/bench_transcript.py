@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк чтения транскрипции для саммаризации (src/transcript.py).
+
+Генерирует _text.json многочасовой встречи (N сегментов с дикторами) и
+сравнивает пиковую память (tracemalloc) и время двух способов получить
+текст: json.load всего файла со склейкой сегментов и потоковый разбор
+read_transcript_text.
+
+Запуск:
+    python benchmarks/bench_transcript.py --segments 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from transcript import read_transcript_text  # noqa: E402
+
+WORDS = ("значит", "проект", "сроки", "бюджет", "согласовать", "вопрос", "релиз", "команда",
+         "тестирование", "задача", "договорились", "неделе", "клиент", "отчет", "данные")
+
+
+def write_transcript(path, count, speakers):
+    rng = random.Random(1)
+    start = 0.0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(count):
+            end = start + rng.uniform(1, 6)
+            segment = {"speaker": f"SPEAKER_{rng.randrange(speakers):02d}", "start": round(start, 2),
+                       "end": round(end, 2), "text": " ".join(rng.choices(WORDS, k=rng.randint(4, 20)))}
+            f.write(("," if i else "") + json.dumps(segment, ensure_ascii=False))
+            start = end
+        f.write("]")
+
+
+def load_and_join(path):
+    """Прежний способ: весь файл в память, текст сегментов через пробел."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return " ".join(segment.get("text", "") for segment in data if isinstance(segment, dict))
+
+
+def measure(title, func, path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    text = func(path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {title:<28} {elapsed:6.2f} с, пик памяти {peak / 2**20:7.1f} МБ, текст {len(text) / 2**20:5.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк чтения транскрипции")
+    parser.add_argument("--segments", type=int, default=200000, help="Количество сегментов (по умолчанию: 200000)")
+    parser.add_argument("--speakers", type=int, default=4, help="Количество дикторов (по умолчанию: 4)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "meeting_text.json")
+        write_transcript(path, args.segments, args.speakers)
+        print(f"Сегментов: {args.segments}, файл: {os.path.getsize(path) / 2**20:.1f} МБ")
+        measure("json.load и склейка", load_and_join, path)
+        measure("потоково по репликам", read_transcript_text, path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти при загрузке аудио в ASRClient.start_transcribing.
+
+Создает разреженный файл заданного размера, поднимает локальный стенд
+(src/mock_server.py) в отдельном процессе и загружает файл двумя способами
+в отдельных процессах, сравнивая пиковый RSS:
+  - stream: потоковый MultipartFileEncoder (текущая реализация);
+  - legacy: requests files={'file': f} (тело собирается в памяти).
+
+Запуск:
+    python benchmarks/bench_upload.py --size-mb 1024
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+
+def peak_rss_mb():
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_upload(mode, file_path, base_url):
+    """Выполняет одну загрузку в текущем процессе и печатает результат."""
+    from client import ASRClient
+
+    client = ASRClient(base_url=base_url, token="bench")
+    rss_before = peak_rss_mb()
+    started = time.monotonic()
+    speed = {"value": 0.0}
+
+    if mode == "stream":
+        result = client.start_transcribing(
+            file_path, progress_callback=lambda sent, total, bps: speed.update(value=bps))
+    else:
+        with open(file_path, "rb") as f:
+            response = client.session.post(f"{client.base_url}/start_transcribing", files={"file": f})
+        result = response.json()
+
+    elapsed = time.monotonic() - started
+    size_mb = os.path.getsize(file_path) / 1024 / 1024
+    throughput = speed["value"] / 1024 / 1024 if speed["value"] else size_mb / elapsed
+    print(f"{mode:<7} ok={bool(result)!s:<5} время={elapsed:6.2f} с  "
+          f"скорость={throughput:8.1f} МБ/с  RSS до={rss_before:7.1f} МБ  пик RSS={peak_rss_mb():7.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк памяти при потоковой загрузке")
+    parser.add_argument("--size-mb", type=int, default=1024, help="Размер тестового файла в МБ (по умолчанию: 1024)")
+    parser.add_argument("--modes", nargs="+", default=["stream", "legacy"], choices=["stream", "legacy"],
+                        help="Какие способы загрузки сравнивать")
+    parser.add_argument("--run-one", nargs=3, metavar=("MODE", "FILE", "URL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_upload(*args.run_one)
+        return
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(SRC_DIR, "mock_server.py"), "--port", "0", "--processing-time", "0"],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        # Первая строка вывода стенда содержит адрес
+        base_url = server.stdout.readline().strip().split()[-1]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "bench.wav")
+            with open(file_path, "wb") as f:
+                f.truncate(args.size_mb * 1024 * 1024)
+
+            print(f"Файл: {args.size_mb} МБ, стенд: {base_url}")
+            for mode in args.modes:
+                subprocess.run([sys.executable, os.path.abspath(__file__), "--run-one", mode, file_path, base_url],
+                               check=False)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк режима наблюдения за папкой (transcribe --watch).
+
+Запускает `transcribe --watch` против локального стенда src/mock_server.py
+и подкладывает в папку N записей так, как это делает скачивание: файл
+пишется частями с паузами. Для каждого файла измеряется время от окончания
+записи до появления _text.json в папке результатов. Варианты: inotify и
+опрос папки (--watch-poll).
+
+Запуск:
+    python benchmarks/bench_watch.py --files 10 --settle 2
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def write_slowly(path, seconds, pause):
+    """Пишет WAV по секунде звука с паузами (как медленное скачивание)."""
+    with open(path, "wb") as raw:
+        with wave.open(raw, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            for _ in range(seconds):
+                w.writeframes(b"\0\1" * 16000)
+                raw.flush()
+                time.sleep(pause)
+
+
+def run_variant(base_url, work_dir, options, args):
+    incoming = os.path.join(work_dir, "incoming")
+    output = os.path.join(work_dir, "out")
+    os.makedirs(incoming)
+    env = dict(os.environ, HOME=work_dir, USERPROFILE=work_dir)
+    command = [sys.executable, os.path.join(SRC_DIR, "transcribe.py"), "--watch", incoming, "--output-dir", output,
+               "--token", "bench", "--asr-url", base_url, "--no-cache", "--watch-settle", str(args.settle)] + options
+    with open(os.path.join(work_dir, "watch.log"), "w", encoding="utf-8") as log:
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    latencies = []
+    try:
+        time.sleep(1)
+        for i in range(args.files):
+            name = f"record_{i:03d}"
+            write_slowly(os.path.join(incoming, f"{name}.wav"), args.seconds, args.pause)
+            landed = time.monotonic()
+            result = os.path.join(output, f"{name}_text.json")
+            deadline = landed + args.timeout
+            while not os.path.exists(result) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if os.path.exists(result):
+                latencies.append(time.monotonic() - landed)
+            else:
+                print(f"  {name}: нет результата за {args.timeout} с (лог: {work_dir}/watch.log)")
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк transcribe --watch")
+    parser.add_argument("--files", type=int, default=5, help="Количество записей (по умолчанию: 5)")
+    parser.add_argument("--seconds", type=int, default=5, help="Длительность записи в секундах (по умолчанию: 5)")
+    parser.add_argument("--pause", type=float, default=0.2,
+                        help="Пауза между частями записи в секундах (по умолчанию: 0.2)")
+    parser.add_argument("--settle", type=float, default=2, help="Значение --watch-settle (по умолчанию: 2)")
+    parser.add_argument("--processing-time", type=float, default=1,
+                        help="Время обработки на стенде в секундах (по умолчанию: 1)")
+    parser.add_argument("--timeout", type=float, default=60, help="Ожидание результата на файл (по умолчанию: 60)")
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, "mock_server.py"), "--port", "0",
+                               "--processing-time", str(args.processing_time)], stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = server.stdout.readline().strip().split()[-1]
+        print(f"Файлов: {args.files}, settle: {args.settle} с, обработка на стенде: {args.processing_time} с")
+        print(f"{'Вариант':<10} {'p50, с':>8} {'p95, с':>8} {'max, с':>8}")
+        for title, options in (("inotify", []), ("опрос", ["--watch-poll"])):
+            with tempfile.TemporaryDirectory() as work_dir:
+                latencies = sorted(run_variant(base_url, work_dir, options, args))
+            if latencies:
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                print(f"{title:<10} {statistics.median(latencies):8.1f} {p95:8.1f} {latencies[-1]:8.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Проверка, что асинхронные клиенты (src/aclient.py) повторяют синхронные.
+
+Для пар ASRClient/AsyncASRClient и SummarizerClient/AsyncSummarizerClient
+сравнивает публичные методы: у асинхронного клиента должен быть каждый метод
+синхронного с теми же параметрами и значениями по умолчанию, и это должна
+быть корутина; то же для poller.wait. Если установлен aiohttp, проверяет еще,
+что клиенты одного сервера используют одни и те же ограничители запросов.
+Завершается с кодом 1 при любом расхождении.
+
+Запуск:
+    python benchmarks/check_async_api.py
+"""
+import inspect
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# Методы, которые есть только у асинхронных клиентов (закрытие собственного пула)
+ASYNC_ONLY = {"close"}
+LIMITERS = {
+    "asr": ("upload_limiter", "status_limiter", "download_limiter"),
+    "summary": ("create_limiter", "status_limiter", "result_limiter"),
+}
+
+
+def public_methods(cls):
+    return {name: member for name, member in inspect.getmembers(cls, inspect.isfunction)
+            if not name.startswith("_")}
+
+
+def parameters(function):
+    return [(p.name, p.kind, p.default) for p in inspect.signature(function).parameters.values()]
+
+
+def compare(title, sync_cls, async_cls):
+    """Список расхождений методов двух классов."""
+    problems = []
+    sync_methods, async_methods = public_methods(sync_cls), public_methods(async_cls)
+    for name, method in sorted(sync_methods.items()):
+        other = async_methods.get(name)
+        if other is None:
+            problems.append(f"{title}: нет метода {name}")
+        elif not inspect.iscoroutinefunction(other):
+            problems.append(f"{title}.{name}: не корутина")
+        elif parameters(method) != parameters(other):
+            problems.append(f"{title}.{name}: параметры {inspect.signature(other)}, "
+                            f"ожидались {inspect.signature(method)}")
+    for name in sorted(set(async_methods) - set(sync_methods) - ASYNC_ONLY):
+        problems.append(f"{title}: лишний метод {name} (нет у синхронного клиента)")
+    return problems
+
+
+def shared_limiters(kind, sync_client, async_client):
+    return [f"{type(async_client).__name__}.{name}: не тот ограничитель, что у синхронного клиента"
+            for name in LIMITERS[kind] if getattr(sync_client, name) is not getattr(async_client, name)]
+
+
+def main():
+    from aclient import AsyncASRClient, AsyncPoller, AsyncSummarizerClient, aiohttp
+    from client import ASRClient
+    from polling import PollScheduler
+    from summarizer import SummarizerClient
+
+    problems = compare("AsyncASRClient", ASRClient, AsyncASRClient)
+    problems += compare("AsyncSummarizerClient", SummarizerClient, AsyncSummarizerClient)
+    if parameters(PollScheduler.wait) != parameters(AsyncPoller.wait):
+        problems.append(f"AsyncPoller.wait: параметры {inspect.signature(AsyncPoller.wait)}, "
+                        f"ожидались {inspect.signature(PollScheduler.wait)}")
+
+    if aiohttp is None:
+        print("aiohttp не установлен: общие ограничители не проверяются")
+    else:
+        url = "http://check.invalid"
+        problems += shared_limiters("asr", ASRClient(url), AsyncASRClient(url))
+        problems += shared_limiters("summary", SummarizerClient(url), AsyncSummarizerClient(url))
+
+    for problem in problems:
+        print(problem)
+    print("Асинхронные клиенты совпадают с синхронными." if not problems else f"Расхождений: {len(problems)}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Проверка импортов быстрых команд transcribe/summarize.
+
+`--help`, `--set-token`, `--list-prompts` (при свежем кэше каталога) и
+`transcribe cache stats` не ходят в сеть, поэтому не должны импортировать
+requests, sqlite3 и прочие тяжелые модули. Скрипт запускает каждую команду
+с `python -X importtime` и проверяет, что:
+  - команда завершилась с кодом 0 и вывод importtime разобран;
+  - не подгружен ни один запрещенный модуль (печатается цепочка импорта,
+    которая его подтянула);
+  - время импорта модулей приложения сверх пустого запуска интерпретатора
+    (`python -c pass`, у которого есть свои импорты из site) не больше бюджета.
+Каждое нарушение печатается отдельной строкой, при любом нарушении скрипт
+завершается с кодом 1. Запрещенные модули не зависят от скорости машины,
+поэтому `--budget-ms 0` отключает только проверку времени.
+
+Запуск:
+    python benchmarks/check_import_time.py --budget-ms 30
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Модули, появление которых на быстром пути - регрессия
+FORBIDDEN = ("requests", "urllib3", "sqlite3", "aiohttp", "numpy", "concurrent.futures", "http.client", "ssl")
+
+
+def import_profile(command, env):
+    """
+    Запускает команду с -X importtime. Возвращает (код выхода, суммарное время
+    импорта в мс, список (глубина вложенности, модуль) в порядке вывода).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime"] + command, env=env, cwd=env["HOME"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports, total_us = [], 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        # Вложенный импорт печатается раньше импортирующего модуля, с отступом в 2 пробела на уровень
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((depth, name.strip()))
+        total_us += int(fields[0])
+    return result.returncode, total_us / 1000, imports
+
+
+def import_chain(imports, index):
+    """Список [модуль, кто его импортировал, ...] для imports[index]."""
+    depth, name = imports[index]
+    chain = [name]
+    for parent_depth, parent in imports[index + 1:]:
+        if parent_depth < depth:
+            chain.append(parent)
+            depth = parent_depth
+    return chain
+
+
+def is_forbidden(name):
+    return any(name == f or name.startswith(f + ".") for f in FORBIDDEN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка импортов быстрых команд")
+    parser.add_argument("--budget-ms", type=float, default=30.0,
+                        help="Допустимое время импорта сверх пустого запуска, мс; 0 - не проверять "
+                             "(по умолчанию: 30)")
+    parser.add_argument("--runs", type=int, default=5, help="Запусков каждой команды, берется медиана (по умолчанию: 5)")
+    args = parser.parse_args()
+
+    transcribe = os.path.join(SRC_DIR, "transcribe.py")
+    summarize = os.path.join(SRC_DIR, "summarize.py")
+    commands = {
+        "transcribe --help": [transcribe, "--help"],
+        "transcribe --set-token": [transcribe, "--set-token", "check"],
+        "transcribe cache stats": [transcribe, "cache", "stats"],
+        "summarize --help": [summarize, "--help"],
+        "summarize --set-token": [summarize, "--set-token", "check"],
+        "summarize --list-prompts": [summarize, "--list-prompts", "--token", "check"],
+    }
+
+    problems = []
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        # Свежий кэш каталога промптов: --list-prompts обходится без сети
+        cache = {"api": {"fetched": time.time(), "prompts": [{"id": "check", "name": "check"}]}, "local": {}}
+        with open(os.path.join(home, ".asr_prompts_cache.json"), "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+
+        baseline_runs = [import_profile(["-c", "pass"], env) for _ in range(max(args.runs, 1))]
+        baseline_modules = {name for _, name in baseline_runs[0][2]}
+        baseline = statistics.median(total for _, total, _ in baseline_runs)
+        if not baseline_modules:
+            print("Вывод python -X importtime не разобран: проверка невозможна")
+            sys.exit(1)
+
+        print(f"Пустой запуск: {baseline:.1f} мс, бюджет сверх него: "
+              f"{f'{args.budget_ms:.0f} мс' if args.budget_ms > 0 else 'не проверяется'}")
+        print(f"{'Команда':<26} {'Импорт, мс':>10}")
+        for title, command in commands.items():
+            timings, forbidden = [], {}
+            for _ in range(max(args.runs, 1)):
+                code, total, imports = import_profile(command, env)
+                if code != 0:
+                    problems.append(f"{title}: код выхода {code}")
+                    break
+                timings.append(total)
+                # Печатаем только внешний запрещенный импорт цепочки (requests, а не его urllib3)
+                # и модули приложения, через которые он подтянут
+                for index, (_, name) in enumerate(imports):
+                    if name in baseline_modules or not is_forbidden(name) or name in forbidden:
+                        continue
+                    chain = import_chain(imports, index)
+                    if not any(is_forbidden(parent) for parent in chain[1:]):
+                        forbidden[name] = " <- ".join(chain + ["__main__"])
+            if not timings:
+                continue
+            extra = statistics.median(timings) - baseline
+            print(f"{title:<26} {extra:10.1f}")
+            for chain in forbidden.values():
+                problems.append(f"{title}: импортирован запрещенный модуль: {chain}")
+            if args.budget_ms > 0 and extra > args.budget_ms:
+                problems.append(f"{title}: импорт {extra:.1f} мс сверх пустого запуска, бюджет {args.budget_ms:.0f} мс")
+
+    for problem in problems:
+        print(problem)
+    print("Быстрые команды укладываются в бюджет импорта." if not problems else f"Нарушений: {len(problems)}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
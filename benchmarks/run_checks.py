@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Запуск всех проверок репозитория (benchmarks/check_*.py).
+
+Бенчмарки (bench_*.py) только печатают замеры, а проверки завершаются с
+кодом 1 при регрессии: тяжелый импорт на быстром пути, расхождение
+асинхронных клиентов с синхронными и т.п. Этот скрипт запускает каждую
+проверку отдельным процессом и завершается с кодом 1, если упала хотя бы
+одна. Запускать перед коммитом.
+
+Запуск:
+    python benchmarks/run_checks.py
+"""
+import glob
+import os
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    checks = sorted(glob.glob(os.path.join(BENCHMARKS_DIR, "check_*.py")))
+    failed = []
+    for path in checks:
+        name = os.path.basename(path)
+        print(f"== {name}", flush=True)
+        if subprocess.run([sys.executable, path]).returncode != 0:
+            failed.append(name)
+    print()
+    if failed:
+        print(f"Не пройдены ({len(failed)} из {len(checks)}): {', '.join(failed)}")
+        sys.exit(1)
+    print(f"Все проверки пройдены ({len(checks)}).")
+
+
+if __name__ == "__main__":
+    main()
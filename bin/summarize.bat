@@ -7,10 +7,18 @@ set "PYTHON_EXE=%SCRIPT_DIR%..\python\python.exe"
 set "SUMMARIZE_PY=%SCRIPT_DIR%..\src\summarize.py"
 set "PYTHONPATH=%SCRIPT_DIR%..\src;%PYTHONPATH%"
 
+REM С ASR_DAEMON=1 команда выполняется через фоновый демон (python src\daemon.py start);
+REM если демон не запущен, daemon.py выполнит ее обычным способом
+set "RUN_ARGS="
+if "%ASR_DAEMON%"=="1" (
+    set "SUMMARIZE_PY=%SCRIPT_DIR%..\src\daemon.py"
+    set "RUN_ARGS=run summarize"
+)
+
 REM Проверка наличия встроенного Python
 if exist "%PYTHON_EXE%" (
-    "%PYTHON_EXE%" "%SUMMARIZE_PY%" %*
+    "%PYTHON_EXE%" "%SUMMARIZE_PY%" %RUN_ARGS% %*
 ) else (
     REM Fallback на системный Python если embedded не найден
-    python "%SUMMARIZE_PY%" %*
+    python "%SUMMARIZE_PY%" %RUN_ARGS% %*
 )
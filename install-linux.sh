@@ -25,6 +25,7 @@ echo "[1/2] Sozdanie simvolicheskih ssylok v /usr/local/bin..."
 # Delaem fayly ispolnyaemymi
 chmod +x "$INSTALL_DIR/src/transcribe.py"
 chmod +x "$INSTALL_DIR/src/summarize.py"
+chmod +x "$INSTALL_DIR/src/daemon.py"
 
 # Sozdaem ssylki. Flag -s (symbolic) -f (force/overwrite).
 # Esli ssylka uzhe est, ona obnovitsya na noviy put.
@@ -35,6 +36,10 @@ echo "Sozdana ssylka: /usr/local/bin/transcribe -> $INSTALL_DIR/src/transcribe.p
 ln -sf "$INSTALL_DIR/src/summarize.py" /usr/local/bin/summarize
 echo "Sozdana ssylka: /usr/local/bin/summarize -> $INSTALL_DIR/src/summarize.py"
 
+# Fonovyy demon (po zhelaniyu): asr-daemon start, zatem asr-daemon run transcribe ...
+ln -sf "$INSTALL_DIR/src/daemon.py" /usr/local/bin/asr-daemon
+echo "Sozdana ssylka: /usr/local/bin/asr-daemon -> $INSTALL_DIR/src/daemon.py"
+
 echo "[2/2] Proverka ustanovki Python..."
 if command -v python3 &> /dev/null; then
     PY_VERSION=$(python3 --version)
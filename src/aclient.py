@@ -0,0 +1,437 @@
+"""
+Асинхронные клиенты ASR и саммаризации (asyncio + aiohttp).
+
+Повторяют ASRClient и SummarizerClient: те же методы с теми же параметрами
+и теми же возвращаемыми значениями (проверка: benchmarks/check_async_api.py),
+но работают в одном цикле событий: сотни задач одновременно обслуживаются
+одним потоком, а все запросы идут через общий пул keep-alive соединений
+(AsyncHttpPool) с лимитом на хост. Ограничители запросов (ratelimit) у
+синхронных и асинхронных клиентов одного сервера общие, повторы и таймауты
+те же. Отмена asyncio-задачи (task.cancel()) прерывает загрузку, опрос или
+скачивание и удаляет временные файлы.
+
+aiohttp - необязательная зависимость: pip install aiohttp
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import config
+from client import DOWNLOAD_CHUNK_SIZE, _temp_path_for, pretty_print_json_file
+from http_pool import REQUEST_TIMEOUT, STATUS_TIMEOUT, UPLOAD_TIMEOUT, AsyncHttpPool
+from multipart import MultipartFileEncoder
+from polling import (DONE_STATUSES, FAILED_STATUSES, MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, ProcessingRateModel,
+                     StatusUnavailable, TaskFailed, next_poll_delay, parse_status)
+from ratelimit import DEFAULT_RETRIES, get_limiter, request_with_retries_async
+from summarizer import extract_summary_text
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Ошибки сети, после которых идемпотентный запрос можно повторить (как NETWORK_ERRORS в client.py)
+NETWORK_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError) if aiohttp else ()
+# Ошибки запроса, которые методы клиентов перехватывают (как requests.RequestException)
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError) if aiohttp else ()
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise RuntimeError("Для асинхронных клиентов нужен пакет aiohttp: pip install aiohttp")
+
+
+def _timeout(timeout):
+    """Таймаут requests (подключение, чтение) для aiohttp."""
+    connect, read = timeout
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+
+
+async def poll_until_done(kind, status_fn, task_id, size=None, on_status=None, timeout=None,
+                          rate_model=None, max_errors=30, min_interval=None):
+    """
+    Асинхронный опрос статуса задачи с адаптивным интервалом (как PollScheduler).
+    Возвращает (ответ статуса, число запросов); ошибки - TaskFailed,
+    StatusUnavailable, TimeoutError.
+    """
+    rate_model = rate_model or ProcessingRateModel()
+    min_interval = min_interval or MIN_POLL_INTERVAL
+    max_interval = max(MAX_POLL_INTERVAL, min_interval)
+    eta = rate_model.predict(kind, size)
+    started = time.monotonic()
+    deadline = started + timeout if timeout else None
+    polls = errors = 0
+    delay = next_poll_delay(0, eta, min_interval=min_interval, max_interval=max_interval)
+
+    while True:
+        if deadline:
+            delay = max(0.0, min(delay, deadline - time.monotonic()))
+        await asyncio.sleep(delay)
+        if deadline and time.monotonic() > deadline:
+            raise TimeoutError(f"Превышено время ожидания задачи {task_id}")
+
+        status_resp = await status_fn(task_id)
+        polls += 1
+        if status_resp is None:
+            errors += 1
+            if errors >= max_errors:
+                raise StatusUnavailable(f"Не удалось получить статус задачи {task_id}")
+            delay = min_interval * 5
+            continue
+        errors = 0
+
+        status = parse_status(status_resp)
+        if on_status:
+            on_status(status, polls)
+        elapsed = time.monotonic() - started
+        if status in DONE_STATUSES:
+            rate_model.record(kind, size, elapsed)
+            return status_resp, polls
+        if status in FAILED_STATUSES:
+            raise TaskFailed(f"Задача {task_id} завершилась с ошибкой")
+        delay = next_poll_delay(elapsed, eta, min_interval=min_interval, max_interval=max_interval)
+
+
+class AsyncPoller:
+    """Опрос статусов в цикле событий с интерфейсом PollScheduler.wait (корутина)."""
+
+    def __init__(self, kind, status_fn, rate_model=None, max_errors=30):
+        self.kind = kind
+        self.status_fn = status_fn
+        self.rate_model = rate_model or ProcessingRateModel()
+        self.max_errors = max_errors
+        self.total_polls = 0
+
+    async def wait(self, task_id, size=None, on_status=None, timeout=None, min_interval=None):
+        """Ожидание завершения задачи. Возвращает (ответ статуса, число запросов)."""
+        status, polls = await poll_until_done(self.kind, self.status_fn, task_id, size=size, on_status=on_status,
+                                              timeout=timeout, rate_model=self.rate_model,
+                                              max_errors=self.max_errors, min_interval=min_interval)
+        self.total_polls += polls
+        return status, polls
+
+
+class _AsyncClientBase:
+    def __init__(self, base_url, pool=None):
+        _require_aiohttp()
+        self.base_url = base_url.rstrip('/')
+        # Собственный пул создается, только если общий не передан
+        self._own_pool = pool is None
+        self.pool = pool or AsyncHttpPool()
+        self.headers = {}
+
+    async def close(self):
+        if self._own_pool:
+            await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, limiter, method, url, idempotent=True, retries=DEFAULT_RETRIES,
+                       timeout=REQUEST_TIMEOUT, **kwargs):
+        """Запрос через ограничитель с повторами. Ответ нужно освободить (release)."""
+        kwargs["headers"] = dict(self.headers, **kwargs.get("headers", {}))
+        return await request_with_retries_async(
+            limiter, lambda: self.pool.session.request(method, url, timeout=_timeout(timeout), **kwargs),
+            idempotent=idempotent, retries=retries, network_errors=NETWORK_ERRORS)
+
+    async def _get_json(self, limiter, url, retries=DEFAULT_RETRIES, timeout=REQUEST_TIMEOUT, **kwargs):
+        """GET через ограничитель: JSON ответа; ошибки запроса пробрасываются."""
+        response = await self._request(limiter, "GET", url, retries=retries, timeout=timeout, **kwargs)
+        try:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+        finally:
+            response.release()
+
+    async def health_check(self):
+        """Проверка доступности сервиса."""
+        try:
+            async with self.pool.session.get(f"{self.base_url}/health", headers=self.headers,
+                                             timeout=_timeout(STATUS_TIMEOUT)) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except REQUEST_ERRORS as e:
+            print(f"Ошибка Health Check: {e}")
+            return None
+
+
+class AsyncASRClient(_AsyncClientBase):
+    def __init__(self, base_url=config.ASR_BASE_URL, token=None, pool=None, name=None):
+        super().__init__(base_url, pool)
+        self.token = token
+        if self.token:
+            self.headers["token"] = self.token
+        # Объем задачи (size) - длительность записи в секундах, как у ASRClient
+        self.poller = AsyncPoller("asr-audio", self.get_status)
+        # Те же ограничители, что у ASRClient этого сервера (общие для процесса)
+        host = name or urlparse(self.base_url).netloc or self.base_url
+        self.upload_limiter = get_limiter(f"asr/upload@{host}", use_latency=False)
+        self.status_limiter = get_limiter(f"asr/status@{host}")
+        self.download_limiter = get_limiter(f"asr/download@{host}")
+
+    async def start_transcribing(self, file_path, diarize=True, remove_timestamps=True, progress_callback=None):
+        """
+        Запуск транскрибации. Файл читается блоками в пуле потоков и отправляется
+        потоково; progress_callback(sent_bytes, total_bytes, bytes_per_second).
+        """
+        if not os.path.exists(file_path):
+            print(f"Файл не найден: {file_path}")
+            return None
+
+        try:
+            return await self.send_transcribing(file_path, diarize, remove_timestamps, progress_callback)
+        except REQUEST_ERRORS as e:
+            print(f"Исключение при запросе: {e}")
+            return None
+
+    async def send_transcribing(self, file_path, diarize=True, remove_timestamps=True, progress_callback=None):
+        """
+        Отправка файла на транскрибацию, как start_transcribing, но ошибки запроса
+        (aiohttp.ClientError, asyncio.TimeoutError) не перехватываются.
+        """
+        url = f"{self.base_url}/start_transcribing"
+        params = {
+            "diarize": str(diarize).lower(),
+            "remove_timestamps": str(remove_timestamps).lower()
+        }
+
+        async def send():
+            # При повторе файл отправляется заново с начала
+            encoder = MultipartFileEncoder(file_path, progress_callback=progress_callback)
+
+            async def body():
+                while True:
+                    chunk = await asyncio.to_thread(encoder.read, encoder.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+            headers = {"Content-Type": encoder.content_type, "Content-Length": str(encoder.len)}
+            try:
+                return await self.pool.session.post(url, params=params, data=body(),
+                                                    headers=dict(self.headers, **headers),
+                                                    timeout=_timeout(UPLOAD_TIMEOUT))
+            finally:
+                encoder.close()
+
+        # 429/503 - сервер не принял файл, повтор безопасен; обрыв связи - нет (задача могла создаться)
+        response = await request_with_retries_async(self.upload_limiter, send, idempotent=False,
+                                                    network_errors=NETWORK_ERRORS)
+        try:
+            if response.status != 200:
+                print(f"Ошибка при запуске: {response.status} - {await response.text()}")
+            response.raise_for_status()
+            return await response.json(content_type=None)
+        finally:
+            response.release()
+
+    async def get_status(self, task_id):
+        """Получение статуса задачи."""
+        url = f"{self.base_url}/get_status"
+        try:
+            # Без повторов: цикл опроса сам повторит запрос позже, Retry-After учитывается ограничителем
+            response = await self._request(self.status_limiter, "GET", url, retries=0, timeout=STATUS_TIMEOUT,
+                                           params={"task_id": task_id})
+            try:
+                if response.status != 200:
+                    print(f"Ошибка статуса: {response.status} - {await response.text()}")
+                response.raise_for_status()
+                return await response.json(content_type=None)
+            finally:
+                response.release()
+        except REQUEST_ERRORS as e:
+            print(f"Исключение при получении статуса: {e}")
+            return None
+
+    async def get_file(self, task_id, output_path, pretty=False, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """Скачивание результата потоково во временный файл с атомарным переименованием."""
+        url = f"{self.base_url}/get_file"
+        output_path = Path(output_path)
+        tmp_path = None
+        try:
+            response = await self._request(self.download_limiter, "GET", url, params={"task_id": task_id})
+            try:
+                if response.status != 200:
+                    print(f"Ошибка скачивания: {response.status} - {await response.text()}")
+                    return False
+
+                tmp_path = _temp_path_for(output_path)
+                with open(tmp_path, 'xb') as f:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        f.write(chunk)
+            finally:
+                response.release()
+
+            os.replace(tmp_path, output_path)
+            tmp_path = None
+
+            if pretty:
+                await asyncio.to_thread(pretty_print_json_file, output_path)
+
+            print(f"Файл сохранен: {output_path}")
+            return True
+        except REQUEST_ERRORS + (OSError,) as e:
+            print(f"Исключение при скачивании: {e}")
+            return False
+        finally:
+            # Выполняется и при отмене задачи (CancelledError)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class AsyncSummarizerClient(_AsyncClientBase):
+    def __init__(self, base_url=config.SUMMARIZER_BASE_URL, token=None, pool=None, name=None):
+        super().__init__(base_url, pool)
+        self.token = token
+        if self.token:
+            self.headers["authorization"] = f"Bearer {self.token}"
+        self.poller = AsyncPoller("summary", self.get_status)
+        self._task_sizes = {}
+        # Те же ограничители, что у SummarizerClient этого сервера (общие для процесса)
+        host = name or urlparse(self.base_url).netloc or self.base_url
+        self.create_limiter = get_limiter(f"summary/create@{host}")
+        self.status_limiter = get_limiter(f"summary/status@{host}")
+        self.result_limiter = get_limiter(f"summary/result@{host}")
+
+    async def get_prompts(self):
+        """Получить список доступных промптов."""
+        try:
+            return await self._get_json(self.result_limiter, f"{self.base_url}/api/v1/prompts")
+        except REQUEST_ERRORS as e:
+            print(f"Ошибка получения промптов: {e}")
+            return None
+
+    async def fetch_prompts(self, etag=None, last_modified=None):
+        """
+        Условный запрос списка промптов (If-None-Match / If-Modified-Since).
+        Возвращает словарь {"not_modified", "prompts", "etag", "last_modified"} или None при ошибке.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            response = await self._request(self.result_limiter, "GET", f"{self.base_url}/api/v1/prompts",
+                                           headers=headers)
+            try:
+                if response.status == 304:
+                    return {"not_modified": True, "prompts": None, "etag": etag, "last_modified": last_modified}
+                response.raise_for_status()
+                return {
+                    "not_modified": False,
+                    "prompts": await response.json(content_type=None),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+            finally:
+                response.release()
+        except REQUEST_ERRORS as e:
+            print(f"Ошибка получения промптов: {e}")
+            return None
+
+    async def create_task(self, text, prompt_id, model="llama", user_prompt=None):
+        """Создать задачу саммаризации."""
+        try:
+            return await self.send_task(text, prompt_id, model=model, user_prompt=user_prompt)
+        except REQUEST_ERRORS as e:
+            print(f"Ошибка создания задачи: {e}")
+            return None
+
+    async def send_task(self, text, prompt_id, model="llama", user_prompt=None):
+        """
+        Создание задачи, как create_task, но ошибки запроса (aiohttp.ClientError,
+        asyncio.TimeoutError) не перехватываются.
+        """
+        url = f"{self.base_url}/api/v1/tasks"
+        data = {
+            "text": text,
+            "prompt_id": prompt_id,
+            "model": model
+        }
+        if user_prompt:
+            data["user_prompt"] = user_prompt
+
+        # 429/503 - задача не создана, повтор безопасен; обрыв связи - нет
+        response = await self._request(self.create_limiter, "POST", url, idempotent=False, json=data)
+        try:
+            if response.status >= 400:
+                print(f"Ответ сервера: {await response.text()}")
+            response.raise_for_status()
+            result = await response.json(content_type=None)
+        finally:
+            response.release()
+        task_id = result.get("task_id") or result.get("id") if isinstance(result, dict) else result
+        if isinstance(task_id, (str, int)):
+            self._task_sizes[str(task_id)] = len(text)
+        return result
+
+    async def get_status(self, task_id):
+        """Получить статус задачи."""
+        url = f"{self.base_url}/api/v1/tasks/{task_id}/status"
+        try:
+            # Без повторов: цикл опроса сам повторит запрос позже, Retry-After учитывается ограничителем
+            response = await self._request(self.status_limiter, "GET", url, retries=0, timeout=STATUS_TIMEOUT)
+            try:
+                if response.status == 404:
+                    # Задачи на сервере нет (истек срок хранения): ждать ее бессмысленно
+                    return {"status": "expired"}
+                response.raise_for_status()
+                return await response.json(content_type=None)
+            finally:
+                response.release()
+        except REQUEST_ERRORS as e:
+            print(f"Ошибка получения статуса: {e}")
+            return None
+
+    async def get_result(self, task_id):
+        """Получить результат саммаризации."""
+        try:
+            return await self._get_json(self.result_limiter, f"{self.base_url}/api/v1/tasks/{task_id}/result")
+        except REQUEST_ERRORS as e:
+            print(f"Ошибка получения результата: {e}")
+            return None
+
+    async def wait_for_completion(self, task_id, poll_interval=None, timeout=300, log=print, raise_failed=False):
+        """
+        Ожидание завершения задачи. Возвращает ответ статуса или None;
+        raise_failed=True - ошибка задачи на сервере пробрасывается как TaskFailed.
+        """
+        def on_status(status, polls):
+            log(f"Статус: {status}")
+
+        size = self._task_sizes.pop(str(task_id), None)
+        try:
+            status, polls = await self.poller.wait(task_id, size=size, on_status=on_status, timeout=timeout,
+                                                   min_interval=poll_interval)
+        except TimeoutError:
+            log("Превышено время ожидания")
+            return None
+        except TaskFailed:
+            log("Задача завершилась с ошибкой")
+            if raise_failed:
+                raise
+            return None
+        except StatusUnavailable:
+            return None
+        log(f"Запросов статуса: {polls}")
+        return status
+
+    async def summarize(self, text, prompt_id, model="llama", user_prompt=None, timeout=300):
+        """Полный цикл одной задачи: создание, ожидание, результат. Возвращает текст или None."""
+        task = await self.create_task(text, prompt_id, model=model, user_prompt=user_prompt)
+        if not task:
+            return None
+        task_id = task.get("task_id") or task.get("id") if isinstance(task, dict) else task
+        if not await self.wait_for_completion(task_id, timeout=timeout):
+            return None
+        result = await self.get_result(task_id)
+        if not result:
+            return None
+        return extract_summary_text(result)
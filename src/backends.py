@@ -0,0 +1,464 @@
+"""
+Пул серверов (адрес + токен) для ASR и саммаризации.
+
+Серверы и токены перечисляются в ~/.asr_backends.json (или --backends FILE):
+
+    {
+        "routing": "least",
+        "asr": [
+            {"url": "https://bit-asr-diarize.1bitai.ru", "token": "...", "weight": 2},
+            {"url": "https://bit-asr-diarize.1bitai.ru", "token": "..."},
+            {"url": "http://asr.office.local:8000", "name": "office"}
+        ],
+        "summary": [{"url": "https://bit-summarize.1bitai.ru"}]
+    }
+
+Запись без токена использует общий (--token / ~/.asr_token). Если для
+сервиса в файле меньше двух записей (или файла нет), работает один клиент,
+как без пула.
+
+Новая задача отправляется на доступный сервер с наименьшим числом задач в
+работе на единицу веса (routing "least") или на случайный с вероятностью
+по весу ("weighted"). Если сервер не принял задачу из-за сбоя (ошибка
+сети, таймаут, 5xx, 429), она отправляется на следующий; отказ по существу
+(прочие 4xx) возвращается вызывающему сразу и на состояние сервера не
+влияет. После FAILURES_TO_EJECT сбоев подряд сервер исключается из
+отправки новых задач; когда время исключения проходит, он проверяется
+через health_check в фоне (при неудаче время удваивается).
+
+Задача закреплена за сервером, который ее создал: пул возвращает task_id
+вида "id@имя", и статус, результат и --resume идут на тот же сервер.
+task_id без известного имени относится к первому серверу списка.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+
+ROUTING_MODES = ("least", "weighted")
+
+# Ошибок подряд до исключения сервера и время исключения (секунды, удваивается)
+FAILURES_TO_EJECT = 2
+EJECT_SECONDS = 30.0
+MAX_EJECT_SECONDS = 600.0
+
+# Разделитель task_id и имени сервера в закрепленном task_id
+PIN_SEPARATOR = "@"
+
+
+def task_id_of(result):
+    """task_id из ответа на создание задачи (словарь с task_id/id или сам id)."""
+    return result.get("task_id") or result.get("id") if isinstance(result, dict) else result
+
+
+def is_backend_failure(error):
+    """
+    True, если ошибка запроса (requests.RequestException) - сбой сервера:
+    сеть, таймаут, 5xx или 429. Такую задачу можно отправить на другой сервер.
+    """
+    import requests
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+def _with_task_id(result, task_id):
+    if not isinstance(result, dict):
+        return task_id
+    result = dict(result)
+    for key in ("task_id", "id"):
+        if key in result:
+            result[key] = task_id
+    result.setdefault("task_id", task_id)
+    return result
+
+
+class Backend:
+    """Сервер пула: клиент, вес и состояние."""
+
+    def __init__(self, name, client, weight=1.0):
+        self.name = name
+        self.client = client
+        self.weight = weight
+        self.outstanding = 0
+        self.submitted = 0
+        self.errors = 0
+        self.failures = 0
+        self.down = False
+        self.probing = False
+        self.retry_at = 0.0
+        self.eject_seconds = EJECT_SECONDS
+
+    def describe(self):
+        state = "исключен" if self.down else "доступен"
+        return (f"{self.name}: задач {self.submitted}, ошибок отправки {self.errors}, "
+                f"в работе {self.outstanding}, {state}")
+
+
+class BackendPool:
+    """Общая часть пулов: выбор сервера, учет ошибок и закрепление task_id."""
+
+    def __init__(self, kind, backends, routing="least"):
+        self.kind = kind
+        self.backends = backends
+        self.routing = routing
+        self._by_name = {backend.name: backend for backend in backends}
+        self._lock = threading.Lock()
+        # Закрепленный task_id -> сервер (задачи в работе)
+        self._tasks = {}
+
+    @property
+    def clients(self):
+        return [backend.client for backend in self.backends]
+
+    def route(self, task_id):
+        """(сервер, task_id на этом сервере) для закрепленного task_id."""
+        raw, sep, name = str(task_id).rpartition(PIN_SEPARATOR)
+        backend = self._by_name.get(name) if sep else None
+        if backend is None:
+            return self.backends[0], task_id
+        return backend, raw
+
+    def _pick(self, tried):
+        """Сервер для новой задачи (кроме уже опробованных) или None."""
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend not in tried]
+            if not candidates:
+                return None
+            up = [backend for backend in candidates if not backend.down]
+            if not up:
+                # Все оставшиеся исключены: пробуем тот, который пора проверять раньше
+                backend = min(candidates, key=lambda b: b.retry_at)
+            elif self.routing == "weighted":
+                backend = random.choices(up, weights=[b.weight for b in up])[0]
+            else:
+                # Равные по нагрузке серверы выбираются случайно
+                backend = min(up, key=lambda b: (b.outstanding / b.weight, random.random()))
+            backend.outstanding += 1
+            return backend
+
+    def _release(self, backend):
+        """Задача не создана, но сервер исправен (отказ по существу запроса)."""
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _failed(self, backend):
+        with self._lock:
+            backend.outstanding -= 1
+            backend.errors += 1
+            backend.failures += 1
+            if backend.down or backend.failures >= FAILURES_TO_EJECT:
+                self._eject(backend)
+
+    def _eject(self, backend):
+        """Исключает сервер (вызывается под _lock)."""
+        if not backend.down:
+            print(f"Сервер {self.kind} {backend.name} исключен на {backend.eject_seconds:.0f} с "
+                  f"после {backend.failures} ошибок подряд")
+        backend.down = True
+        backend.retry_at = time.monotonic() + backend.eject_seconds
+        backend.eject_seconds = min(backend.eject_seconds * 2, MAX_EJECT_SECONDS)
+
+    def _restore(self, backend):
+        """Возвращает сервер в работу (вызывается под _lock)."""
+        if backend.down:
+            print(f"Сервер {self.kind} {backend.name} снова доступен")
+        backend.down = False
+        backend.failures = 0
+        backend.eject_seconds = EJECT_SECONDS
+
+    def _probe_due(self):
+        """Фоновая проверка исключенных серверов, у которых истекло время исключения."""
+        now = time.monotonic()
+        with self._lock:
+            due = [b for b in self.backends if b.down and not b.probing and now >= b.retry_at]
+            for backend in due:
+                backend.probing = True
+        for backend in due:
+            threading.Thread(target=self._probe, args=(backend,), name=f"probe-{backend.name}", daemon=True).start()
+
+    def _health(self, backend):
+        """Ответ health сервера или None (недоступен или проверка упала)."""
+        try:
+            return backend.client.health_check()
+        except Exception as e:
+            print(f"Ошибка проверки сервера {self.kind} {backend.name}: {e}")
+            return None
+
+    def _probe(self, backend):
+        healthy = False
+        try:
+            healthy = self._health(backend) is not None
+        finally:
+            # Даже если проверка прервалась, сервер не должен остаться в состоянии "проверяется"
+            with self._lock:
+                backend.probing = False
+                if healthy:
+                    self._restore(backend)
+                else:
+                    self._eject(backend)
+
+    def _submit(self, send):
+        """
+        Создает задачу через send(client) на выбранном сервере, при сбое сервера -
+        на следующем. send пробрасывает ошибки запроса (requests.RequestException).
+        Возвращает ответ с закрепленным task_id или None.
+        """
+        import requests
+
+        self._probe_due()
+        tried = []
+        while True:
+            backend = self._pick(tried)
+            if backend is None:
+                return None
+            tried.append(backend)
+            try:
+                result = send(backend.client)
+            except requests.RequestException as e:
+                if not is_backend_failure(e):
+                    # Отказ по существу (4xx): другой сервер ответит так же
+                    self._release(backend)
+                    print(f"Сервер {self.kind} {backend.name} отклонил задачу: {e}")
+                    if e.response is not None:
+                        print(f"Ответ сервера: {e.response.text}")
+                    return None
+                print(f"Ошибка сервера {self.kind} {backend.name}: {e}")
+                result = None
+            task_id = task_id_of(result) if result else None
+            if task_id is None:
+                self._failed(backend)
+                if len(tried) < len(self.backends):
+                    print(f"Сервер {self.kind} {backend.name} не принял задачу, отправляем на другой")
+                continue
+            pinned = f"{task_id}{PIN_SEPARATOR}{backend.name}"
+            with self._lock:
+                backend.submitted += 1
+                self._restore(backend)
+                self._tasks[pinned] = backend
+            return _with_task_id(result, pinned)
+
+    def _done(self, task_id):
+        """Задача завершилась: сервер освобождается для новых задач."""
+        with self._lock:
+            backend = self._tasks.pop(str(task_id), None)
+            if backend is not None:
+                backend.outstanding -= 1
+
+    def check_health(self):
+        """Проверяет все серверы параллельно, недоступные исключаются. Возвращает число доступных."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as executor:
+            results = list(executor.map(lambda b: self._health(b) is not None, self.backends))
+        with self._lock:
+            for backend, healthy in zip(self.backends, results):
+                if healthy:
+                    self._restore(backend)
+                else:
+                    backend.failures = max(backend.failures, FAILURES_TO_EJECT)
+                    self._eject(backend)
+        return sum(results)
+
+    def health_check(self):
+        """Состояние серверов пула ({имя: ответ health}) или None, если недоступны все."""
+        results = {backend.name: self._health(backend) for backend in self.backends}
+        return results if any(result is not None for result in results.values()) else None
+
+    def describe(self):
+        with self._lock:
+            return [backend.describe() for backend in self.backends]
+
+
+class _PoolPoller:
+    """
+    Опрос статусов через цикл опроса сервера задачи (интерфейс PollScheduler):
+    серверы опрашиваются параллельно, а не одним потоком по очереди.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def submit(self, task_id, size=None, on_status=None, timeout=None, min_interval=None):
+        backend, raw_id = self.pool.route(task_id)
+        future = backend.client.poller.submit(raw_id, size=size, on_status=on_status, timeout=timeout,
+                                              min_interval=min_interval)
+        future.add_done_callback(lambda _: self.pool._done(task_id))
+        return future
+
+    def wait(self, task_id, size=None, on_status=None, timeout=None, min_interval=None):
+        future = self.submit(task_id, size, on_status, timeout, min_interval)
+        return future.result(), future.polls
+
+
+class ASRPool(BackendPool):
+    """Пул серверов ASR с интерфейсом ASRClient."""
+
+    def __init__(self, backends, routing="least"):
+        super().__init__("asr", backends, routing)
+        self.poller = _PoolPoller(self)
+
+    def start_transcribing(self, file_path, **kwargs):
+        if not os.path.exists(file_path):
+            print(f"Файл не найден: {file_path}")
+            return None
+        return self._submit(lambda client: client.send_transcribing(file_path, **kwargs))
+
+    def get_status(self, task_id):
+        backend, raw_id = self.route(task_id)
+        return backend.client.get_status(raw_id)
+
+    def get_file(self, task_id, output_path, **kwargs):
+        backend, raw_id = self.route(task_id)
+        return backend.client.get_file(raw_id, output_path, **kwargs)
+
+
+class SummarizerPool(BackendPool):
+    """Пул серверов саммаризации с интерфейсом SummarizerClient."""
+
+    def __init__(self, backends, routing="least"):
+        super().__init__("summary", backends, routing)
+
+    def _first(self, request):
+        """Запрос, не привязанный к задаче (каталог промптов): первый доступный сервер, ответивший не None."""
+        with self._lock:
+            ordered = sorted(self.backends, key=lambda b: b.down)
+        for backend in ordered:
+            result = request(backend.client)
+            if result is not None:
+                return result
+        return None
+
+    def get_prompts(self):
+        return self._first(lambda client: client.get_prompts())
+
+    def fetch_prompts(self, etag=None, last_modified=None):
+        return self._first(lambda client: client.fetch_prompts(etag=etag, last_modified=last_modified))
+
+    def create_task(self, text, prompt_id, model="llama", user_prompt=None):
+        return self._submit(lambda client: client.send_task(text, prompt_id, model=model, user_prompt=user_prompt))
+
+    def get_status(self, task_id):
+        backend, raw_id = self.route(task_id)
+        return backend.client.get_status(raw_id)
+
+    def get_result(self, task_id):
+        backend, raw_id = self.route(task_id)
+        return backend.client.get_result(raw_id)
+
+    def wait_for_completion(self, task_id, poll_interval=None, timeout=300, log=print, raise_failed=False):
+        backend, raw_id = self.route(task_id)
+        try:
+            return backend.client.wait_for_completion(raw_id, poll_interval, timeout=timeout, log=log,
+                                                      raise_failed=raise_failed)
+        finally:
+            self._done(task_id)
+
+    def summarize(self, text, prompt_id, model="llama", user_prompt=None, timeout=300):
+        """Полный цикл одной задачи: создание, ожидание, результат. Возвращает текст или None."""
+        from summarizer import extract_summary_text
+
+        task_id = task_id_of(self.create_task(text, prompt_id, model=model, user_prompt=user_prompt) or {})
+        if not task_id or not self.wait_for_completion(task_id, timeout=timeout):
+            return None
+        result = self.get_result(task_id)
+        return extract_summary_text(result) if result else None
+
+
+def load_backends(kind, path=None):
+    """
+    Записи серверов сервиса kind ("asr" или "summary") из файла и режим
+    выбора: tuple (список словарей url/token/weight/name, routing).
+    Нет файла - пустой список; ошибка в файле - предупреждение и пустой список.
+    """
+    path = path or config.BACKENDS_FILE
+    if not os.path.exists(path):
+        return [], "least"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        routing = data.get("routing", "least")
+        if routing not in ROUTING_MODES:
+            raise ValueError(f"routing должен быть одним из: {', '.join(ROUTING_MODES)}")
+        entries = []
+        for entry in data.get(kind) or []:
+            if isinstance(entry, str):
+                entry = {"url": entry}
+            if not entry.get("url"):
+                raise ValueError(f"у сервера {kind} не указан url")
+            weight = float(entry.get("weight", 1))
+            if weight <= 0:
+                raise ValueError(f"вес сервера {entry['url']} должен быть больше 0")
+            entries.append({"url": entry["url"].rstrip("/"), "token": entry.get("token"),
+                            "weight": weight, "name": entry.get("name")})
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"Предупреждение: файл серверов {path} не прочитан ({e}), используется один сервер")
+        return [], "least"
+    return entries, routing
+
+
+def _backend_names(entries, default_token):
+    """
+    Имена серверов: name из файла, иначе адрес (host:port). Для нескольких
+    токенов одного адреса добавляется отпечаток токена - имя не меняется при
+    перестановке записей, поэтому закрепленные task_id в журнале остаются верными.
+    """
+    hosts = [urlparse(entry["url"]).netloc or entry["url"] for entry in entries]
+    names = []
+    for entry, host in zip(entries, hosts):
+        name = entry["name"] or host
+        if not entry["name"] and hosts.count(host) > 1:
+            token = entry["token"] or default_token or ""
+            name = f"{host}#{hashlib.sha1(token.encode('utf-8')).hexdigest()[:6]}"
+        names.append(name.replace(PIN_SEPARATOR, "_"))
+    if len(set(names)) != len(names):
+        print("Предупреждение: одинаковые имена серверов в файле серверов, задачи могут уйти не на тот сервер")
+    return names
+
+
+def _make_pool(kind, client_class, pool_class, base_url, token, pool_size, path):
+    entries, routing = load_backends(kind, path)
+    if len(entries) < 2:
+        if entries:
+            base_url, token = entries[0]["url"], entries[0]["token"] or token
+        return client_class(base_url=base_url, token=token, pool_size=pool_size)
+    names = _backend_names(entries, token)
+    backends = [Backend(name, client_class(base_url=entry["url"], token=entry["token"] or token,
+                                           pool_size=pool_size, name=name), entry["weight"])
+                for name, entry in zip(names, entries)]
+    return pool_class(backends, routing)
+
+
+def make_asr_client(base_url, token, pool_size=None, path=None):
+    """ASRClient или ASRPool, если в файле серверов несколько серверов ASR."""
+    from client import ASRClient
+
+    return _make_pool("asr", ASRClient, ASRPool, base_url, token, pool_size, path)
+
+
+def make_summarizer_client(base_url, token, pool_size=None, path=None):
+    """SummarizerClient или SummarizerPool, если в файле серверов несколько серверов саммаризации."""
+    from summarizer import SummarizerClient
+
+    return _make_pool("summary", SummarizerClient, SummarizerPool, base_url, token, pool_size, path)
+
+
+def backend_count(client):
+    """Число серверов за клиентом (1 для обычного клиента)."""
+    return len(client.backends) if isinstance(client, BackendPool) else 1
+
+
+def report_backends(*clients):
+    """Итоги по серверам пулов (обычные клиенты пропускаются)."""
+    for client in clients:
+        if isinstance(client, BackendPool):
+            print(f"\nСерверы {client.kind}:")
+            for line in client.describe():
+                print(f"  {line}")
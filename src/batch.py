@@ -0,0 +1,213 @@
+import glob
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Расширения, которые считаются аудиофайлами при обходе папок
+AUDIO_EXTENSIONS = {
+    ".mp3", ".wav", ".m4a", ".ogg", ".opus", ".flac", ".aac",
+    ".wma", ".webm", ".mp4", ".mkv", ".mov",
+}
+
+# Оценка длительности файлов, для которых проба не знает длительность (128 кбит/с)
+UNKNOWN_BYTES_PER_SECOND = 16000
+
+# Общая блокировка вывода, чтобы строки из разных потоков не перемешивались
+_print_lock = threading.Lock()
+
+
+class JobError(Exception):
+    """Ошибка обработки одного файла (не прерывает пакетный запуск)."""
+
+
+class TaskFailedError(JobError):
+    """Сервер сообщил, что задача завершилась с ошибкой (повторять ее бессмысленно)."""
+
+
+class TranscribeJob:
+    """Состояние обработки одного файла в пакетном режиме."""
+
+    def __init__(self, source):
+        self.source = Path(source)
+        self.input_path = None
+        self.task_id = None
+        self.base_name = None
+        self.cache_key = None
+        self.cached_result = None
+        self.output_folder = None
+        self.output_file = None
+        self.summary_file = None
+        self.summary_text = None
+        self.summary_journal_id = None
+        # Саммаризация взята из локального кэша
+        self.summary_cached = False
+        # Текущий этап конвейера
+        self.stage = None
+        self.journal_id = None
+        # Параметры запуска для этого файла (при --resume берутся из журнала)
+        self.options = None
+        # Выбор промпта и модели саммаризации (см. plan.RunPlan)
+        self.plan = None
+        self.polls = 0
+        self.upload_bytes = 0
+        self.upload_speed = 0.0
+        # Предобработка перед загрузкой: карта смещений времени и экономия
+        self.offset_map = None
+        self.bytes_saved = 0
+        self.upload_seconds_saved = 0.0
+        # Распознавание по частям (см. chunking.py)
+        self.chunks = None
+        self.chunk_dir = None
+        # Параметры аудио по заголовкам файла (см. probe.py)
+        self.audio = None
+        # Способ размещения аудио в папке результатов (см. placement.py)
+        self.placement = None
+        # Режим --watch: ключ файла в индексе и время, когда файл появился в папке
+        self.watch_key = None
+        self.detected = None
+        self.status = "pending"
+        self.error = None
+        self.started = None
+        self.finished = None
+        # Префикс с именем файла в логах (включается в пакетном режиме)
+        self.show_prefix = False
+
+    @property
+    def name(self):
+        return self.source.name
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def expected_duration(self):
+        """Длительность записи по пробе (или оценка по размеру файла) в секундах."""
+        if self.audio is None:
+            return None
+        if self.audio.duration is not None:
+            return self.audio.duration
+        return self.audio.size / UNKNOWN_BYTES_PER_SECOND
+
+    @property
+    def audio_seconds(self):
+        """
+        Объем задачи для прогноза времени обработки на сервере (секунды записи):
+        длительность по пробе, а без пробы (--no-probe, --resume) - оценка по размеру файла.
+        """
+        if self.audio is not None:
+            return self.expected_duration
+        try:
+            return (self.input_path or self.source).stat().st_size / UNKNOWN_BYTES_PER_SECOND
+        except OSError:
+            return None
+
+    def log(self, message):
+        """Потокобезопасный вывод сообщения с префиксом файла."""
+        if self.show_prefix:
+            message = "\n".join(f"[{self.name}] {line}" if line else line
+                                for line in str(message).split("\n"))
+        with _print_lock:
+            print(message, flush=True)
+
+
+def collect_input_files(inputs, recursive=False):
+    """
+    Раскрывает список файлов, папок и glob-шаблонов в список путей.
+    Папки обходятся по расширениям из AUDIO_EXTENSIONS.
+    Возвращает tuple (files, missing) — найденные файлы и несовпавшие входы.
+    """
+    files = []
+    missing = []
+    seen = set()
+
+    def add(path):
+        resolved = Path(path).resolve()
+        if resolved not in seen:
+            seen.add(resolved)
+            files.append(resolved)
+
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            walker = path.rglob("*") if recursive else path.glob("*")
+            for child in sorted(walker):
+                if child.is_file() and child.suffix.lower() in AUDIO_EXTENSIONS:
+                    add(child)
+        elif path.is_file():
+            add(path)
+        elif glob.has_magic(item):
+            matches = [m for m in sorted(glob.glob(item, recursive=True)) if os.path.isfile(m)]
+            if not matches:
+                missing.append(item)
+            for match in matches:
+                add(match)
+        else:
+            missing.append(item)
+
+    return files, missing
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def print_report(jobs):
+    """Выводит итоговую таблицу по всем файлам пакета."""
+    status_titles = {"ok": "OK", "failed": "ОШИБКА", "pending": "ПРОПУЩЕН", "running": "ПРЕРВАН"}
+    rows = [(job.name, status_titles.get(job.status, job.status), format_duration(job.elapsed), str(job.polls),
+             job.error or "")
+            for job in jobs]
+    headers = ("Файл", "Статус", "Время", "Опросов", "Подробности")
+    widths = [max(len(headers[i]), *(len(row[i]) for row in rows)) for i in range(4)]
+
+    def line(cells):
+        return "  ".join(cell.ljust(widths[i]) for i, cell in enumerate(cells[:4])) + "  " + cells[4]
+
+    ok_count = sum(1 for job in jobs if job.status == "ok")
+    with _print_lock:
+        print("\n--- Итоги ---")
+        print(line(headers))
+        print(line(tuple("-" * w for w in widths) + ("-" * len(headers[4]),)))
+        for row in rows:
+            print(line(row))
+        print(f"\nУспешно: {ok_count} из {len(jobs)}, запросов статуса: {sum(job.polls for job in jobs)}")
+        saved = sum(job.bytes_saved for job in jobs)
+        if saved:
+            seconds = sum(job.upload_seconds_saved for job in jobs)
+            print(f"Предобработка: загружено меньше на {saved / 1024 / 1024:.1f} МБ (~{format_duration(seconds)})")
+
+
+def write_report_json(jobs, path):
+    """Сохраняет итоги по файлам в JSON (для скриптов и бенчмарков)."""
+    report = [{
+        "file": str(job.source),
+        "status": job.status,
+        "error": job.error,
+        "task_id": job.task_id,
+        "started": job.started,
+        "finished": job.finished,
+        "elapsed": job.elapsed,
+        "duration": job.audio.duration if job.audio else None,
+        "polls": job.polls,
+        "upload_bytes": job.upload_bytes,
+        "bytes_saved": job.bytes_saved,
+        "upload_seconds_saved": job.upload_seconds_saved,
+        "cached": bool(job.cached_result),
+        "summary_cached": job.summary_cached,
+        "placement": job.placement,
+        "detected": job.detected,
+    } for job in jobs]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import unicodedata
+import uuid
+from pathlib import Path
+
+import config
+
+# Размер блока при вычислении хэша файла
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Ограничение размера кэша по умолчанию
+DEFAULT_MAX_CACHE_BYTES = 1024 * 1024 * 1024
+
+# Кэш саммаризаций: раздел и ограничение размера (пересказы небольшие)
+SUMMARY_NAMESPACE = "summary"
+DEFAULT_MAX_SUMMARY_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def hash_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Потоковый SHA-256 содержимого файла (память не зависит от размера)."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    """
+    SHA-256 нормализованного текста: форма Unicode (NFC), пробелы по краям и
+    внутри строк и пустые строки на ключ не влияют.
+    """
+    digest = hashlib.sha256()
+    for line in unicodedata.normalize("NFC", text).splitlines():
+        line = " ".join(line.split())
+        if line:
+            digest.update(line.encode('utf-8'))
+            digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def make_key(content_hash, **params):
+    """Ключ кэша: хэш содержимого + параметры запроса."""
+    payload = json.dumps({"content": content_hash, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def summary_key(text, prompt_id, model, user_prompt=None, prompt_info=None, chunk_chars=None):
+    """
+    Ключ кэша саммаризации: нормализованный текст, промпт по содержимому
+    (у локальных промптов id всегда "custom", поэтому важен сам текст
+    промпта; prompt_info - описание промпта API из каталога) и модель.
+    Для текста длиннее chunk_chars в ключ входят размер фрагмента и промпт
+    этапа map: от них зависит результат саммаризации по частям.
+    """
+    params = {
+        "kind": "summary",
+        "prompt_id": prompt_id,
+        "user_prompt": (user_prompt or "").strip() or None,
+        "prompt": prompt_info,
+        "model": model,
+    }
+    if chunk_chars and len(text) > chunk_chars:
+        from mapreduce import MAP_PROMPT
+        params["chunk_chars"] = chunk_chars
+        params["map_prompt"] = MAP_PROMPT
+    return make_key(hash_text(text), **params)
+
+
+class ResultCache:
+    """
+    Локальный кэш результатов с адресацией по содержимому.
+
+    Записи хранятся файлами <dir>/<namespace>/<key[:2]>/<key><suffix>.
+    Время изменения файла используется как время последнего доступа:
+    при превышении max_bytes удаляются записи, к которым дольше всего
+    не обращались (LRU).
+    """
+
+    def __init__(self, namespace="asr", directory=None, max_bytes=DEFAULT_MAX_CACHE_BYTES, suffix=".json"):
+        self.directory = Path(directory or config.CACHE_DIR) / namespace
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in self.directory.glob(f"*/*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def key_for_file(self, file_path, **params):
+        return make_key(hash_file(file_path), **params)
+
+    def get(self, key):
+        """Возвращает путь к записи или None. Обращение обновляет время доступа."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, source_path):
+        """Сохраняет копию файла в кэш (атомарно) и применяет ограничение размера."""
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Предупреждение: Не удалось сохранить результат в кэш: {e}")
+            return None
+        self.prune()
+        return path
+
+    def get_text(self, key):
+        """Текст записи или None (нет в кэше или не читается)."""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def put_text(self, key, text):
+        """Сохраняет текст в кэш (атомарно) и применяет ограничение размера."""
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Предупреждение: Не удалось сохранить результат в кэш: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return None
+        self.prune()
+        return path
+
+    def prune(self, max_bytes=None):
+        """
+        Удаляет самые давно использованные записи, пока размер кэша больше max_bytes.
+        Возвращает tuple (removed_count, freed_bytes).
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        removed, freed = 0, 0
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= limit:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                freed += size
+        return removed, freed
+
+    def stats(self):
+        entries = self._entries()
+        mtimes = [mtime for mtime, _, _ in entries]
+        return {
+            "directory": str(self.directory),
+            "entries": len(entries),
+            "total_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "oldest_access": min(mtimes) if mtimes else None,
+            "newest_access": max(mtimes) if mtimes else None,
+        }
+
+
+def open_summary_cache():
+    """Кэш готовых саммаризаций (~/.asr_cache/summary, файлы .md)."""
+    return ResultCache(namespace=SUMMARY_NAMESPACE, max_bytes=DEFAULT_MAX_SUMMARY_CACHE_BYTES, suffix=".md")
+
+
+def run_cache_command(argv, namespaces=("asr", SUMMARY_NAMESPACE)):
+    """Подкоманды управления кэшем: stats и prune."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="transcribe cache", description="Управление локальным кэшем результатов")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Показать размер и количество записей кэша")
+    prune_parser = subparsers.add_parser("prune", help="Удалить давно не использованные записи")
+    prune_parser.add_argument("--max-size", type=float, default=None,
+                              help="Оставить не более указанного размера в МБ (по умолчанию: лимит кэша)")
+    prune_parser.add_argument("--all", action="store_true", help="Полностью очистить кэш")
+    args = parser.parse_args(argv)
+
+    for namespace in namespaces:
+        cache = open_summary_cache() if namespace == SUMMARY_NAMESPACE else ResultCache(namespace=namespace)
+        if args.command == "stats":
+            stats = cache.stats()
+            print(f"Кэш '{namespace}': {stats['directory']}")
+            print(f"  Записей: {stats['entries']}")
+            print(f"  Размер: {stats['total_bytes'] / 1024 / 1024:.1f} МБ из {stats['max_bytes'] / 1024 / 1024:.0f} МБ")
+            if stats['newest_access']:
+                print(f"  Последнее обращение: {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['newest_access']))}")
+        else:
+            if args.all:
+                max_bytes = 0
+            elif args.max_size is not None:
+                max_bytes = int(args.max_size * 1024 * 1024)
+            else:
+                max_bytes = None
+            removed, freed = cache.prune(max_bytes)
+            print(f"Кэш '{namespace}': удалено записей: {removed}, освобождено {freed / 1024 / 1024:.1f} МБ")
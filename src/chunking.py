@@ -0,0 +1,273 @@
+"""
+Распознавание длинных записей по частям.
+
+Запись (WAV) делится на части примерно по N минут; граница ищется в
+самом тихом месте около целевой отметки, чтобы не резать слова. Каждая
+часть начинается на CHUNK_OVERLAP секунд раньше границы: по этому
+перекрытию метки дикторов соседних частей сопоставляются между собой
+(у каждой задачи на сервере своя нумерация SPEAKER_xx). При склейке
+ко всем меткам времени прибавляется смещение части, а дубли из зоны
+перекрытия отбрасываются.
+
+Поиск тихого места использует numpy (необязательная зависимость); без
+него запись режется ровно по N минут.
+"""
+import json
+import os
+import uuid
+import wave
+from pathlib import Path
+
+# Перекрытие соседних частей (секунды) - для сопоставления дикторов
+CHUNK_OVERLAP = 10.0
+# Насколько далеко от целевой границы искать паузу (секунды в каждую сторону)
+CUT_SEARCH = 30.0
+# Окно анализа громкости и длина паузы, которую ищем
+CUT_WINDOW = 0.1
+CUT_PAUSE = 0.5
+# Файлы короче CHUNK_MIN_FACTOR * N минут не делятся
+CHUNK_MIN_FACTOR = 1.5
+# Блок копирования кадров при записи частей
+COPY_FRAMES = 64 * 1024
+
+
+class Chunk:
+    """Часть записи и состояние ее задачи на сервере."""
+
+    def __init__(self, index, start, keep_from, end):
+        self.index = index
+        # Границы файла части в секундах исходной записи (start - с учетом перекрытия)
+        self.start = start
+        self.end = end
+        # С какого момента сегменты этой части попадают в итог (граница с предыдущей)
+        self.keep_from = keep_from
+        self.path = None
+        self.task_id = None
+        self.attempts = 0
+        self.error = None
+        self.result_path = None
+        # Карта смещений предобработки части (см. preprocess.py)
+        self.offset_map = None
+
+    @property
+    def name(self):
+        return f"часть {self.index + 1}"
+
+
+def wav_duration(path):
+    """Длительность WAV в секундах или None, если это не WAV PCM."""
+    try:
+        with wave.open(str(path), "rb") as w:
+            rate = w.getframerate()
+            return w.getnframes() / rate if rate else None
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+def should_chunk(path, chunk_seconds):
+    duration = wav_duration(path)
+    return duration is not None and duration > chunk_seconds * CHUNK_MIN_FACTOR
+
+
+def _quietest_point(w, target, search, np):
+    """Середина самой тихой паузы CUT_PAUSE секунд в окрестности target (секунды)."""
+    rate = w.getframerate()
+    channels = w.getnchannels()
+    width = w.getsampwidth()
+    first = max(0, int((target - search) * rate))
+    last = min(w.getnframes(), int((target + search) * rate))
+    w.setpos(first)
+    raw = w.readframes(last - first)
+    if width == 1:
+        data = np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32)
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32)
+    else:
+        return target
+    data = data[:len(data) - len(data) % channels].reshape(-1, channels).mean(axis=1)
+
+    window = max(1, int(CUT_WINDOW * rate))
+    count = len(data) // window
+    if count < 2:
+        return target
+    energy = (data[:count * window].reshape(count, window) ** 2).mean(axis=1)
+    span = max(1, int(CUT_PAUSE / CUT_WINDOW))
+    smoothed = np.convolve(energy, np.ones(span) / span, mode="valid")
+    best = int(np.argmin(smoothed))
+    return (first + (best + span / 2) * window) / rate
+
+
+def plan_chunks(path, chunk_seconds, overlap=CHUNK_OVERLAP, search=CUT_SEARCH):
+    """Границы частей записи. Возвращает список Chunk (файлы еще не записаны)."""
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    with wave.open(str(path), "rb") as w:
+        duration = w.getnframes() / w.getframerate()
+        search = min(search, chunk_seconds / 4)
+        cuts = [0.0]
+        target = chunk_seconds
+        while target < duration - chunk_seconds / 2:
+            cut = _quietest_point(w, target, search, np) if np is not None else target
+            cuts.append(cut)
+            target = cut + chunk_seconds
+        cuts.append(duration)
+
+    chunks = []
+    for index in range(len(cuts) - 1):
+        start = max(0.0, cuts[index] - overlap) if index else 0.0
+        chunks.append(Chunk(index, start, cuts[index], cuts[index + 1]))
+    return chunks
+
+
+def write_chunks(path, chunks, output_dir):
+    """Записывает части в отдельные WAV-файлы (формат исходного файла, копирование блоками)."""
+    stem = Path(path).stem
+    with wave.open(str(path), "rb") as source:
+        rate = source.getframerate()
+        for chunk in chunks:
+            chunk.path = Path(output_dir) / f"{stem}.part{chunk.index + 1:03d}.wav"
+            first = int(chunk.start * rate)
+            remaining = int(chunk.end * rate) - first
+            source.setpos(first)
+            with wave.open(str(chunk.path), "wb") as out:
+                out.setnchannels(source.getnchannels())
+                out.setsampwidth(source.getsampwidth())
+                out.setframerate(rate)
+                while remaining > 0:
+                    frames = source.readframes(min(remaining, COPY_FRAMES))
+                    if not frames:
+                        break
+                    out.writeframes(frames)
+                    remaining -= len(frames) // (source.getnchannels() * source.getsampwidth())
+
+
+def _segments(data):
+    """Список сегментов из ответа ASR (список или словарь с ключом segments)."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and isinstance(data.get("segments"), list):
+        return data["segments"]
+    return None
+
+
+def _timed(segment):
+    return isinstance(segment, dict) and all(
+        isinstance(segment.get(key), (int, float)) and not isinstance(segment.get(key), bool)
+        for key in ("start", "end"))
+
+
+def _shift(node, offset):
+    """Прибавляет offset ко всем меткам start/end (включая вложенные, например слова)."""
+    if isinstance(node, list):
+        for item in node:
+            _shift(item, offset)
+    elif isinstance(node, dict):
+        for key in ("start", "end"):
+            value = node.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                node[key] = round(value + offset, 3)
+        for value in node.values():
+            if isinstance(value, (list, dict)):
+                _shift(value, offset)
+
+
+def _match_speakers(previous, current, overlap_start, overlap_end):
+    """
+    Сопоставление дикторов соседних частей по совместному времени речи
+    в зоне перекрытия: пары с наибольшим пересечением связываются первыми.
+    Возвращает {локальная метка текущей части: глобальная метка}.
+    """
+    shared = {}
+    for p in previous:
+        for c in current:
+            start = max(p["start"], c["start"], overlap_start)
+            end = min(p["end"], c["end"], overlap_end)
+            if end > start:
+                key = (p["speaker"], c["speaker"])
+                shared[key] = shared.get(key, 0.0) + end - start
+
+    mapping = {}
+    used = set()
+    for (global_label, local_label), _ in sorted(shared.items(), key=lambda item: -item[1]):
+        if local_label not in mapping and global_label not in used:
+            mapping[local_label] = global_label
+            used.add(global_label)
+    return mapping
+
+
+def merge_transcripts(chunks, results):
+    """
+    Склеивает ответы ASR по частям в один результат.
+    results - ответы в порядке частей. Формат итога повторяет формат ответа части.
+    """
+    merged = []
+    labels = set()
+    previous = []
+    timed = all(segments is not None and all(_timed(s) for s in segments)
+                for segments in (_segments(r) for r in results))
+
+    for chunk, result in zip(chunks, results):
+        segments = _segments(result)
+        if segments is None:
+            raise ValueError(f"Неожиданный формат результата ({chunk.name})")
+        segments = json.loads(json.dumps(segments))
+        if timed:
+            _shift(segments, chunk.start)
+
+        speakers = [s for s in segments if isinstance(s, dict) and "speaker" in s]
+        if chunk.index and timed:
+            mapping = _match_speakers(previous, speakers, chunk.start, chunk.keep_from)
+        else:
+            mapping = {}
+        # Дикторы без пары в перекрытии получают новую метку: нумерация дикторов
+        # в каждой задаче своя, и совпадение локальной метки с глобальной случайно
+        for segment in speakers:
+            local = segment["speaker"]
+            if local not in mapping:
+                taken = set(mapping.values())
+                if chunk.index == 0:
+                    mapping[local] = local
+                else:
+                    number = len(labels | taken)
+                    while f"SPEAKER_{number:02d}" in labels | taken:
+                        number += 1
+                    mapping[local] = f"SPEAKER_{number:02d}"
+        for segment in speakers:
+            segment["speaker"] = mapping[segment["speaker"]]
+        labels.update(mapping.values())
+
+        if timed and chunk.index:
+            # Сегменты из зоны перекрытия уже есть у предыдущей части
+            segments = [s for s in segments if (s["start"] + s["end"]) / 2 >= chunk.keep_from]
+        merged.extend(segments)
+        previous = [s for s in segments if isinstance(s, dict) and "speaker" in s] if timed else []
+
+    first = results[0]
+    if isinstance(first, dict):
+        combined = dict(first)
+        combined["segments"] = merged
+        return combined
+    return merged
+
+
+def merge_chunk_files(chunks, output_path):
+    """Склеивает результаты частей (chunk.result_path) в output_path (атомарно)."""
+    results = []
+    for chunk in chunks:
+        with open(chunk.result_path, "r", encoding="utf-8") as f:
+            results.append(json.load(f))
+    merged = merge_transcripts(chunks, results)
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(merged, f, ensure_ascii=False)
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
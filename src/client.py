@@ -1,49 +1,94 @@
 import requests
 import os
+import json
+import uuid
+import config
+from pathlib import Path
+from urllib.parse import urlparse
+from multipart import MultipartFileEncoder
+from polling import PollScheduler
+from http_pool import REQUEST_TIMEOUT, STATUS_TIMEOUT, UPLOAD_TIMEOUT, make_session
+from ratelimit import get_limiter, request_with_retries
+
+# Ошибки сети, после которых идемпотентный запрос можно повторить
+NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+# Размер блока при потоковом скачивании результата
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
 
 class ASRClient:
-    def __init__(self, base_url="https://bit-asr-diarize.1bitai.ru", token=None):
+    def __init__(self, base_url=config.ASR_BASE_URL, token=None, pool_size=None, name=None):
         self.base_url = base_url.rstrip('/')
         self.token = token
-        self.session = requests.Session()
-        if self.token:
-            self.session.headers.update({"token": self.token})
+        # Сессия на общем для процесса пуле соединений (см. http_pool)
+        self.session = make_session(pool_size, headers={"token": self.token} if self.token else None)
+        # Общий цикл опроса статусов всех задач этого клиента. Объем задачи (size) -
+        # длительность записи в секундах: время распознавания зависит от нее, а не от
+        # размера сжатого файла. Отдельный вид в истории - старые оценки велись по байтам
+        self.poller = PollScheduler("asr-audio", self.get_status)
+        # Лимиты одновременных запросов по ответам сервера (общие для процесса, см. ratelimit).
+        # name различает токены одного сервера в пуле (см. backends): у каждого своя квота
+        host = name or urlparse(self.base_url).netloc or self.base_url
+        self.upload_limiter = get_limiter(f"asr/upload@{host}", use_latency=False)
+        self.status_limiter = get_limiter(f"asr/status@{host}")
+        self.download_limiter = get_limiter(f"asr/download@{host}")
 
     def health_check(self):
         """Проверка доступности сервиса."""
         try:
-            response = self.session.get(f"{self.base_url}/health")
+            response = self.session.get(f"{self.base_url}/health", timeout=STATUS_TIMEOUT)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             print(f"Ошибка Health Check: {e}")
             return None
 
-    def start_transcribing(self, file_path, diarize=True, remove_timestamps=True):
-        """Запуск транскрибации."""
+    def start_transcribing(self, file_path, diarize=True, remove_timestamps=True, progress_callback=None):
+        """
+        Запуск транскрибации.
+        Файл отправляется потоково (блоками), без сборки всего тела запроса в памяти.
+        progress_callback(sent_bytes, total_bytes, bytes_per_second) — прогресс загрузки.
+        """
         if not os.path.exists(file_path):
             print(f"Файл не найден: {file_path}")
             return None
 
+        try:
+            return self.send_transcribing(file_path, diarize, remove_timestamps, progress_callback)
+        except requests.RequestException as e:
+            print(f"Исключение при запросе: {e}")
+            return None
+
+    def send_transcribing(self, file_path, diarize=True, remove_timestamps=True, progress_callback=None):
+        """
+        Отправка файла на транскрибацию, как start_transcribing, но ошибки запроса
+        не перехватываются (requests.RequestException): по ним пул серверов решает,
+        отправлять ли задачу на другой сервер.
+        """
         url = f"{self.base_url}/start_transcribing"
         params = {
             "diarize": str(diarize).lower(),
             "remove_timestamps": str(remove_timestamps).lower()
         }
         
-        try:
-            with open(file_path, 'rb') as f:
-                files = {'file': f}
-                response = self.session.post(url, params=params, files=files)
-            
-            if response.status_code != 200:
-                print(f"Ошибка при запуске: {response.status_code} - {response.text}")
-            
-            response.raise_for_status()
-            return response.json() 
-        except requests.RequestException as e:
-            print(f"Исключение при запросе: {e}")
-            return None
+        def send():
+            # При повторе файл отправляется заново с начала
+            encoder = MultipartFileEncoder(file_path, progress_callback=progress_callback)
+            try:
+                return self.session.post(url, params=params, data=encoder,
+                                         headers={"Content-Type": encoder.content_type}, timeout=UPLOAD_TIMEOUT)
+            finally:
+                encoder.close()
+
+        # 429/503 - сервер не принял файл, повтор безопасен; обрыв связи - нет (задача могла создаться)
+        response = request_with_retries(self.upload_limiter, send, idempotent=False,
+                                        network_errors=NETWORK_ERRORS)
+        
+        if response.status_code != 200:
+            print(f"Ошибка при запуске: {response.status_code} - {response.text}")
+        
+        response.raise_for_status()
+        return response.json() 
 
     def get_status(self, task_id):
         """Получение статуса задачи."""
@@ -51,7 +96,10 @@ class ASRClient:
         params = {"task_id": task_id}
         
         try:
-            response = self.session.get(url, params=params)
+            # Без повторов: цикл опроса сам повторит запрос позже, Retry-After учитывается ограничителем
+            response = request_with_retries(self.status_limiter,
+                                            lambda: self.session.get(url, params=params, timeout=STATUS_TIMEOUT),
+                                            retries=0)
             if response.status_code != 200:
                 print(f"Ошибка статуса: {response.status_code} - {response.text}")
             response.raise_for_status()
@@ -60,30 +108,74 @@ class ASRClient:
             print(f"Исключение при получении статуса: {e}")
             return None
 
-    def get_file(self, task_id, output_path):
-        """Скачивание результата."""
+    def get_file(self, task_id, output_path, pretty=False, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Скачивание результата.
+        Ответ пишется на диск потоково во временный файл рядом с output_path,
+        который затем атомарно переименовывается. Байты сервера сохраняются
+        как есть; pretty=True дополнительно переформатирует JSON с отступами.
+        """
         url = f"{self.base_url}/get_file"
         params = {"task_id": task_id}
         
+        output_path = Path(output_path)
+        tmp_path = None
         try:
-            response = self.session.get(url, params=params)
-            if response.status_code != 200:
-                print(f"Ошибка скачивания: {response.status_code} - {response.text}")
-                return False
+            response = request_with_retries(self.download_limiter,
+                                            lambda: self.session.get(url, params=params, stream=True,
+                                                                     timeout=REQUEST_TIMEOUT),
+                                            network_errors=NETWORK_ERRORS)
+            with response:
+                if response.status_code != 200:
+                    print(f"Ошибка скачивания: {response.status_code} - {response.text}")
+                    return False
+                
+                response.raise_for_status()
+                
+                tmp_path = _temp_path_for(output_path)
+                with open(tmp_path, 'xb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
             
-            response.raise_for_status()
+            os.replace(tmp_path, output_path)
+            tmp_path = None
             
-            try:
-                content_json = response.json()
-                import json
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(content_json, f, indent=4, ensure_ascii=False)
-            except ValueError:
-                with open(output_path, 'wb') as f:
-                    f.write(response.content)
+            if pretty:
+                pretty_print_json_file(output_path)
             
             print(f"Файл сохранен: {output_path}")
             return True
-        except requests.RequestException as e:
+        except (requests.RequestException, OSError) as e:
             print(f"Исключение при скачивании: {e}")
             return False
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _temp_path_for(path):
+    """Уникальное имя временного файла в той же папке (для атомарного os.replace)."""
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+
+
+def pretty_print_json_file(path):
+    """
+    Переформатирует JSON-файл с отступами (ensure_ascii=False) на месте.
+    Если содержимое не является JSON, файл остается без изменений.
+    """
+    path = Path(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except ValueError:
+        return False
+    
+    tmp_path = _temp_path_for(path)
+    try:
+        with open(tmp_path, 'x', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
@@ -4,6 +4,47 @@ from pathlib import Path
 # Файл для хранения токена в домашней директории пользователя
 TOKEN_FILE = Path.home() / ".asr_token"
 
+# Журнал задач на сервере (для продолжения через --resume)
+JOURNAL_FILE = Path.home() / ".asr_jobs.db"
+
+# История скорости обработки задач на сервере (для прогноза времени опроса)
+POLL_STATS_FILE = Path.home() / ".asr_poll_stats.json"
+
+# Кэш каталога промптов (API + индекс локальных файлов)
+PROMPTS_CACHE_FILE = Path.home() / ".asr_prompts_cache.json"
+
+# Папка локального кэша результатов
+CACHE_DIR = Path.home() / ".asr_cache"
+
+# Фоновый демон (src/daemon.py): сокет (на Windows - именованный канал), ключ доступа и лог
+DAEMON_SOCKET = Path.home() / ".asr_daemon.sock"
+DAEMON_KEY_FILE = Path.home() / ".asr_daemon.key"
+DAEMON_LOG_FILE = Path.home() / ".asr_daemon.log"
+
+# Индекс файлов, обработанных в режиме наблюдения за папкой (transcribe --watch)
+WATCH_INDEX_FILE = Path.home() / ".asr_watch_index.json"
+
+# Несколько серверов и токенов для ASR и саммаризации (см. src/backends.py)
+BACKENDS_FILE = Path.home() / ".asr_backends.json"
+
+# Адреса сервисов (можно переопределить переменными окружения или --asr-url/--summarizer-url,
+# например, для работы с локальным стендом src/mock_server.py)
+DEFAULT_ASR_BASE_URL = "https://bit-asr-diarize.1bitai.ru"
+DEFAULT_SUMMARIZER_BASE_URL = "https://bit-summarize.1bitai.ru"
+ASR_BASE_URL = os.environ.get("ASR_BASE_URL", DEFAULT_ASR_BASE_URL)
+SUMMARIZER_BASE_URL = os.environ.get("SUMMARIZER_BASE_URL", DEFAULT_SUMMARIZER_BASE_URL)
+
+# Переменные окружения, которые читает config (демон передает их из терминала клиента)
+ENVIRONMENT = ("ASR_BASE_URL", "SUMMARIZER_BASE_URL")
+
+
+def apply_environment(environ):
+    """Перечитывает настройки из переменных окружения (демон: окружение клиента на время запуска)."""
+    global ASR_BASE_URL, SUMMARIZER_BASE_URL
+    ASR_BASE_URL = environ.get("ASR_BASE_URL", DEFAULT_ASR_BASE_URL)
+    SUMMARIZER_BASE_URL = environ.get("SUMMARIZER_BASE_URL", DEFAULT_SUMMARIZER_BASE_URL)
+
+
 def get_token(arg_token=None):
     """
     Получает токен из разных источников в порядке приоритета:
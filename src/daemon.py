@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Фоновый демон transcribe/summarize (по желанию).
+
+Каждый запуск transcribe платит за старт интерпретатора, импорт requests,
+чтение токена и TLS-рукопожатие еще до начала работы. Демон держит все
+это прогретым: модули импортированы один раз, пул keep-alive соединений
+(http_pool) и кэш каталога промптов живут между запусками. Тонкий клиент
+передает демону аргументы командной строки через Unix-сокет (на Windows -
+именованный канал) и получает вывод по мере работы.
+
+Запуски выполняются демоном по очереди (следующий ждет окончания
+предыдущего); интерактивные вопросы (input) задаются в терминале клиента.
+Если клиент отключился (Ctrl+C), запуск в демоне доводится до конца, вывод
+отбрасывается. Переменные окружения из config.ENVIRONMENT (ASR_BASE_URL и
+т.п.) берутся из терминала клиента на время запуска. Вывод потоков,
+оставшихся от прошлых запусков (циклы опроса, предзагрузка), идет в лог
+демона, а не текущему клиенту.
+
+    python daemon.py start                 # запустить в фоне
+    python daemon.py run transcribe a.mp3  # выполнить через демон (без демона - напрямую)
+    python daemon.py status | stop
+"""
+import os
+import sys
+# realpath: скрипт может вызываться через символическую ссылку (install-linux.sh)
+current_dir = os.path.dirname(os.path.realpath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+import argparse
+import secrets
+import subprocess
+import threading
+import time
+import weakref
+from multiprocessing.connection import Client, Listener
+
+import config
+
+PROGRAMS = ("transcribe", "summarize")
+# Сколько ждать появления сокета после "start"
+START_TIMEOUT = 15
+
+
+def _address():
+    """Адрес и семейство соединения для текущей ОС."""
+    if sys.platform == "win32":
+        user = os.environ.get("USERNAME", "user")
+        return rf"\\.\pipe\asr-daemon-{user}", "AF_PIPE"
+    return str(config.DAEMON_SOCKET), "AF_UNIX"
+
+
+def _read_key():
+    try:
+        return config.DAEMON_KEY_FILE.read_bytes()
+    except OSError:
+        return None
+
+
+def _write_key():
+    """Новый ключ доступа при каждом старте; файл доступен только владельцу."""
+    key = secrets.token_bytes(32)
+    fd = os.open(config.DAEMON_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def connect():
+    """Соединение с работающим демоном или None."""
+    address, family = _address()
+    key = _read_key()
+    if key is None:
+        return None
+    try:
+        return Client(address, family=family, authkey=key)
+    except (OSError, EOFError):
+        return None
+    except Exception:
+        # AuthenticationError: ключ от предыдущего запуска демона
+        return None
+
+
+class _Output:
+    """
+    Поток вывода, который пересылает строки клиенту. Пишут в него сразу
+    несколько потоков (этапы конвейера, цикл опроса, предзагрузка промптов),
+    поэтому буфер и отправка - под одной блокировкой (lock - RLock).
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+        self.buffer = ""
+        self.connected = True
+
+    def write(self, text):
+        with self.lock:
+            self.buffer += text
+            if "\n" in self.buffer:
+                self.flush()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            data, self.buffer = self.buffer, ""
+            if data and self.connected:
+                try:
+                    self.conn.send({"type": "output", "data": data})
+                except (OSError, EOFError):
+                    # Клиент отключился - запуск продолжается без вывода
+                    self.connected = False
+
+    def isatty(self):
+        return False
+
+
+class _Router:
+    """
+    sys.stdout/sys.stderr демона: вывод потоков текущего запуска уходит клиенту,
+    вывод остальных потоков (фоновые потоки прошлых запусков) и вывод между
+    запусками - в исходный поток (лог демона).
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.output = None
+        self.foreign = weakref.WeakSet()
+
+    def attach(self, output):
+        # Потоки, существующие до запуска, к нему не относятся (кроме вызывающего)
+        current = threading.current_thread()
+        self.foreign = weakref.WeakSet(thread for thread in threading.enumerate() if thread is not current)
+        self.output = output
+
+    def detach(self):
+        self.output = None
+
+    def _target(self):
+        output = self.output
+        if output is None or threading.current_thread() in self.foreign:
+            return self.fallback
+        return output
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return False
+
+
+class Daemon:
+    def __init__(self):
+        self.run_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.waiting = 0
+        self.active = 0
+        self.runs = 0
+        self.started = time.time()
+        self.stopping = False
+        self.stdout = sys.stdout
+        # Вывод запусков выполняется в потоках демона: sys.stdout/sys.stderr подменяются один раз
+        self.routers = (_Router(sys.stdout), _Router(sys.stderr))
+        sys.stdout, sys.stderr = self.routers
+        # Импорт один раз при старте - ради этого демон и нужен
+        import summarize
+        import transcribe
+        self.modules = {"transcribe": transcribe, "summarize": summarize}
+
+    def log(self, message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=self.stdout, flush=True)
+
+    def serve(self):
+        address, family = _address()
+        if family == "AF_UNIX" and os.path.exists(address):
+            if connect() is not None:
+                print("Демон уже запущен.")
+                return False
+            # Сокет остался от аварийно завершенного демона
+            os.remove(address)
+        key = _write_key()
+        listener = Listener(address, family=family, authkey=key)
+        if family == "AF_UNIX":
+            os.chmod(address, 0o600)
+        self.log(f"Демон запущен (pid {os.getpid()}), адрес: {address}")
+        try:
+            while not self.stopping:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as e:
+                    if self.stopping:
+                        break
+                    self.log(f"Ошибка подключения: {e}")
+                    continue
+                except Exception as e:
+                    # AuthenticationError - чужой или устаревший ключ
+                    self.log(f"Отклонено подключение: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            if family == "AF_UNIX" and os.path.exists(address):
+                os.remove(address)
+            # Текущий запуск доводится до конца
+            with self.run_lock:
+                self.log("Демон остановлен.")
+        return True
+
+    def handle(self, conn):
+        try:
+            request = conn.recv()
+            kind = request.get("type")
+            if kind == "status":
+                conn.send({"type": "status", "pid": os.getpid(), "uptime": time.time() - self.started,
+                           "runs": self.runs, "waiting": self.waiting, "active": self.active})
+            elif kind == "stop":
+                self.stopping = True
+                conn.send({"type": "exit", "code": 0})
+                # Разблокируем accept() пустым подключением
+                wake = connect()
+                if wake is not None:
+                    wake.close()
+            elif kind == "run" and request.get("program") in PROGRAMS:
+                self.run(conn, request)
+            else:
+                conn.send({"type": "exit", "code": 2})
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+
+    def run(self, conn, request):
+        # Реентерабельная: _Output.write вызывает flush под той же блокировкой
+        send_lock = threading.RLock()
+        with self.state_lock:
+            ahead = self.waiting + self.active
+            self.waiting += 1
+        if ahead:
+            conn.send({"type": "output", "data": f"Демон занят, запусков в очереди перед вами: {ahead}\n"})
+
+        with self.run_lock:
+            with self.state_lock:
+                self.waiting -= 1
+                self.active = 1
+                self.runs += 1
+            program, argv = request["program"], request["argv"]
+            self.log(f"Запуск: {program} {' '.join(argv)} (папка: {request['cwd']})")
+            started = time.monotonic()
+            try:
+                code = self._execute(conn, send_lock, program, argv, request["cwd"], request.get("env", {}))
+            finally:
+                self.active = 0
+            self.log(f"Завершено с кодом {code} за {time.monotonic() - started:.1f} с")
+
+        try:
+            with send_lock:
+                conn.send({"type": "exit", "code": code})
+        except (OSError, EOFError):
+            pass
+
+    def _execute(self, conn, send_lock, program, argv, cwd, env):
+        import builtins
+
+        output = _Output(conn, send_lock)
+
+        def remote_input(prompt=""):
+            output.write(str(prompt))
+            output.flush()
+            if not output.connected:
+                raise EOFError
+            with send_lock:
+                conn.send({"type": "input"})
+            reply = conn.recv()
+            if reply.get("data") is None:
+                raise EOFError
+            return reply["data"]
+
+        saved = (sys.argv, builtins.input)
+        saved_cwd = os.getcwd()
+        saved_env = {name: os.environ.get(name) for name in config.ENVIRONMENT}
+        sys.argv = [program] + list(argv)
+        for router in self.routers:
+            router.attach(output)
+        builtins.input = remote_input
+        code = 0
+        try:
+            # Окружение клиента: переменные, не заданные в его терминале, не наследуются от демона
+            for name in config.ENVIRONMENT:
+                _set_env(name, env.get(name))
+            config.apply_environment(os.environ)
+            os.chdir(cwd)
+            self.modules[program].main()
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if not isinstance(e.code, (int, type(None))):
+                print(e.code)
+        except (KeyboardInterrupt, EOFError):
+            print("\nОтменено пользователем.")
+            code = 130
+        except Exception as e:
+            print(f"Ошибка: {type(e).__name__}: {e}")
+            code = 1
+        finally:
+            output.flush()
+            for router in self.routers:
+                router.detach()
+            sys.argv, builtins.input = saved
+            os.chdir(saved_cwd)
+            for name, value in saved_env.items():
+                _set_env(name, value)
+            config.apply_environment(os.environ)
+        return code
+
+
+def _set_env(name, value):
+    if value is None:
+        os.environ.pop(name, None)
+    else:
+        os.environ[name] = value
+
+
+def run_remote(program, argv):
+    """Выполняет программу через демон; без демона - обычным запуском. Возвращает код выхода."""
+    conn = connect()
+    if conn is None:
+        script = os.path.join(current_dir, f"{program}.py")
+        return subprocess.call([sys.executable, script] + list(argv))
+
+    with conn:
+        env = {name: os.environ[name] for name in config.ENVIRONMENT if name in os.environ}
+        conn.send({"type": "run", "program": program, "argv": list(argv), "cwd": os.getcwd(), "env": env})
+        while True:
+            try:
+                message = conn.recv()
+            except (OSError, EOFError):
+                print("Ошибка: соединение с демоном потеряно.")
+                return 1
+            kind = message["type"]
+            if kind == "output":
+                sys.stdout.write(message["data"])
+                sys.stdout.flush()
+            elif kind == "input":
+                line = sys.stdin.readline()
+                conn.send({"type": "input", "data": line.rstrip("\n") if line else None})
+            elif kind == "exit":
+                return message["code"]
+
+
+def start_background():
+    """Запускает демон отдельным процессом и ждет, пока он начнет принимать подключения."""
+    if connect() is not None:
+        print("Демон уже запущен.")
+        return True
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    with open(config.DAEMON_LOG_FILE, "a", encoding="utf-8") as log:
+        subprocess.Popen([sys.executable, os.path.join(current_dir, "daemon.py"), "serve"], stdin=subprocess.DEVNULL,
+                         stdout=log, stderr=subprocess.STDOUT, **kwargs)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        conn = connect()
+        if conn is not None:
+            conn.close()
+            print(f"Демон запущен. Лог: {config.DAEMON_LOG_FILE}")
+            return True
+        time.sleep(0.1)
+    print(f"Ошибка: демон не запустился, подробности в {config.DAEMON_LOG_FILE}")
+    return False
+
+
+def request(message):
+    conn = connect()
+    if conn is None:
+        return None
+    with conn:
+        conn.send(message)
+        return conn.recv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фоновый демон transcribe/summarize")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("start", help="Запустить демон в фоне")
+    subparsers.add_parser("serve", help="Запустить демон в текущем терминале")
+    subparsers.add_parser("stop", help="Остановить демон (после текущего запуска)")
+    subparsers.add_parser("status", help="Состояние демона")
+    run_parser = subparsers.add_parser("run", help="Выполнить transcribe или summarize через демон")
+    run_parser.add_argument("program", choices=PROGRAMS)
+    run_parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sys.exit(run_remote(args.program, args.args))
+    if args.command == "serve":
+        sys.exit(0 if Daemon().serve() else 1)
+    if args.command == "start":
+        sys.exit(0 if start_background() else 1)
+
+    reply = request({"type": args.command})
+    if reply is None:
+        print("Демон не запущен.")
+        sys.exit(1)
+    if args.command == "status":
+        print(f"Демон работает: pid {reply['pid']}, {reply['uptime']:.0f} с, "
+              f"запусков: {reply['runs']}, выполняется: {reply['active']}, в очереди: {reply['waiting']}")
+    else:
+        print("Демон остановлен.")
+
+
+if __name__ == "__main__":
+    main()
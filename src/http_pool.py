@@ -0,0 +1,92 @@
+import threading
+
+import requests
+
+# Лимит одновременных соединений с одним хостом по умолчанию
+DEFAULT_LIMIT_PER_HOST = 32
+# Сколько секунд держать простаивающее keep-alive соединение
+KEEPALIVE_TIMEOUT = 30
+
+# Таймауты запросов requests (подключение, чтение), секунды. Без них один
+# зависший запрос статуса останавливает общий цикл опроса всех задач клиента
+CONNECT_TIMEOUT = 10
+STATUS_TIMEOUT = (CONNECT_TIMEOUT, 30)
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, 120)
+# Загрузка файла: ответ приходит после приема всего тела, время чтения не ограничено
+UPLOAD_TIMEOUT = (CONNECT_TIMEOUT, None)
+
+_adapter_lock = threading.Lock()
+_shared_adapter = None
+
+
+def shared_adapter(pool_size=None):
+    """
+    Общий для процесса HTTPAdapter (пул соединений urllib3).
+
+    Сессии разных клиентов монтируют один и тот же адаптер, поэтому
+    keep-alive соединения переиспользуются между экземплярами клиентов,
+    а заголовки авторизации остаются у каждой сессии свои. Если запрошен
+    пул больше текущего, создается новый адаптер нужного размера.
+    """
+    global _shared_adapter
+    pool_size = pool_size or requests.adapters.DEFAULT_POOLSIZE
+    with _adapter_lock:
+        if _shared_adapter is None or _shared_adapter._pool_maxsize < pool_size:
+            _shared_adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        return _shared_adapter
+
+
+def make_session(pool_size=None, headers=None):
+    """Сессия requests на общем пуле соединений."""
+    session = requests.Session()
+    adapter = shared_adapter(pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class AsyncHttpPool:
+    """
+    Общий пул соединений для асинхронных клиентов (aiohttp).
+
+    Один ClientSession с keep-alive на все сервисы и задачи процесса;
+    limit - всего соединений, limit_per_host - на один хост. Заголовки
+    авторизации передаются клиентами в каждом запросе, поэтому пул можно
+    разделять между ASR и саммаризацией.
+
+        async with AsyncHttpPool(limit_per_host=16) as pool:
+            asr = AsyncASRClient(token=..., pool=pool)
+            summarizer = AsyncSummarizerClient(token=..., pool=pool)
+    """
+
+    def __init__(self, limit=256, limit_per_host=DEFAULT_LIMIT_PER_HOST, keepalive_timeout=KEEPALIVE_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    @property
+    def session(self):
+        """aiohttp.ClientSession; создается при первом обращении внутри цикла событий."""
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            # Общий таймаут не задается: загрузка большого файла может идти долго
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=None, sock_connect=30))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import threading
+import time
+
+import config
+
+# Состояния задачи в журнале
+STATE_SUBMITTED = "submitted"  # Задача создана на сервере, результат еще не сохранен
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+# Через сколько дней удалять завершенные записи
+RETENTION_DAYS = 30
+
+
+class JobJournal:
+    """
+    Журнал задач на сервере (SQLite рядом с ~/.asr_token).
+
+    Каждая созданная задача (ASR или саммаризация) записывается сразу после
+    получения task_id, поэтому при обрыве связи или Ctrl+C ее можно
+    подхватить повторно (--resume) без повторной загрузки данных.
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or config.JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    input_file TEXT,
+                    params TEXT,
+                    state TEXT NOT NULL,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (kind, state)")
+            self._conn.execute("DELETE FROM jobs WHERE state != ? AND updated < ?",
+                               (STATE_SUBMITTED, time.time() - RETENTION_DAYS * 86400))
+
+    def add(self, kind, task_id, input_file, params=None):
+        """Записывает новую задачу в состоянии submitted, возвращает id записи."""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, task_id, input_file, params, state, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, str(task_id), str(input_file), json.dumps(params or {}, ensure_ascii=False),
+                 STATE_SUBMITTED, now, now))
+            return cursor.lastrowid
+
+    def update(self, entry_id, state, error=None):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?",
+                               (state, error, time.time(), entry_id))
+
+    def pending(self, kind):
+        """Незавершенные задачи указанного типа (старые первыми)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE kind = ? AND state = ? ORDER BY created",
+                (kind, STATE_SUBMITTED)).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["params"] = json.loads(entry["params"] or "{}")
+            entries.append(entry)
+        return entries
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
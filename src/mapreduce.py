@@ -0,0 +1,132 @@
+import re
+
+# Размер фрагмента по умолчанию (символы; ~6-8 тыс. токенов для русского текста)
+DEFAULT_CHUNK_CHARS = 24000
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+# Промпт для этапа map: сжатый пересказ фрагмента без потери фактов
+MAP_PROMPT = (
+    "Это фрагмент стенограммы длинной встречи. Кратко, но без потери фактов перескажи его: "
+    "обсуждаемые темы, принятые решения, задачи с ответственными и сроками, открытые вопросы. "
+    "Сохраняй имена участников. Не добавляй вступлений и выводов."
+)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+
+
+def _split_long_piece(piece, chunk_chars):
+    """Делит слишком длинную реплику по предложениям, в крайнем случае - по словам."""
+    parts = []
+    for sentence in _SENTENCE_END.split(piece):
+        while len(sentence) > chunk_chars:
+            cut = sentence.rfind(" ", 0, chunk_chars)
+            if cut <= 0:
+                cut = chunk_chars
+            parts.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            parts.append(sentence)
+    return parts
+
+
+def split_transcript(text, chunk_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Делит текст на фрагменты не длиннее chunk_chars.
+    Границы выбираются по репликам (строкам), затем по предложениям,
+    чтобы реплика одного участника по возможности не разрывалась.
+    """
+    pieces = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) > chunk_chars:
+            pieces.extend(_split_long_piece(line, chunk_chars))
+        else:
+            pieces.append(line)
+
+    chunks = []
+    current = []
+    current_len = 0
+    for piece in pieces:
+        # Разделитель: перевод строки между репликами
+        added = len(piece) + (1 if current else 0)
+        if current and current_len + added > chunk_chars:
+            chunks.append("\n".join(current))
+            current, current_len = [], 0
+            added = len(piece)
+        current.append(piece)
+        current_len += added
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class MapReduceSummarizer:
+    """
+    Саммаризация текстов длиннее контекста модели.
+
+    map: фрагменты транскрипции пересказываются параллельно (не более
+    concurrency задач одновременно); reduce: пересказы объединяются и
+    итоговая задача выполняется с выбранным prompt_id/user_prompt.
+    Если объединенные пересказы сами не помещаются во фрагмент,
+    этап map повторяется над ними.
+    """
+
+    def __init__(self, client, chunk_chars=DEFAULT_CHUNK_CHARS, concurrency=DEFAULT_CHUNK_CONCURRENCY,
+                 log=print, timeout=300):
+        self.client = client
+        self.chunk_chars = chunk_chars
+        self.concurrency = max(1, concurrency)
+        self.log = log
+        self.timeout = timeout
+
+    def _map(self, chunks, model):
+        def run(indexed_chunk):
+            index, chunk = indexed_chunk
+            summary = self.client.summarize(chunk, "custom", model=model, user_prompt=MAP_PROMPT,
+                                            timeout=self.timeout)
+            if summary is None:
+                # Одна повторная попытка для упавшего фрагмента
+                self.log(f"Фрагмент {index}: повторная попытка...")
+                summary = self.client.summarize(chunk, "custom", model=model, user_prompt=MAP_PROMPT,
+                                                timeout=self.timeout)
+            self.log(f"Фрагмент {index}/{len(chunks)}: {'готов' if summary is not None else 'ошибка'}")
+            return summary
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(run, enumerate(chunks, 1)))
+
+    def condense(self, text, model="llama"):
+        """
+        Этап map: текст заменяется пересказами фрагментов, пока не поместится
+        во фрагмент. Результат не зависит от итогового промпта, поэтому его
+        можно использовать для нескольких промптов одной модели.
+        Возвращает текст для итоговой задачи или None при ошибке.
+        """
+        level = 1
+        while len(text) > self.chunk_chars:
+            chunks = split_transcript(text, self.chunk_chars)
+            self.log(f"Этап map {level}: фрагментов {len(chunks)}, параллельно {self.concurrency}")
+            summaries = self._map(chunks, model)
+            if any(summary is None for summary in summaries):
+                self.log("Ошибка: Не удалось получить пересказ всех фрагментов.")
+                return None
+            reduced = "\n\n".join(f"Часть {i}:\n{summary.strip()}" for i, summary in enumerate(summaries, 1))
+            if len(reduced) >= len(text):
+                # Пересказы не короче исходного текста - дальнейшее дробление бессмысленно
+                text = reduced
+                break
+            text = reduced
+            level += 1
+        return text
+
+    def summarize(self, text, prompt_id, model="llama", user_prompt=None):
+        """Возвращает итоговый текст саммаризации или None при ошибке."""
+        text = self.condense(text, model)
+        if text is None:
+            return None
+        self.log("Этап reduce: итоговая саммаризация...")
+        return self.client.summarize(text, prompt_id, model=model, user_prompt=user_prompt, timeout=self.timeout)
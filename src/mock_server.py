@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Локальный стенд, имитирующий API сервисов ASR и саммаризации.
+Нужен для нагрузочных тестов и бенчмарков без расхода реальной квоты.
+
+Поддерживает задержку ответов, модель времени обработки (база + секунды на
+МБ аудио или на 1000 символов текста, случайный разброс), долю ошибок 500,
+долю задач, завершающихся с ошибкой, ограничение частоты запросов (429) и
+числа одновременно обрабатываемых запросов (503).
+
+Запуск:
+    python src/mock_server.py --port 8000 --latency 0.05 --error-rate 0.01
+    transcribe --asr-url http://127.0.0.1:8000 --summarizer-url http://127.0.0.1:8000 ...
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Размер блока при вычитывании тела запроса
+READ_CHUNK_SIZE = 64 * 1024
+
+
+# Версия каталога промптов (ETag для условных запросов)
+PROMPTS_ETAG = '"mock-prompts-1"'
+MOCK_PROMPTS = [
+    {"id": "meeting_detailed", "name": "Подробный протокол встречи"},
+    {"id": "meeting_short", "name": "Краткое резюме встречи"},
+]
+
+# Служебные адреса, на которые не действуют ошибки и лимиты
+SERVICE_PATHS = {"/health", "/_stats"}
+
+
+class MockState:
+    """Состояние стенда: задачи, счетчики запросов и параметры поведения."""
+
+    def __init__(self, processing_time=2.0, processing_per_mb=0.0, processing_per_kchar=0.0, jitter=0.0,
+                 latency=0.0, error_rate=0.0, fail_rate=0.0, rate_limit=None, max_concurrent=None,
+                 seed=None):
+        self.processing_time = processing_time
+        self.processing_per_mb = processing_per_mb
+        self.processing_per_kchar = processing_per_kchar
+        self.jitter = jitter
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_rate = fail_rate
+        # Максимум запросов в секунду (сверх него - 429 с Retry-After)
+        self.rate_limit = rate_limit
+        # Максимум одновременно обрабатываемых запросов (сверх него - 503 с Retry-After)
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.random = random.Random(seed)
+        self.tasks = {}
+        self.requests = {}
+        self.responses = {}
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def count(self, endpoint):
+        if endpoint == "/_stats":
+            return
+        # Запросы к конкретным задачам считаются по шаблону адреса
+        parts = endpoint.strip("/").split("/")
+        if len(parts) == 5 and parts[:3] == ["api", "v1", "tasks"]:
+            endpoint = f"/api/v1/tasks/{{id}}/{parts[4]}"
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def count_response(self, endpoint, status):
+        if endpoint == "/_stats":
+            return
+        with self.lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+    def chance(self, probability):
+        if probability <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < probability
+
+    def rate_limited(self):
+        """Превышен ли лимит запросов в текущем секундном окне."""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            return self._window_count > self.rate_limit
+
+    def enter(self):
+        """Занимает место для запроса; False - сервер уже обрабатывает max_concurrent запросов."""
+        with self.lock:
+            if self.max_concurrent and self.active >= self.max_concurrent:
+                return False
+            self.active += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+    def _duration(self, units):
+        with self.lock:
+            spread = self.random.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1.0
+            failed = self.fail_rate > 0 and self.random.random() < self.fail_rate
+        return (self.processing_time + units) * spread, failed
+
+    def add_task(self, filename, size, kind="asr", payload=None):
+        if kind == "asr":
+            duration, failed = self._duration(self.processing_per_mb * size / (1024 * 1024))
+        else:
+            duration, failed = self._duration(self.processing_per_kchar * len(payload.get("text", "")) / 1000)
+        task_id = uuid.uuid4().hex
+        with self.lock:
+            self.tasks[task_id] = {
+                "kind": kind,
+                "created": time.monotonic(),
+                "duration": duration,
+                "failed": failed,
+                "filename": filename,
+                "size": size,
+                "payload": payload,
+            }
+        return task_id
+
+    def task_status(self, task_id, kind="asr"):
+        task = self.tasks.get(task_id)
+        if task is None or task["kind"] != kind:
+            return None
+        if time.monotonic() - task["created"] >= task["duration"]:
+            return "failed" if task["failed"] else "done"
+        return "processing"
+
+    def stats(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "responses": dict(self.responses),
+                    "bytes_received": self.bytes_received, "tasks": len(self.tasks)}
+
+
+def make_transcript(task):
+    """Фиктивный результат транскрибации в формате сегментов с дикторами."""
+    return [
+        {"speaker": "SPEAKER_00", "start": 0.0, "end": 4.2,
+         "text": f"Тестовая расшифровка файла {task['filename']}."},
+        {"speaker": "SPEAKER_01", "start": 4.2, "end": 9.8,
+         "text": "Это ответ второго участника встречи."},
+    ]
+
+
+def make_summary(task):
+    """Фиктивный результат саммаризации."""
+    payload = task["payload"]
+    text = payload.get("text", "")
+    return {"summary": f"# Саммари ({payload.get('prompt_id')}, {payload.get('model')})\n\n"
+                       f"Исходный текст: {len(text)} символов.\n\n{text[:200]}"}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # Устанавливается в make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.state.count_response(urlparse(self.path).path, status)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_empty(self, status, headers=None):
+        self.state.count_response(urlparse(self.path).path, status)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _injected_failure(self, path):
+        """
+        Задержка, 429, 503 и случайные 500 по настройкам стенда.
+        Возвращает True, если ответ уже отправлен.
+        """
+        if path in SERVICE_PATHS:
+            return False
+        if not self.state.enter():
+            self._send_json({"detail": "Service Unavailable"}, status=503, headers={"Retry-After": "1"})
+            return True
+        try:
+            # Задержка имитирует время обработки: на это время запрос занимает место
+            if self.state.latency:
+                time.sleep(self.state.latency)
+        finally:
+            self.state.leave()
+        if self.state.rate_limited():
+            self._send_json({"detail": "Too Many Requests"}, status=429, headers={"Retry-After": "1"})
+            return True
+        if self.state.chance(self.state.error_rate):
+            self._send_json({"detail": "Internal Server Error"}, status=500)
+            return True
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with self.state.lock:
+            self.state.bytes_received += len(body)
+        try:
+            return json.loads(body.decode("utf-8")) if body else {}
+        except ValueError:
+            return None
+
+    def _drain_body(self):
+        """Вычитывает тело запроса блоками, не держа его в памяти целиком."""
+        remaining = int(self.headers.get("Content-Length") or 0)
+        received = 0
+        filename = None
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, READ_CHUNK_SIZE))
+            if not chunk:
+                break
+            if filename is None and b'filename="' in chunk:
+                start = chunk.index(b'filename="') + len(b'filename="')
+                end = chunk.find(b'"', start)
+                if end != -1:
+                    filename = chunk[start:end].decode("utf-8", "replace")
+            received += len(chunk)
+            remaining -= len(chunk)
+        with self.state.lock:
+            self.state.bytes_received += received
+        return filename or "audio", received
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        self.state.count(path)
+        if path == "/start_transcribing":
+            filename, size = self._drain_body()
+            if self._injected_failure(path):
+                return
+            task_id = self.state.add_task(filename, size)
+            self._send_json({"task_id": task_id})
+        elif path == "/api/v1/tasks":
+            payload = self._read_json()
+            if self._injected_failure(path):
+                return
+            if not isinstance(payload, dict) or "text" not in payload:
+                self._send_json({"detail": "Invalid request"}, status=422)
+                return
+            task_id = self.state.add_task(None, len(payload["text"]), kind="summary", payload=payload)
+            self._send_json({"task_id": task_id})
+        else:
+            self._drain_body()
+            self._send_json({"detail": "Not Found"}, status=404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        task_id = query.get("task_id", [None])[0]
+        self.state.count(url.path)
+        if self._injected_failure(url.path):
+            return
+
+        if url.path == "/health":
+            self._send_json({"status": "ok"})
+        elif url.path == "/_stats":
+            self._send_json(self.state.stats())
+        elif url.path == "/get_status":
+            status = self.state.task_status(task_id)
+            if status is None:
+                self._send_json({"detail": "Task not found"}, status=404)
+            else:
+                self._send_json({"status": status})
+        elif url.path == "/get_file":
+            if self.state.task_status(task_id) != "done":
+                self._send_json({"detail": "Task not ready"}, status=404)
+            else:
+                self._send_json(make_transcript(self.state.tasks[task_id]))
+        elif url.path == "/api/v1/prompts":
+            if self.headers.get("If-None-Match") == PROMPTS_ETAG:
+                self._send_empty(304, headers={"ETag": PROMPTS_ETAG})
+            else:
+                self._send_json(MOCK_PROMPTS, headers={"ETag": PROMPTS_ETAG})
+        elif url.path.startswith("/api/v1/tasks/"):
+            self._summary_task(url.path)
+        else:
+            self._send_json({"detail": "Not Found"}, status=404)
+
+    def _summary_task(self, path):
+        # /api/v1/tasks/<task_id>/status|result
+        parts = path.strip("/").split("/")
+        if len(parts) != 5 or parts[4] not in ("status", "result"):
+            self._send_json({"detail": "Not Found"}, status=404)
+            return
+        task_id, action = parts[3], parts[4]
+        status = self.state.task_status(task_id, kind="summary")
+        if status is None:
+            self._send_json({"detail": "Task not found"}, status=404)
+        elif action == "status":
+            self._send_json({"status": status})
+        elif status != "done":
+            self._send_json({"detail": "Task not ready"}, status=404)
+        else:
+            self._send_json(make_summary(self.state.tasks[task_id]))
+
+
+def make_server(host="127.0.0.1", port=0, **state_options):
+    """Создает сервер стенда (port=0 - выбрать свободный порт)."""
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(**state_options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**options):
+    """Запускает стенд в фоновом потоке, возвращает сервер (server.server_port - порт)."""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд API ASR и саммаризации для тестов и бенчмарков")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес (по умолчанию: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Порт (по умолчанию: 8000)")
+    parser.add_argument("--processing-time", type=float, default=2.0,
+                        help="Базовое время 'обработки' задачи в секундах (по умолчанию: 2)")
+    parser.add_argument("--processing-per-mb", type=float, default=0.0,
+                        help="Дополнительные секунды обработки на МБ аудио (по умолчанию: 0)")
+    parser.add_argument("--processing-per-kchar", type=float, default=0.0,
+                        help="Дополнительные секунды саммаризации на 1000 символов текста (по умолчанию: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Случайный разброс времени обработки, доля (например, 0.2 - плюс-минус 20%%)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Задержка каждого ответа в секундах (по умолчанию: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Доля запросов, на которые отвечать 500 (по умолчанию: 0)")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="Доля задач, завершающихся со статусом failed (по умолчанию: 0)")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="Максимум запросов в секунду, сверх него - 429 (по умолчанию: без лимита)")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Максимум одновременно обрабатываемых запросов, сверх него - 503 "
+                             "(по умолчанию: без лимита)")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, processing_time=args.processing_time,
+                         processing_per_mb=args.processing_per_mb, processing_per_kchar=args.processing_per_kchar,
+                         jitter=args.jitter, latency=args.latency, error_rate=args.error_rate,
+                         fail_rate=args.fail_rate, rate_limit=args.rate_limit,
+                         max_concurrent=args.max_concurrent, seed=args.seed)
+    print(f"Стенд запущен: http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
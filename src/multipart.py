@@ -0,0 +1,113 @@
+import mimetypes
+import os
+import time
+import uuid
+
+# Размер блока чтения файла при загрузке (память на загрузку не превышает его)
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def _quote_header_value(value):
+    """Экранирование значения параметра заголовка (в стиле HTML5, как в urllib3)."""
+    return (value.replace("\\", "\\\\").replace('"', "%22")
+            .replace("\r", "%0D").replace("\n", "%0A"))
+
+
+class MultipartFileEncoder:
+    """
+    Потоковый multipart/form-data кодировщик для одного файла.
+
+    Объект ведет себя как файл фиксированной длины: requests передает его
+    в http.client, который читает тело блоками и сразу пишет их в сокет.
+    Поэтому в памяти одновременно находится только один блок, независимо
+    от размера аудиофайла.
+
+    progress_callback(sent_bytes, total_bytes, bytes_per_second) вызывается
+    после каждого прочитанного блока.
+    """
+
+    def __init__(self, file_path, field_name="file", chunk_size=DEFAULT_CHUNK_SIZE,
+                 progress_callback=None, content_type=None):
+        self.file_path = str(file_path)
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.boundary = uuid.uuid4().hex
+
+        filename = os.path.basename(self.file_path)
+        if content_type is None:
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        self._preamble = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{_quote_header_value(field_name)}"; '
+            f'filename="{_quote_header_value(filename)}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self._epilogue = f"\r\n--{self.boundary}--\r\n".encode("ascii")
+
+        self.file_size = os.path.getsize(self.file_path)
+        self.len = len(self._preamble) + self.file_size + len(self._epilogue)
+
+        self._file = None
+        self._stage = 0  # 0 - преамбула, 1 - файл, 2 - эпилог, 3 - конец
+        self._offset = 0
+        self.bytes_sent = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def throughput(self):
+        """Средняя скорость загрузки в байтах в секунду."""
+        if not self.started:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.bytes_sent / elapsed if elapsed > 0 else 0.0
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        if self.started is None:
+            self.started = time.monotonic()
+
+        chunk = b""
+        while not chunk and self._stage < 3:
+            if self._stage == 0:
+                chunk = self._preamble[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                if self._offset >= len(self._preamble):
+                    self._stage, self._offset = 1, 0
+                    self._file = open(self.file_path, "rb")
+            elif self._stage == 1:
+                chunk = self._file.read(min(size, self.chunk_size))
+                if not chunk:
+                    self._file.close()
+                    self._stage = 2
+            else:
+                chunk = self._epilogue[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                if self._offset >= len(self._epilogue):
+                    self._stage = 3
+                    self.finished = time.monotonic()
+
+        self.bytes_sent += len(chunk)
+        if chunk and self.progress_callback:
+            self.progress_callback(self.bytes_sent, self.len, self.throughput)
+        return chunk
+
+    def close(self):
+        if self._file and not self._file.closed:
+            self._file.close()
@@ -1,19 +1,44 @@
+import os
 import re
 import json
+import string
+import sys
+import threading
 from pathlib import Path
 
-def load_filename_patterns():
+# Пользовательские шаблоны имен файлов (в корне программы, рядом с папкой prompts)
+PATTERNS_FILE = Path(__file__).parent.parent / "filename_patterns.json"
+
+# Встроенный шаблон записей Телемоста, применяется после пользовательских:
+# "Встреча в Телемосте 01.11.25 11-05-32 — запись Название" -> "202511011105 Название"
+TELEMOST_PATTERN = {
+    "name": "telemost",
+    "regex": r'^Встреча в Телемосте (?P<day>\d{2})\.(?P<month>\d{2})\.(?P<year>\d{2}) '
+             r'(?P<hour>\d{2})-(?P<minute>\d{2})-(?P<second>\d{2})\s*(?:—\s*запись\s*)?(?P<rest>.*)',
+    "template": "20{year}{month}{day}{hour}{minute} {rest}",
+}
+
+# Символы, с которых в регулярном выражении начинается что-то кроме обычного текста
+_REGEX_SPECIAL = set(".^$*+?{}[]|()\\")
+# Квантификаторы: предыдущий символ может отсутствовать или повторяться
+_QUANTIFIERS = set("*+?{")
+
+# Скомпилированные шаблоны по пути файла: (mtime и размер файла, PatternEngine)
+_engine_lock = threading.Lock()
+_engine_cache = {}
+
+
+def load_filename_patterns(config_path=None):
     """
     Загружает шаблоны имен файлов из конфигурационного файла.
     Возвращает список шаблонов или None при ошибке.
     """
     try:
-        # Ищем файл конфига на уровень выше от папки src
-        config_path = Path(__file__).parent.parent / "filename_patterns.json"
-        
+        config_path = Path(config_path or PATTERNS_FILE)
+
         if not config_path.exists():
             return None
-        
+
         with open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
             return config.get("patterns", [])
@@ -21,48 +46,246 @@ def load_filename_patterns():
         print(f"Предупреждение: Не удалось загрузить конфиг шаблонов: {e}")
         return None
 
+
+def _literal_prefix(source):
+    """
+    Текст, с которого обязательно начинается совпадение выражения ("" -
+    если определить нельзя). Оценка осторожная: при альтернативе | на
+    любом уровне префикс не используется.
+    """
+    if "|" in source:
+        return ""
+    position = 1 if source.startswith("^") else 0
+    prefix = []
+    while position < len(source):
+        char = source[position]
+        if char == "\\" and position + 1 < len(source) and not source[position + 1].isalnum():
+            # Экранированный знак препинания - обычный символ
+            char = source[position + 1]
+            step = 2
+        elif char in _REGEX_SPECIAL:
+            break
+        else:
+            step = 1
+        if position + step < len(source) and source[position + step] in _QUANTIFIERS:
+            break
+        prefix.append(char)
+        position += step
+    return "".join(prefix)
+
+
+class PatternEngine:
+    """
+    Набор шаблонов переименования, скомпилированный один раз.
+
+    Шаблон - словарь {"name", "regex", "template", "ignore_case"}: regex
+    применяется к имени без расширения (с начала имени), template - новое
+    имя с подстановкой именованных групп ({year}, {rest} и т.п.), расширение
+    сохраняется. Срабатывает первый подходящий шаблон.
+
+    Шаблоны раскладываются в таблицу по первому символу обязательного
+    префикса выражения ("Встреча в Телемосте ..." -> "В"), поэтому имя
+    проверяется только шаблонами, которые могут подойти, а имя, которое не
+    подходит ни под один префикс, - ни одним.
+    """
+
+    def __init__(self, patterns):
+        # (имя шаблона, скомпилированное выражение, шаблон имени)
+        self.patterns = []
+        for index, pattern in enumerate(patterns):
+            name = (pattern.get("name") if isinstance(pattern, dict) else None) or f"#{index + 1}"
+            try:
+                self.patterns.append(self._compile(name, pattern))
+            except (TypeError, ValueError, KeyError, re.error) as e:
+                print(f"Предупреждение: Шаблон имени файла '{name}' пропущен: {e}")
+        self._build_dispatch()
+
+    @staticmethod
+    def _compile(name, pattern):
+        if not isinstance(pattern, dict):
+            raise TypeError("шаблон должен быть объектом с полями regex и template")
+        flags = re.IGNORECASE if pattern.get("ignore_case") else 0
+        regex = re.compile(pattern["regex"], flags)
+        template = pattern["template"]
+        for _, field, _, _ in string.Formatter().parse(template):
+            if field is not None and field not in regex.groupindex:
+                raise ValueError(f"в выражении нет группы (?P<{field}>...) для {{{field}}}")
+        # Ошибки формата ({year:d} и т.п.) - сразу, а не на первом подходящем файле
+        template.format_map({group: "" for group in regex.groupindex})
+        return name, regex, template
+
+    def _build_dispatch(self):
+        """Таблица: первый символ имени -> шаблоны по порядку; _any - шаблоны без префикса."""
+        keyed = {}
+        any_start = []
+        for index, (_, regex, _) in enumerate(self.patterns):
+            prefix = _literal_prefix(regex.pattern)
+            if not prefix or regex.flags & re.IGNORECASE:
+                any_start.append(index)
+            else:
+                keyed.setdefault(prefix[0], []).append(index)
+        self._any = [self.patterns[i] for i in any_start]
+        self._dispatch = {char: [self.patterns[i] for i in sorted(indices + any_start)]
+                          for char, indices in keyed.items()}
+
+    def match(self, stem):
+        """(имя шаблона, новое имя без расширения) или None, если ни один шаблон не подошел."""
+        candidates = self._dispatch.get(stem[:1], self._any)
+        for name, regex, template in candidates:
+            m = regex.match(stem)
+            if m is not None:
+                values = {key: (value or "").strip() for key, value in m.groupdict().items()}
+                return name, template.format_map(values).strip()
+        return None
+
+    def rename(self, filename):
+        """Новое имя файла (с тем же расширением) или исходное, если шаблоны не подошли."""
+        stem, suffix = os.path.splitext(filename)
+        result = self.match(stem)
+        if result is None:
+            return filename
+        new_stem = result[1]
+        # Пустое имя или имя с разделителем пути - ошибка в шаблоне, файл не трогаем
+        if not new_stem or "/" in new_stem or os.sep in new_stem or "\0" in new_stem:
+            return filename
+        return f"{new_stem}{suffix}"
+
+
+def get_pattern_engine(config_path=None):
+    """
+    Шаблоны из файла конфигурации и встроенный шаблон Телемоста. Файл
+    перечитывается, только если изменились его время изменения или размер.
+    """
+    config_path = Path(config_path or PATTERNS_FILE)
+    try:
+        stat = config_path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+    key = str(config_path)
+    with _engine_lock:
+        cached = _engine_cache.get(key)
+        if cached is None or cached[0] != signature:
+            patterns = (load_filename_patterns(config_path) or []) if signature else []
+            if not isinstance(patterns, list):
+                print("Предупреждение: В конфиге шаблонов поле patterns должно быть списком.")
+                patterns = []
+            cached = (signature, PatternEngine(patterns + [TELEMOST_PATTERN]))
+            _engine_cache[key] = cached
+        return cached[1]
+
+
 def normalize_telemost_filename(filename):
     """
-    Нормализует имена файлов из Телемоста.
+    Нормализует имена файлов: пользовательские шаблоны из filename_patterns.json,
+    затем встроенный шаблон Телемоста.
     Пример: "Встреча в Телемосте 01.11.25 11-05-32 — запись Название.mp3" -> "202511011105 Название.mp3"
     """
-    # 1. Сначала пробуем загрузить пользовательские шаблоны
-    patterns = load_filename_patterns()
-    
-    if patterns:
-        for pattern_config in patterns:
-            # Пока поддерживаем только простую логику regex, если она там есть
-            # В будущем сюда можно вернуть сложную логику, если понадобится
-            pass
-
-    # 2. Если шаблоны не помогли или их нет, используем хардкод для Телемоста
-    
-    # Работаем с именем без расширения, чтобы не путаться
-    file_path = Path(filename)
-    suffix = file_path.suffix
-    stem = file_path.stem # Имя без расширения
-    
-    # Паттерн для поиска "Встреча в Телемосте DD.MM.YY HH-MM-SS"
-    # Убрали расширение, поэтому ищем только в stem
-    pattern = r'^Встреча в Телемосте (\d{2})\.(\d{2})\.(\d{2}) (\d{2})-(\d{2})-(\d{2})\s*(?:—\s*запись\s*)?(.*)'
-    match = re.match(pattern, stem)
-    
-    if match:
-        day, month, year, hour, minute, second, rest = match.groups()
-        # Преобразуем год из YY в YYYY (предполагаем 20YY)
-        full_year = f"20{year}"
-        # Формируем дату+время
-        datetime_prefix = f"{full_year}{month}{day}{hour}{minute}"
-        
-        # Очищаем остаток имени от лишних пробелов
-        rest = rest.strip()
-        
-        # Формируем новое имя
-        if rest:
-            new_filename = f"{datetime_prefix} {rest}{suffix}"
-        else:
-            new_filename = f"{datetime_prefix}{suffix}"
-        
-        return new_filename
-    
-    return filename
+    return get_pattern_engine().rename(filename)
+
+
+def _name_key(name):
+    # На Windows и macOS имена файлов обычно не различают регистр
+    return name.casefold() if sys.platform in ("win32", "darwin") else name
+
+
+def plan_renames(paths):
+    """
+    План массового переименования за один проход.
+    Возвращает tuple (renames, conflicts): [(путь, новый путь)] и
+    [(путь, новое имя, причина)] - файлы, которые переименовать нельзя
+    (имя занято другим файлом или совпадает у нескольких файлов).
+    """
+    engine = get_pattern_engine()
+    by_directory = {}
+    for path in paths:
+        path = Path(path)
+        by_directory.setdefault(path.parent, []).append(path)
+
+    renames = []
+    conflicts = []
+    for directory, files in by_directory.items():
+        targets = {}
+        for path in files:
+            new_name = engine.rename(path.name)
+            if new_name != path.name:
+                targets.setdefault(_name_key(new_name), []).append((path, new_name))
+        if not targets:
+            continue
+        # Один listdir на папку вместо проверки каждого имени
+        try:
+            existing = {_name_key(name) for name in os.listdir(directory)}
+        except OSError as e:
+            conflicts.extend((path, new_name, f"папка недоступна: {e}")
+                             for items in targets.values() for path, new_name in items)
+            continue
+        for key, items in targets.items():
+            if len(items) > 1:
+                conflicts.extend((path, new_name, f"такое же новое имя у {len(items)} файлов")
+                                 for path, new_name in items)
+                continue
+            path, new_name = items[0]
+            if key in existing and key != _name_key(path.name):
+                conflicts.append((path, new_name, "файл с таким именем уже есть"))
+            else:
+                renames.append((path, directory / new_name))
+    return renames, conflicts
+
+
+def apply_renames(renames):
+    """
+    Выполняет план переименования. Существующий файл никогда не
+    перезаписывается. Возвращает tuple (выполнено, [(путь, ошибка)]).
+    """
+    done = 0
+    failed = []
+    for source, target in renames:
+        try:
+            if os.path.lexists(target) and not os.path.samefile(source, target):
+                failed.append((source, f"имя '{target.name}' уже занято"))
+                continue
+            os.rename(source, target)
+            done += 1
+        except OSError as e:
+            failed.append((source, str(e)))
+    return done, failed
+
+
+def run_rename_command(argv, apply=False):
+    """Подкоманды rename-preview и rename-apply: массовое переименование по шаблонам."""
+    import argparse
+    from batch import collect_input_files
+
+    command = "rename-apply" if apply else "rename-preview"
+    parser = argparse.ArgumentParser(
+        prog=f"transcribe {command}",
+        description="Переименовать записи по шаблонам имен (filename_patterns.json и встроенный шаблон Телемоста)"
+                    + ("" if apply else " - только показать, без изменений"))
+    parser.add_argument("paths", nargs="+", metavar="path", help="Файлы, папки или glob-шаблоны")
+    parser.add_argument("--recursive", action="store_true", help="Искать аудиофайлы во вложенных папках")
+    parser.add_argument("--quiet", "-q", action="store_true",
+                        help="Не выводить каждое переименование, только конфликты и итоги")
+    args = parser.parse_args(argv)
+
+    files, missing = collect_input_files(args.paths, recursive=args.recursive)
+    for item in missing:
+        print(f"Ошибка: Файл '{item}' не найден.")
+
+    renames, conflicts = plan_renames(files)
+    if not args.quiet:
+        for source, target in renames:
+            print(f"{source} -> {target.name}")
+    for source, new_name, reason in conflicts:
+        print(f"Конфликт: {source} -> {new_name}: {reason}")
+
+    if not apply:
+        print(f"\nБудет переименовано: {len(renames)} из {len(files)}, конфликтов: {len(conflicts)}")
+        if renames:
+            print("Выполнить: transcribe rename-apply с теми же аргументами")
+        return 1 if missing or conflicts else 0
+
+    done, failed = apply_renames(renames)
+    for source, error in failed:
+        print(f"Ошибка: {source}: {error}")
+    print(f"\nПереименовано: {done} из {len(files)}, конфликтов: {len(conflicts)}, ошибок: {len(failed)}")
+    return 1 if missing or conflicts or failed else 0
@@ -0,0 +1,122 @@
+import queue
+import threading
+import time
+
+from batch import JobError
+
+# Маркер завершения очереди
+_STOP = object()
+
+
+class Stage:
+    """
+    Этап конвейера: функция над заданием и собственный лимит параллельности.
+    handler(job) выполняет работу этапа; исключение останавливает обработку
+    этого задания (остальные задания продолжают идти по конвейеру).
+    """
+
+    def __init__(self, name, handler, concurrency=1, queue_size=None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        # Ограниченная очередь перед этапом: если этап не успевает, предыдущий ждет
+        self.queue = queue.Queue(maxsize=queue_size if queue_size is not None else self.concurrency * 2)
+        self.processed = 0
+        self.busy_seconds = 0.0
+
+
+class Pipeline:
+    """
+    Конвейер этапов с ограниченными очередями между ними.
+
+    Каждый этап обслуживается своим пулом потоков, поэтому файл N+1 может
+    загружаться, пока файл N ожидает распознавания или саммаризируется.
+    """
+
+    def __init__(self, stages, on_finish=None):
+        self.stages = stages
+        # on_finish(job) вызывается из потока этапа, когда задание завершено (успешно или с ошибкой)
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+
+    def _finish(self, job):
+        job.finished = time.time()
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def _fail(self, job, error):
+        job.status = "failed"
+        job.error = error
+        job.log(f"Ошибка: {error}")
+        self._finish(job)
+
+    def _worker(self, index, remaining):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                break
+            started = time.monotonic()
+            if job.started is None:
+                job.started = time.time()
+            try:
+                job.stage = stage.name
+                stage.handler(job)
+            except JobError as e:
+                self._fail(job, str(e))
+                continue
+            except Exception as e:
+                self._fail(job, f"{type(e).__name__}: {e}")
+                continue
+            finally:
+                with self._lock:
+                    stage.processed += 1
+                    stage.busy_seconds += time.monotonic() - started
+
+            if next_stage is not None:
+                next_stage.queue.put(job)
+            else:
+                job.status = "ok"
+                self._finish(job)
+
+        # Последний завершившийся поток этапа закрывает очередь следующего
+        with self._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and next_stage is not None:
+            for _ in range(next_stage.concurrency):
+                next_stage.queue.put(_STOP)
+
+    def run(self, jobs):
+        """
+        Пропускает все задания через конвейер и ждет завершения. jobs - список
+        или генератор (режим --watch: задания подаются по мере появления).
+        Возвращает список поданных заданий.
+        """
+        if isinstance(jobs, list) and len(jobs) > 1:
+            for job in jobs:
+                job.show_prefix = True
+
+        remaining = [stage.concurrency for stage in self.stages]
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.concurrency):
+                thread = threading.Thread(target=self._worker, args=(index, remaining),
+                                          name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        fed = []
+        for job in jobs:
+            job.status = "running"
+            # Блокируется, если первый этап не успевает (ограниченная очередь)
+            first.queue.put(job)
+            fed.append(job)
+        for _ in range(first.concurrency):
+            first.queue.put(_STOP)
+
+        for thread in threads:
+            thread.join()
+        return fed
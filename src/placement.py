@@ -0,0 +1,152 @@
+"""
+Размещение исходного аудио в папке результатов без лишнего копирования.
+
+Перемещение: сначала os.rename (мгновенно в пределах одной файловой
+системы), на другой файловой системе - копирование и удаление исходника.
+Копирование (--keep-original): жесткая ссылка, затем клон (reflink,
+FICLONE - Btrfs, XFS), затем копирование внутри ядра (copy_file_range -
+на NFS 4.2/SMB3 это копирование на стороне сервера, затем sendfile) и
+только в последнюю очередь обычное копирование блоками через Python.
+
+Каждый способ, который не поддерживается файловой системой, молча
+пропускается; place_file() возвращает название использованного способа.
+Файл сначала пишется под временным именем и переименовывается в целевое
+только целиком.
+
+Жесткая ссылка означает, что оригинал и копия - один и тот же файл на
+диске: запись, измененная на месте (например, редактором тегов), изменится
+в обоих местах. Для аудио, которое только читается, это безопасно.
+"""
+import errno
+import os
+import shutil
+import sys
+import uuid
+from pathlib import Path
+
+# Блок копирования для copy_file_range/sendfile и для обычного копирования
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# ioctl клонирования файла в Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# Ошибки "способ не поддерживается здесь" - переходим к следующему
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+                errno.EPERM, errno.EACCES, errno.EMLINK, errno.EBADF}
+if hasattr(errno, "ENOTSUP"):
+    _UNSUPPORTED.add(errno.ENOTSUP)
+
+
+def _temp_name(target):
+    return target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.part")
+
+
+def _reflink(src_fd, dst_fd, size):
+    import fcntl
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE, size - offset), offset, offset)
+        if copied == 0:
+            raise OSError(errno.EINVAL, "copy_file_range вернул 0 до конца файла")
+        offset += copied
+
+
+def _sendfile(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK_SIZE, size - offset))
+        if sent == 0:
+            raise OSError(errno.EINVAL, "sendfile вернул 0 до конца файла")
+        offset += sent
+
+
+def _chunked_copy(src_fd, dst_fd, size):
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    while True:
+        block = os.read(src_fd, COPY_CHUNK_SIZE)
+        if not block:
+            break
+        view = memoryview(block)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def _copy_strategies():
+    strategies = []
+    if sys.platform.startswith("linux"):
+        strategies.append(("reflink", _reflink))
+    if hasattr(os, "copy_file_range"):
+        strategies.append(("copy_file_range", _copy_file_range))
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        strategies.append(("sendfile", _sendfile))
+    strategies.append(("copy", _chunked_copy))
+    return strategies
+
+
+def copy_file(source, target):
+    """
+    Копирует файл самым дешевым доступным способом (без жестких ссылок)
+    с сохранением времени и прав, как shutil.copy2. Возвращает способ.
+    """
+    source, target = Path(source), Path(target)
+    tmp_path = _temp_name(target)
+    try:
+        with open(source, "rb") as src, open(tmp_path, "xb") as dst:
+            size = os.fstat(src.fileno()).st_size
+            for name, strategy in _copy_strategies():
+                try:
+                    strategy(src.fileno(), dst.fileno(), size)
+                    break
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED or strategy is _chunked_copy:
+                        raise
+                    # Способ мог успеть скопировать часть файла и сдвинуть позицию
+                    # записи (sendfile): следующий способ пишет с начала
+                    os.ftruncate(dst.fileno(), 0)
+                    os.lseek(dst.fileno(), 0, os.SEEK_SET)
+        shutil.copystat(source, tmp_path)
+        os.replace(tmp_path, target)
+        return name
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def place_file(source, target, keep_original=False):
+    """
+    Переносит (или при keep_original - копирует) source в target.
+    Возвращает использованный способ: in-place (файл уже на месте), rename,
+    hardlink, reflink, copy_file_range, sendfile или copy. Ошибки - OSError.
+    """
+    source, target = Path(source), Path(target)
+    if target.exists() and os.path.samefile(source, target):
+        return "in-place"
+
+    if not keep_original:
+        try:
+            os.replace(source, target)
+            return "rename"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        # Другая файловая система: копирование, затем удаление исходника
+        strategy = copy_file(source, target)
+        source.unlink()
+        return strategy
+
+    tmp_path = _temp_name(target)
+    try:
+        os.link(source, tmp_path)
+        os.replace(tmp_path, target)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return copy_file(source, target)
@@ -0,0 +1,59 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+PLAN_VERSION = 1
+
+
+class RunPlan:
+    """
+    План запуска: промпт и модель саммаризации для каждого файла.
+
+    Все интерактивные вопросы задаются до начала загрузки, а ответы
+    сохраняются в JSON-файл, который можно повторно использовать
+    (--plan), чтобы следующие запуски шли без вопросов.
+
+    Формат файла:
+        {"version": 1,
+         "default": {"prompt_id": "...", "user_prompt": null, "model": "llama"},
+         "files": {"/путь/к/файлу.mp3": {...}}}
+    """
+
+    def __init__(self, default=None, files=None):
+        self.default = default
+        self.files = files or {}
+
+    @staticmethod
+    def make_entry(prompt_id, model, user_prompt=None):
+        return {"prompt_id": prompt_id, "user_prompt": user_prompt, "model": model}
+
+    def get(self, path):
+        """Выбор для файла: по полному пути, затем по имени файла, затем значение по умолчанию."""
+        path = Path(path)
+        entry = self.files.get(str(path))
+        if entry is None:
+            for key, value in self.files.items():
+                if Path(key).name == path.name:
+                    entry = value
+                    break
+        return entry or self.default
+
+    def set(self, path, entry):
+        self.files[str(Path(path))] = entry
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Неподдерживаемая версия плана: {data.get('version')}")
+        return cls(default=data.get("default"), files=data.get("files"))
+
+    def save(self, path):
+        path = Path(path)
+        data = {"version": PLAN_VERSION, "default": self.default, "files": self.files}
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
@@ -0,0 +1,238 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import config
+
+# Статусы задач (сравниваются в нижнем регистре)
+DONE_STATUSES = {"ready", "completed", "done", "finished", "success"}
+# expired - сервер больше не знает задачу (истек срок хранения)
+FAILED_STATUSES = {"error", "failed", "failure", "expired"}
+
+# Границы интервала между запросами статуса одной задачи
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 60.0
+POLL_JITTER = 0.15
+
+
+class TaskFailed(Exception):
+    """Сервер сообщил об ошибке выполнения задачи."""
+
+
+class StatusUnavailable(Exception):
+    """Статус задачи не удается получить (сеть, сервер или неизвестный task_id)."""
+
+
+def parse_status(status_resp):
+    """Статус из ответа сервера (строка или словарь) в нижнем регистре."""
+    status = status_resp
+    if isinstance(status_resp, dict):
+        status = status_resp.get("status", status_resp)
+    return str(status).lower() if status else ""
+
+
+def next_poll_delay(elapsed, eta=None, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                    jitter=POLL_JITTER):
+    """
+    Пауза до следующего запроса статуса.
+
+    Если известно ожидаемое время обработки (eta, секунды от старта задачи),
+    опрос редкий в начале и частый около eta: пауза - половина оставшегося
+    времени. После eta пауза растет пропорционально опозданию. Без прогноза
+    пауза растет вместе с временем ожидания. Случайный разброс (jitter)
+    не дает многим задачам опрашиваться синхронно.
+    """
+    if eta is None:
+        delay = elapsed * 0.25
+    elif elapsed < eta:
+        delay = (eta - elapsed) * 0.5
+    else:
+        delay = (elapsed - eta) * 0.25
+    delay = min(max(delay, min_interval), max_interval)
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+class ProcessingRateModel:
+    """
+    История скорости обработки на сервере: секунды обработки на единицу
+    объема задачи (секунды аудио, символы текста и т.п.). Хранится в файле
+    рядом с токеном и сглаживается экспоненциальным средним.
+    """
+
+    SMOOTHING = 0.3
+
+    def __init__(self, path=None):
+        self.path = str(path or config.POLL_STATS_FILE)
+        self._lock = threading.Lock()
+        self._rates = None
+
+    def _load(self):
+        if self._rates is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._rates = json.load(f)
+            except (OSError, ValueError):
+                self._rates = {}
+        return self._rates
+
+    def predict(self, kind, size):
+        """Ожидаемое время обработки в секундах или None, если истории нет."""
+        if not size:
+            return None
+        with self._lock:
+            rate = self._load().get(kind)
+        return rate * size if rate else None
+
+    def record(self, kind, size, seconds):
+        if not size or seconds <= 0:
+            return
+        with self._lock:
+            rates = self._load()
+            observed = seconds / size
+            previous = rates.get(kind)
+            rates[kind] = observed if previous is None else previous + self.SMOOTHING * (observed - previous)
+            tmp_path = f"{self.path}.{uuid.uuid4().hex[:8]}.part"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(rates, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+class _PollEntry:
+    def __init__(self, task_id, size, on_status, deadline, min_interval=MIN_POLL_INTERVAL):
+        self.task_id = task_id
+        self.min_interval = min_interval
+        self.size = size
+        self.on_status = on_status
+        self.deadline = deadline
+        self.future = Future()
+        self.started = time.monotonic()
+        self.eta = None
+        self.polls = 0
+        self.errors = 0
+
+
+class PollScheduler:
+    """
+    Общий цикл опроса статусов для многих задач одного сервиса.
+
+    Все задачи опрашиваются одним фоновым потоком по очереди с приоритетом
+    (кого пора опросить раньше), а не отдельным циклом sleep() на каждую.
+    Интервалы подбираются по прогнозу времени обработки из ProcessingRateModel.
+    """
+
+    def __init__(self, kind, status_fn, rate_model=None, max_errors=30):
+        self.kind = kind
+        self.status_fn = status_fn
+        self.rate_model = rate_model or ProcessingRateModel()
+        self.max_errors = max_errors
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.total_polls = 0
+
+    def submit(self, task_id, size=None, on_status=None, timeout=None, min_interval=None):
+        """
+        Ставит задачу на опрос. Возвращает Future с финальным ответом статуса.
+        on_status(status, polls) вызывается после каждого запроса.
+        min_interval - нижняя граница паузы между запросами (по умолчанию MIN_POLL_INTERVAL).
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        entry = _PollEntry(task_id, size, on_status, deadline, min_interval or MIN_POLL_INTERVAL)
+        entry.eta = self.rate_model.predict(self.kind, size)
+        first_delay = self._delay(entry, 0)
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + first_delay, next(self._counter), entry))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"poll-{self.kind}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return entry.future
+
+    def wait(self, task_id, size=None, on_status=None, timeout=None, min_interval=None):
+        """Блокирующее ожидание завершения задачи. Возвращает (ответ статуса, число запросов)."""
+        future = self.submit(task_id, size, on_status, timeout, min_interval)
+        return future.result(), future.polls
+
+    @staticmethod
+    def _delay(entry, elapsed):
+        return next_poll_delay(elapsed, entry.eta, min_interval=entry.min_interval,
+                               max_interval=max(MAX_POLL_INTERVAL, entry.min_interval))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    # Нет задач - поток завершается, следующая submit запустит новый
+                    if not self._cond.wait(timeout=30):
+                        if not self._heap:
+                            self._thread = None
+                            return
+                due, _, entry = self._heap[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                heapq.heappop(self._heap)
+            self._poll(entry)
+
+    def _poll(self, entry):
+        elapsed = time.monotonic() - entry.started
+        if entry.deadline and time.monotonic() > entry.deadline:
+            self._finish(entry, exception=TimeoutError(f"Превышено время ожидания задачи {entry.task_id}"))
+            return
+
+        status_resp = None
+        try:
+            status_resp = self.status_fn(entry.task_id)
+        except Exception as e:
+            print(f"Ошибка опроса статуса {entry.task_id}: {e}")
+        entry.polls += 1
+        with self._cond:
+            self.total_polls += 1
+
+        if status_resp is None:
+            entry.errors += 1
+            if entry.errors >= self.max_errors:
+                self._finish(entry, exception=StatusUnavailable(f"Не удалось получить статус задачи {entry.task_id}"))
+                return
+            self._reschedule(entry, entry.min_interval * 5)
+            return
+        entry.errors = 0
+
+        status = parse_status(status_resp)
+        if entry.on_status:
+            entry.on_status(status, entry.polls)
+
+        if status in DONE_STATUSES:
+            self.rate_model.record(self.kind, entry.size, elapsed)
+            self._finish(entry, result=status_resp)
+        elif status in FAILED_STATUSES:
+            self._finish(entry, exception=TaskFailed(f"Задача {entry.task_id} завершилась с ошибкой"))
+        else:
+            self._reschedule(entry, self._delay(entry, elapsed))
+
+    def _reschedule(self, entry, delay):
+        if entry.deadline:
+            delay = max(0.0, min(delay, entry.deadline - time.monotonic()))
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), entry))
+            self._cond.notify()
+
+    def _finish(self, entry, result=None, exception=None):
+        entry.future.polls = entry.polls
+        entry.future.elapsed = time.monotonic() - entry.started
+        if exception is not None:
+            entry.future.set_exception(exception)
+        else:
+            entry.future.set_result(result)
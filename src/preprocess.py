@@ -0,0 +1,323 @@
+"""
+Предобработка аудио перед загрузкой: моно 16 кГц PCM и обрезка длинной
+тишины в начале и в конце записи.
+
+Файл обрабатывается потоково, блоками по BLOCK_FRAMES кадров, поэтому
+расход памяти не зависит от длины записи. Поддерживается WAV (PCM 8/16/24/32
+бит); остальные форматы загружаются как есть. Нужен numpy (необязательная
+зависимость): pip install numpy
+
+Обрезка начала сдвигает время, поэтому результат содержит карту смещений
+(offset_map): список пар [время в обработанном файле, время в исходном].
+remap_transcript_file() переводит метки start/end в _text.json обратно
+на шкалу исходной записи.
+"""
+import json
+import os
+import struct
+import uuid
+import wave
+from pathlib import Path
+
+# Формат, который отправляется на сервер
+TARGET_RATE = 16000
+# Кадров исходного файла в одном блоке обработки
+BLOCK_FRAMES = 64 * 1024
+# Порог тишины (RMS окна в dBFS) и длина окна анализа
+SILENCE_DB = -45.0
+SILENCE_WINDOW = 0.03
+# Обрезается только тишина длиннее MIN_SILENCE секунд; у речи остается запас MARGIN секунд
+MIN_SILENCE = 2.0
+MARGIN = 0.5
+# Длина ФНЧ перед понижением частоты дискретизации
+FILTER_TAPS = 63
+# Меняется при изменении алгоритма (входит в ключ кэша результатов)
+PREPROCESS_VERSION = 1
+
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PreprocessResult:
+    """Результат предобработки одного файла."""
+
+    def __init__(self, path, source_rate, source_channels, original_bytes, output_bytes,
+                 trimmed_start, trimmed_end, offset_map):
+        self.path = path
+        self.source_rate = source_rate
+        self.source_channels = source_channels
+        self.original_bytes = original_bytes
+        self.output_bytes = output_bytes
+        self.trimmed_start = trimmed_start
+        self.trimmed_end = trimmed_end
+        self.offset_map = offset_map
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - self.output_bytes
+
+    def describe(self):
+        channels = "моно" if self.source_channels == 1 else f"{self.source_channels} кан."
+        percent = self.bytes_saved * 100 / self.original_bytes if self.original_bytes else 0
+        return (f"{self.source_rate} Гц {channels} -> {TARGET_RATE} Гц моно, "
+                f"тишина: -{self.trimmed_start:.1f} с в начале, -{self.trimmed_end:.1f} с в конце, "
+                f"размер: {self.original_bytes / 1024 / 1024:.1f} МБ -> {self.output_bytes / 1024 / 1024:.1f} МБ "
+                f"(-{percent:.0f}%)")
+
+
+def _wav_header(data_bytes, rate=TARGET_RATE, channels=1, bits=16):
+    block_align = channels * bits // 8
+    return (b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * block_align, block_align, bits)
+            + b"data" + struct.pack("<I", data_bytes))
+
+
+def _to_float(np, raw, sample_width, channels):
+    """PCM-байты в массив float32 формы (кадры, каналы) в диапазоне [-1, 1]."""
+    if sample_width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        data = values.astype(np.float32) / 8388608.0
+    else:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    return data.reshape(-1, channels)
+
+
+class _StreamResampler:
+    """
+    Потоковая передискретизация: ФНЧ (оконный sinc) с переносом хвоста
+    между блоками и линейная интерполяция с непрерывной фазой.
+    """
+
+    def __init__(self, np, source_rate, target_rate):
+        self.np = np
+        self.step = source_rate / target_rate
+        self.kernel = None
+        if target_rate < source_rate:
+            cutoff = 0.45 * target_rate / source_rate
+            n = np.arange(FILTER_TAPS) - (FILTER_TAPS - 1) / 2
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(FILTER_TAPS)
+            self.kernel = (kernel / kernel.sum()).astype(np.float32)
+            self.history = np.zeros(FILTER_TAPS - 1, dtype=np.float32)
+        self.pos = 0.0
+        self.carry = None
+
+    def process(self, x):
+        np = self.np
+        if self.kernel is not None:
+            joined = np.concatenate([self.history, x])
+            self.history = joined[-(FILTER_TAPS - 1):]
+            x = np.convolve(joined, self.kernel, mode="valid").astype(np.float32)
+        if self.step == 1.0:
+            return x
+        buf = x if self.carry is None else np.concatenate([self.carry, x])
+        if len(buf) < 2:
+            self.carry = buf
+            return buf[:0]
+        last = len(buf) - 1
+        count = int((last - self.pos) // self.step) + 1 if self.pos <= last else 0
+        positions = self.pos + self.step * np.arange(count)
+        out = np.interp(positions, np.arange(len(buf)), buf).astype(np.float32)
+        # Следующий буфер начинается с последнего отсчета текущего
+        self.pos = self.pos + self.step * count - last
+        self.carry = buf[-1:]
+        return out
+
+
+def preprocess_wav(input_path, output_dir):
+    """
+    Конвертирует WAV в моно 16 кГц 16 бит и обрезает длинную тишину.
+    Возвращает PreprocessResult или None, если файл не поддерживается или
+    обработка не уменьшает его.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        print("Предобработка пропущена: не установлен numpy (pip install numpy)")
+        return None
+
+    input_path = Path(input_path)
+    try:
+        source = wave.open(str(input_path), "rb")
+    except (wave.Error, EOFError, OSError):
+        return None
+
+    output_path = Path(output_dir) / f"{input_path.stem}.wav"
+    tmp_path = output_path.with_name(f".{output_path.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with source:
+            return _convert(np, source, input_path, output_path, tmp_path)
+    except (wave.Error, EOFError, OSError, ValueError) as e:
+        print(f"Ошибка предобработки {input_path.name}: {e}")
+        return None
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _convert(np, source, input_path, output_path, tmp_path):
+    """Потоковая конвертация открытого WAV во временный файл tmp_path."""
+    channels = source.getnchannels()
+    sample_width = source.getsampwidth()
+    source_rate = source.getframerate()
+    if sample_width not in (1, 2, 3, 4) or not channels or not source_rate:
+        return None
+
+    resampler = _StreamResampler(np, source_rate, TARGET_RATE)
+    window = int(SILENCE_WINDOW * TARGET_RATE)
+    threshold = 10 ** (SILENCE_DB / 20)
+    min_silence = int(MIN_SILENCE * TARGET_RATE)
+    margin = int(MARGIN * TARGET_RATE)
+
+    # Тишина в начале копится в буфере не длиннее min_silence отсчетов
+    lead = []
+    lead_len = 0
+    lead_total = 0
+    voice_found = False
+    written = 0
+    last_voice_end = 0
+    remainder = np.zeros(0, dtype=np.float32)
+
+    with open(tmp_path, "xb") as out:
+        out.write(_wav_header(0))
+
+        def write(samples):
+            pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+            out.write(pcm.tobytes())
+
+        while True:
+            raw = source.readframes(BLOCK_FRAMES)
+            if not raw:
+                break
+            mono = _to_float(np, raw, sample_width, channels).mean(axis=1)
+            samples = np.concatenate([remainder, resampler.process(mono)])
+            # Анализ окнами фиксированной длины; неполное окно переносится в следующий блок
+            usable = len(samples) - len(samples) % window
+            samples, remainder = samples[:usable], samples[usable:]
+            if not usable:
+                continue
+            rms = np.sqrt(np.mean(samples.reshape(-1, window) ** 2, axis=1))
+            voiced = np.nonzero(rms >= threshold)[0]
+
+            if not voice_found:
+                if not len(voiced):
+                    lead.append(samples)
+                    lead_len += len(samples)
+                    lead_total += len(samples)
+                    # Храним только хвост длиной min_silence
+                    while lead and lead_len - len(lead[0]) >= min_silence:
+                        lead_len -= len(lead.pop(0))
+                    continue
+                voice_found = True
+                first = voiced[0] * window
+                lead_total += first
+                buffered = np.concatenate(lead + [samples[:first]]) if lead else samples[:first]
+                lead = []
+                # Короткая тишина сохраняется целиком, длинная - только запас перед речью
+                keep = buffered if lead_total <= min_silence else buffered[max(0, len(buffered) - margin):]
+                write(keep)
+                written += len(keep)
+                trimmed_start_samples = lead_total - len(keep)
+                samples = samples[first:]
+                voiced = voiced - voiced[0]
+
+            write(samples)
+            if len(voiced):
+                last_voice_end = written + (voiced[-1] + 1) * window
+            written += len(samples)
+
+        if not voice_found:
+            # Запись целиком тихая: загружаем как есть, пусть решает сервер
+            out.close()
+            os.remove(tmp_path)
+            return None
+
+        if len(remainder):
+            write(remainder)
+            written += len(remainder)
+
+        # Обрезка конца: хвост тишины отрезается в файле, без буферизации в памяти
+        keep_samples = written
+        if written - last_voice_end > min_silence:
+            keep_samples = min(written, last_voice_end + margin)
+        out.truncate(len(_wav_header(0)) + keep_samples * 2)
+        out.seek(0)
+        out.write(_wav_header(keep_samples * 2))
+
+    original_bytes = input_path.stat().st_size
+    output_bytes = tmp_path.stat().st_size
+    if output_bytes >= original_bytes:
+        return None
+    os.replace(tmp_path, output_path)
+
+    trimmed_start = float(trimmed_start_samples) / TARGET_RATE
+    return PreprocessResult(
+        path=output_path,
+        source_rate=source_rate,
+        source_channels=channels,
+        original_bytes=original_bytes,
+        output_bytes=output_bytes,
+        trimmed_start=trimmed_start,
+        trimmed_end=float(written - keep_samples) / TARGET_RATE,
+        offset_map=[[0.0, round(trimmed_start, 3)]],
+    )
+
+
+def map_time(t, offset_map):
+    """Время в обработанном файле -> время в исходной записи."""
+    original = t
+    for processed_start, original_start in offset_map:
+        if t >= processed_start:
+            original = original_start + (t - processed_start)
+        else:
+            break
+    return original
+
+
+def _remap(node, offset_map):
+    if isinstance(node, list):
+        for item in node:
+            _remap(item, offset_map)
+    elif isinstance(node, dict):
+        for key in ("start", "end"):
+            value = node.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                node[key] = round(map_time(value, offset_map), 3)
+        for value in node.values():
+            if isinstance(value, (list, dict)):
+                _remap(value, offset_map)
+
+
+def remap_transcript_file(path, offset_map):
+    """
+    Переводит метки start/end в JSON-транскрипции на шкалу исходной записи
+    (на месте). Возвращает False, если файл не является JSON.
+    """
+    if not offset_map or all(p == o for p, o in offset_map):
+        return True
+    path = Path(path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except ValueError:
+        return False
+    _remap(data, offset_map)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(tmp_path, "x", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
@@ -0,0 +1,311 @@
+"""
+Быстрое определение параметров аудиофайла по заголовкам контейнера,
+без декодирования: длительность, частота дискретизации, число каналов.
+
+Поддерживаются WAV (RIFF), MP3 (заголовки кадров, Xing/Info, VBRI),
+OGG (Vorbis/Opus, позиция последней страницы), M4A/MP4 (атом moov) и
+FLAC (STREAMINFO). Формат определяется по содержимому, а не по
+расширению. С диска читаются только заголовки (несколько килобайт),
+поэтому проба тысячи файлов занимает доли секунды.
+
+Пустые и поврежденные файлы (формат распознан, но заголовок испорчен,
+или расширение обещает поддерживаемый формат, а содержимое не совпадает)
+отклоняются исключением ProbeError. Для остальных форматов (webm, wma и
+т.п.) длительность неизвестна (None).
+"""
+import struct
+from pathlib import Path
+
+# Сколько байт начала файла читается сразу
+HEAD_BYTES = 16 * 1024
+# Сколько байт с конца файла просматривается в поисках последней страницы OGG
+OGG_TAIL_BYTES = 64 * 1024
+# Расширения, содержимое которых обязано распознаться
+PROBED_EXTENSIONS = {".wav", ".mp3", ".ogg", ".opus", ".m4a", ".mp4", ".flac"}
+
+_MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+
+class ProbeError(Exception):
+    """Файл пустой или поврежден - загружать его бессмысленно."""
+
+
+class AudioInfo:
+    """Параметры аудиофайла по данным заголовков."""
+
+    def __init__(self, format, size, duration=None, sample_rate=None, channels=None):
+        self.format = format
+        self.size = size
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    def describe(self):
+        if self.duration is None:
+            return f"{self.format or 'формат не распознан'}, длительность неизвестна"
+        minutes, seconds = divmod(int(self.duration), 60)
+        hours, minutes = divmod(minutes, 60)
+        length = f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+        parts = [self.format, length]
+        if self.sample_rate:
+            parts.append(f"{self.sample_rate} Гц")
+        if self.channels:
+            parts.append("моно" if self.channels == 1 else f"{self.channels} кан.")
+        return ", ".join(parts)
+
+
+def probe_file(path):
+    """Возвращает AudioInfo; для пустого или поврежденного файла - ProbeError."""
+    path = Path(path)
+    try:
+        size = path.stat().st_size
+        if size == 0:
+            raise ProbeError("пустой файл")
+        with open(path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+            info = _probe(f, head, size, path.suffix.lower())
+    except OSError as e:
+        raise ProbeError(f"не удалось прочитать файл: {e}")
+    except struct.error:
+        raise ProbeError("заголовок обрезан")
+
+    if info is None:
+        if path.suffix.lower() in PROBED_EXTENSIONS:
+            raise ProbeError(f"содержимое не похоже на {path.suffix.lower()[1:]}")
+        return AudioInfo(None, size)
+    if info.duration is not None and info.duration <= 0:
+        raise ProbeError(f"{info.format}: нет аудиоданных")
+    return info
+
+
+def _probe(f, head, size, suffix):
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return _probe_wav(f, size)
+    if head[:4] == b"fLaC":
+        return _probe_flac(head, size)
+    if head[:4] == b"OggS":
+        return _probe_ogg(f, head, size)
+    if head[4:8] == b"ftyp":
+        return _probe_mp4(f, size)
+    # У MP3 без тега перед первым кадром может быть мусор - для .mp3 кадр ищется дальше
+    if head[:3] == b"ID3" or _mp3_frame(head, 0) is not None or suffix == ".mp3":
+        return _probe_mp3(f, head, size)
+    return None
+
+
+def _probe_wav(f, size):
+    fmt = None
+    offset = 12
+    while offset + 8 <= size:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ProbeError("wav: блок data раньше блока fmt")
+            _, channels, rate, byte_rate, _, _ = fmt
+            if not byte_rate or not rate:
+                raise ProbeError("wav: неверный заголовок fmt")
+            # Размер data может быть не дописан (0 или 0xFFFFFFFF у потоковой записи)
+            available = size - offset - 8
+            data_size = chunk_size if 0 < chunk_size <= available else available
+            return AudioInfo("wav", size, data_size / byte_rate, rate, channels)
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise ProbeError("wav: нет блока fmt или data")
+
+
+def _probe_flac(head, size):
+    # Первый блок метаданных - всегда STREAMINFO
+    if len(head) < 42 or head[4] & 0x7F != 0:
+        raise ProbeError("flac: нет блока STREAMINFO")
+    bits = int.from_bytes(head[18:26], "big")
+    rate = bits >> 44
+    channels = ((bits >> 41) & 0x7) + 1
+    samples = bits & 0xFFFFFFFFF
+    if not rate:
+        raise ProbeError("flac: неверная частота дискретизации")
+    return AudioInfo("flac", size, samples / rate if samples else None, rate, channels)
+
+
+def _probe_ogg(f, head, size):
+    segments = head[26]
+    packet = head[27 + segments:27 + segments + 19]
+    serial = head[14:18]
+    if packet[:8] == b"OpusHead":
+        channels, pre_skip = packet[9], struct.unpack("<H", packet[10:12])[0]
+        sample_rate = struct.unpack("<I", packet[12:16])[0]
+        fmt, granule_rate = "opus", 48000
+    elif packet[:7] == b"\x01vorbis":
+        channels, sample_rate = packet[11], struct.unpack("<I", packet[12:16])[0]
+        fmt, granule_rate, pre_skip = "vorbis", sample_rate, 0
+    else:
+        return AudioInfo("ogg", size)
+    if not granule_rate:
+        raise ProbeError("ogg: неверная частота дискретизации")
+
+    # Длительность - позиция (granule) последней страницы того же потока
+    f.seek(max(0, size - OGG_TAIL_BYTES))
+    tail = f.read(OGG_TAIL_BYTES)
+    position = len(tail)
+    while True:
+        position = tail.rfind(b"OggS", 0, position)
+        if position < 0:
+            raise ProbeError("ogg: не найдена последняя страница (файл обрезан?)")
+        page = tail[position:position + 18]
+        if len(page) == 18 and page[14:18] == serial:
+            granule = struct.unpack("<q", page[6:14])[0]
+            if granule >= 0:
+                return AudioInfo(fmt, size, (granule - pre_skip) / granule_rate, sample_rate, channels)
+
+
+def _atoms(f, start, end):
+    """Атомы MP4 в диапазоне [start, end): (тип, начало данных, конец атома). Данные не читаются."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        atom_size, atom_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if atom_size == 1:
+            atom_size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif atom_size == 0:
+            atom_size = end - offset
+        if atom_size < header:
+            raise ProbeError("mp4: неверный размер атома")
+        yield atom_type, offset + header, min(offset + atom_size, end)
+        offset += atom_size
+
+
+def _find_atom(f, start, end, *path):
+    """Границы данных вложенного атома по пути типов или None."""
+    for atom_type, data_start, atom_end in _atoms(f, start, end):
+        if atom_type == path[0]:
+            if len(path) == 1:
+                return data_start, atom_end
+            return _find_atom(f, data_start, atom_end, *path[1:])
+    return None
+
+
+def _probe_mp4(f, size):
+    moov = _find_atom(f, 0, size, b"moov")
+    if moov is None:
+        raise ProbeError("mp4: нет атома moov (файл не дописан?)")
+
+    mvhd = _find_atom(f, *moov, b"mvhd")
+    if mvhd is None:
+        raise ProbeError("mp4: нет атома mvhd")
+    f.seek(mvhd[0])
+    version = f.read(4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+    if not timescale:
+        raise ProbeError("mp4: неверная шкала времени")
+
+    # Частота и каналы - из описания первой звуковой дорожки
+    sample_rate = channels = None
+    for atom_type, data_start, atom_end in _atoms(f, *moov):
+        if atom_type != b"trak":
+            continue
+        hdlr = _find_atom(f, data_start, atom_end, b"mdia", b"hdlr")
+        if hdlr is None:
+            continue
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b"soun":
+            continue
+        stsd = _find_atom(f, data_start, atom_end, b"mdia", b"minf", b"stbl", b"stsd")
+        if stsd is not None:
+            # stsd: версия/флаги, число записей, затем заголовок записи и AudioSampleEntry
+            f.seek(stsd[0] + 8 + 8 + 8 + 8)
+            channels, _, _, _, rate = struct.unpack(">HHHHI", f.read(12))
+            sample_rate = rate >> 16
+        break
+    return AudioInfo("m4a", size, duration / timescale, sample_rate, channels)
+
+
+def _mp3_frame(data, offset):
+    """Разбор заголовка кадра MPEG audio: (версия, слой, битрейт кбит/с, частота, длина кадра) или None."""
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version = {3: 1, 2: 2, 0: 2.5}.get((b1 >> 3) & 0x3)
+    layer = {3: 1, 2: 2, 1: 3}.get((b1 >> 1) & 0x3)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    rate = _MP3_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x1
+    if layer == 1:
+        length = (12 * bitrate * 1000 // rate + padding) * 4
+    elif layer == 3 and version != 1:
+        length = 72 * bitrate * 1000 // rate + padding
+    else:
+        length = 144 * bitrate * 1000 // rate + padding
+    channels = 1 if (b3 >> 6) == 3 else 2
+    return version, layer, bitrate, rate, length, channels
+
+
+def _probe_mp3(f, head, size):
+    start = 0
+    if head[:3] == b"ID3":
+        # Размер тега ID3v2 - syncsafe (по 7 бит в байте), плюс необязательный футер
+        tag_size = 0
+        for byte in head[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+        if start >= size:
+            raise ProbeError("mp3: нет аудиоданных после тега ID3")
+        f.seek(start)
+        head = f.read(HEAD_BYTES)
+    else:
+        head = head[:HEAD_BYTES]
+
+    # Первый кадр: заголовок, за которым следует еще один корректный заголовок
+    for offset in range(len(head) - 3):
+        frame = _mp3_frame(head, offset)
+        if frame is None:
+            continue
+        following = offset + frame[4]
+        if following + 4 <= len(head) and _mp3_frame(head, following) is None:
+            continue
+        break
+    else:
+        raise ProbeError("mp3: не найден заголовок кадра")
+
+    version, layer, bitrate, rate, _, channels = frame
+    samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+    # VBR: число кадров из заголовка Xing/Info или VBRI в первом кадре
+    side_info = (17 if channels == 1 else 32) if version == 1 else (9 if channels == 1 else 17)
+    xing = offset + 4 + side_info
+    frames = None
+    if head[xing:xing + 4] in (b"Xing", b"Info") and struct.unpack(">I", head[xing + 4:xing + 8])[0] & 0x1:
+        frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+    elif head[offset + 36:offset + 40] == b"VBRI":
+        frames = struct.unpack(">I", head[offset + 50:offset + 54])[0]
+    if frames:
+        return AudioInfo("mp3", size, frames * samples_per_frame / rate, rate, channels)
+
+    # CBR: длительность по размеру аудиоданных (без тега ID3v1 в конце)
+    audio_bytes = size - start - offset
+    if size >= 128:
+        f.seek(size - 128)
+        if f.read(3) == b"TAG":
+            audio_bytes -= 128
+    return AudioInfo("mp3", size, audio_bytes * 8 / (bitrate * 1000), rate, channels)
+
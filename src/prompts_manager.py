@@ -1,52 +1,226 @@
 import os
 import json
+import threading
+import time
+import uuid
 from pathlib import Path
 
+import config
+
+# Сколько секунд список промптов из API считается свежим
+PROMPTS_CACHE_TTL = 3600
+
+# Кэш каталога в памяти процесса (общий для всех экземпляров PromptManager)
+_catalog_lock = threading.Lock()
+_catalog_memory = {}
+
+
+def _normalize_api_prompts(raw_prompts):
+    if isinstance(raw_prompts, dict):
+        return list(raw_prompts.values())
+    if isinstance(raw_prompts, list):
+        return raw_prompts
+    return []
+
+
 class PromptManager:
-    def __init__(self, client):
-        self.client = client
+    def __init__(self, client, cache_path=None, ttl=PROMPTS_CACHE_TTL):
+        # client - клиент саммаризации или функция, которая его создает: пока каталог
+        # свежий в кэше, клиент (и requests) не нужен
+        self._client = client
         # Папка для кастомных промптов находится в корне проекта/prompts
         # Определяем путь относительно этого файла (src/prompts_manager.py -> ../prompts)
         self.prompts_dir = Path(__file__).parent.parent / "prompts"
         self.prompts_dir.mkdir(exist_ok=True)
+        # Кэш каталога на диске: промпты API с TTL и индекс локальных файлов по mtime
+        self.cache_path = Path(cache_path or config.PROMPTS_CACHE_FILE)
+        self.ttl = ttl
+        self._prefetch_thread = None
 
-    def get_all_prompts(self):
+    @property
+    def client(self):
+        if callable(self._client):
+            self._client = self._client()
+        return self._client
+
+    def _load_cache(self):
+        """Кэш каталога (из памяти процесса, иначе с диска). Вызывается под _catalog_lock."""
+        key = str(self.cache_path)
+        if key not in _catalog_memory:
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            data.setdefault("api", None)
+            data.setdefault("local", {})
+            _catalog_memory[key] = data
+        return _catalog_memory[key]
+
+    def _save_cache(self, data):
+        tmp_path = self.cache_path.with_name(f".{self.cache_path.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Предупреждение: Не удалось сохранить кэш промптов: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _get_api_prompts(self, cached, refresh=False):
         """
-        Получает список промптов из API и локальной папки.
-        Возвращает список словарей.
+        Промпты API: из кэша, пока не истек TTL, затем условный запрос к серверу.
+        Вызывается без _catalog_lock (запрос может идти долго). Возвращает tuple
+        (промпты, новая запись кэша API или None, если запись не изменилась).
         """
-        # 1. Получаем промпты из API
-        api_prompts = []
+        if cached and not refresh and time.time() - cached.get("fetched", 0) < self.ttl:
+            return cached["prompts"], None
+
         try:
-            raw_prompts = self.client.get_prompts()
-            if isinstance(raw_prompts, dict):
-                api_prompts = list(raw_prompts.values())
-            elif isinstance(raw_prompts, list):
-                api_prompts = raw_prompts
+            response = self.client.fetch_prompts(
+                etag=cached.get("etag") if cached and not refresh else None,
+                last_modified=cached.get("last_modified") if cached and not refresh else None)
         except Exception as e:
             print(f"Ошибка при получении промптов из API: {e}")
+            response = None
+
+        if response is None:
+            # Сервер недоступен - используем устаревший кэш, если он есть
+            return (cached["prompts"] if cached else []), None
+        if response["not_modified"] and cached:
+            return cached["prompts"], dict(cached, fetched=time.time())
+
+        prompts = _normalize_api_prompts(response["prompts"])
+        return prompts, {
+            "fetched": time.time(),
+            "etag": response["etag"],
+            "last_modified": response["last_modified"],
+            "prompts": prompts,
+        }
+
+    def _read_local_prompt(self, file_path, cache):
+        """
+        Содержимое файла промпта. Файл читается с диска, только если
+        изменились его mtime или размер. Возвращает tuple (content, changed).
+        """
+        stat = file_path.stat()
+        key = str(file_path.resolve())
+        entry = cache["local"].get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["content"], False
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        cache["local"][key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "content": content}
+        return content, True
+
+    def get_all_prompts(self, refresh=False):
+        """
+        Получает список промптов из API и локальной папки.
+        Возвращает список словарей.
+        """
+        if not refresh:
+            self._wait_prefetch()
+
+        # 1. Получаем промпты из API. Запрос к серверу идет без блокировки каталога:
+        # find_local_prompt/cached_api_prompt (выбор промпта до загрузки) его не ждут
+        with _catalog_lock:
+            cached_api = self._load_cache()["api"]
+        api_prompts, api_entry = self._get_api_prompts(cached_api, refresh)
+
+        with _catalog_lock:
+            cache = self._load_cache()
+            changed = api_entry is not None
+            if changed:
+                cache["api"] = api_entry
+
+            # 2. Получаем локальные кастомные промпты
+            local_prompts = []
+            seen = set()
+            if self.prompts_dir.exists():
+                for file_path in sorted(self.prompts_dir.glob("*.txt")):
+                    try:
+                        content, file_changed = self._read_local_prompt(file_path, cache)
+                        changed = changed or file_changed
+                        seen.add(str(file_path.resolve()))
 
-        # 2. Получаем локальные кастомные промпты
-        local_prompts = []
-        if self.prompts_dir.exists():
-            for file_path in self.prompts_dir.glob("*.txt"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                    
-                    if content:
-                        local_prompts.append({
-                            "id": "custom_file", # Специальный маркер
-                            "name": file_path.stem, # Имя файла без расширения
-                            "user_prompt_part": content,
-                            "is_local": True
-                        })
-                except Exception as e:
-                    print(f"Ошибка чтения файла промпта {file_path}: {e}")
+                        if content:
+                            local_prompts.append({
+                                "id": "custom_file", # Специальный маркер
+                                "name": file_path.stem, # Имя файла без расширения
+                                "user_prompt_part": content,
+                                "is_local": True
+                            })
+                    except Exception as e:
+                        print(f"Ошибка чтения файла промпта {file_path}: {e}")
+
+            # Удаляем из индекса файлы, которых больше нет
+            for key in [key for key in cache["local"] if key not in seen and Path(key).parent == self.prompts_dir.resolve()]:
+                del cache["local"][key]
+                changed = True
+
+            if changed:
+                self._save_cache(cache)
 
         # Объединяем: сначала API, потом локальные
         return api_prompts + local_prompts
 
+    def _wait_prefetch(self):
+        """Если каталог уже загружается в фоне, дожидается его (кроме вызова из самого фонового потока)."""
+        prefetch_thread = self._prefetch_thread
+        if prefetch_thread is not None and prefetch_thread is not threading.current_thread():
+            prefetch_thread.join()
+            self._prefetch_thread = None
+
+    def prefetch(self):
+        """Загружает каталог промптов в фоне (например, пока идет загрузка аудио)."""
+        if self._prefetch_thread is None:
+            self._prefetch_thread = threading.Thread(target=self.get_all_prompts, name="prompts-prefetch", daemon=True)
+            self._prefetch_thread.start()
+
+    def find_local_prompt(self, name):
+        """
+        Ищет промпт по имени файла в папке prompts (с расширением .txt или без).
+        Возвращает tuple (file_path, content) или (None, None).
+        """
+        potential_file = self.prompts_dir / f"{name}.txt"
+        if not potential_file.exists():
+            potential_file = self.prompts_dir / name
+        if not potential_file.is_file():
+            return None, None
+
+        try:
+            with _catalog_lock:
+                cache = self._load_cache()
+                content, changed = self._read_local_prompt(potential_file, cache)
+                if changed:
+                    self._save_cache(cache)
+        except Exception as e:
+            print(f"Ошибка чтения файла промпта {potential_file}: {e}")
+            return None, None
+        return (potential_file, content) if content else (None, None)
+
+    def resolve_api_prompt(self, prompt_id):
+        """
+        Описание промпта API для ключа кэша саммаризаций. Дожидается фоновой
+        загрузки каталога, а если каталога еще нет - загружает его, чтобы ключ
+        не зависел от того, успела ли загрузка. Возвращает tuple (каталог
+        получен, описание промпта или None, если в каталоге его нет).
+        """
+        self._wait_prefetch()
+        with _catalog_lock:
+            cached = self._load_cache()["api"]
+        if not cached:
+            self.get_all_prompts()
+            with _catalog_lock:
+                cached = self._load_cache()["api"]
+        if not cached:
+            return False, None
+        for prompt in cached.get("prompts", []):
+            if isinstance(prompt, dict) and prompt.get("id") == prompt_id:
+                return True, prompt
+        return True, None
+
     def save_custom_prompt(self, name, content):
         """Сохраняет кастомный промпт в файл."""
         try:
@@ -0,0 +1,351 @@
+"""
+Адаптивное ограничение параллельности запросов по ответам сервера.
+
+AdaptiveLimiter - лимит одновременных запросов к одной операции сервиса
+(загрузка файла, создание задачи, статус...) по схеме AIMD:
+- успешный ответ, когда все места были заняты, увеличивает лимит на
+  1/limit, то есть примерно на 1 за каждые limit ответов;
+- ответ 429/503 уменьшает лимит вдвое, не чаще раза за окно: ответы на
+  запросы, отправленные до уменьшения, его не повторяют;
+- рост задержки ответов в LATENCY_FACTOR раз от лучшей недавней
+  уменьшает лимит на 10%. Для загрузок сигнал по задержке отключен: их
+  время зависит от размера файла.
+Retry-After ответа 429 (превышена частота запросов) приостанавливает все
+запросы к операции на указанное время: до конца окна сервер откажет любому
+запросу. После 503 (не хватает мощности) Retry-After выдерживает только
+повторяемый запрос, остальным достаточно уменьшенного лимита.
+
+request_with_retries повторяет запрос с экспоненциальной паузой и
+случайным разбросом. Ответы 429/503 (сервер не принял запрос)
+повторяются для любых запросов, ошибки сети и 500/502/504 - только для
+идемпотентных: при обрыве POST задача на сервере могла создаться.
+
+Ограничители общие для процесса (get_limiter), поэтому все клиенты одного
+сервиса видят одну и ту же оценку его возможностей - и синхронные, и
+асинхронные (src/aclient.py: acquire_async и request_with_retries_async
+ждут места, не блокируя цикл событий).
+"""
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+# Сервер перегружен и не выполнил запрос - его можно повторить
+OVERLOAD_STATUSES = {429, 503}
+# Превышена частота запросов: Retry-After действует на все запросы операции
+RATE_LIMITED_STATUS = 429
+# Временные ошибки, после которых повторяются только идемпотентные запросы
+TRANSIENT_STATUSES = {500, 502, 504}
+
+# Повторы: число, база и потолок экспоненциальной паузы (секунды)
+DEFAULT_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# Разброс паузы после Retry-After (доля)
+RETRY_AFTER_JITTER = 0.2
+# Верхняя граница Retry-After: защита от "Retry-After: 86400"
+MAX_RETRY_AFTER = 120.0
+
+# Лимит одновременных запросов по умолчанию
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MAX_LIMIT = 32
+
+# Сигнал по задержке: во сколько раз сглаженная задержка должна превысить
+# лучшую из последних LATENCY_WINDOW (и минимум на LATENCY_MIN_DELTA секунд)
+LATENCY_FACTOR = 2.0
+LATENCY_MIN_DELTA = 0.05
+LATENCY_WINDOW = 200
+LATENCY_SMOOTHING = 0.2
+# Минимальный интервал между уменьшениями лимита (секунды)
+MIN_DECREASE_INTERVAL = 1.0
+
+# Исход запроса для AdaptiveLimiter.release
+OK = "ok"
+OVERLOAD = "overload"
+ERROR = "error"
+
+_registry_lock = threading.Lock()
+_limiters = {}
+
+
+def parse_retry_after(value):
+    """Retry-After в секундах (число или HTTP-дата) или None."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def backoff_delay(attempt, retry_after=None, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Пауза перед повтором (attempt = 0 - первый повтор): случайная в пределах
+    экспоненциально растущей границы, но не меньше Retry-After (с разбросом,
+    чтобы отложенные запросы не вернулись на сервер одновременно).
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after * random.uniform(1, 1 + RETRY_AFTER_JITTER))
+    return delay
+
+
+class AdaptiveLimiter:
+    """Лимит одновременных запросов к одной операции сервиса (AIMD)."""
+
+    def __init__(self, name, initial=DEFAULT_INITIAL_LIMIT, min_limit=1, max_limit=DEFAULT_MAX_LIMIT,
+                 use_latency=True):
+        self.name = name
+        self.use_latency = use_latency
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        # Ожидающие acquire_async: (цикл событий, future)
+        self._async_waiters = []
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency = None
+        self._recent = deque(maxlen=LATENCY_WINDOW)
+        # Счетчики для итогов запуска
+        self.requests = 0
+        self.overloads = 0
+        self.retries = 0
+        self.lowest = int(self.limit)
+        self.highest = int(self.limit)
+
+    def configure(self, initial=None, max_limit=None, min_limit=None):
+        """Меняет границы (например, по --jobs). Текущий лимит приводится к новым границам."""
+        with self._cond:
+            if min_limit is not None:
+                self.min_limit = max(1, min_limit)
+            if max_limit is not None:
+                self.max_limit = max(self.min_limit, max_limit)
+            if initial is not None:
+                self.limit = float(initial)
+            self.limit = min(max(self.limit, self.min_limit), self.max_limit)
+            self.lowest = self.highest = int(self.limit)
+            self._notify()
+
+    def _admit(self):
+        """
+        Занимает место, если оно есть (вызывается под _cond). Возвращает None,
+        если место занято, иначе сколько ждать (0 - до освобождения места).
+        """
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.requests += 1
+            return None
+        return 0
+
+    def _notify(self):
+        """Будит ожидающих acquire и acquire_async (вызывается под _cond)."""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # Цикл событий уже закрыт
+                pass
+        self._async_waiters = []
+
+    def acquire(self):
+        """Ждет свободного места (и окончания паузы после Retry-After)."""
+        with self._cond:
+            while True:
+                wait = self._admit()
+                if wait is None:
+                    return
+                self._cond.wait(wait or None)
+
+    async def acquire_async(self):
+        """acquire для asyncio: ждет места, не блокируя цикл событий."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                wait = self._admit()
+                if wait is None:
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, wait or None)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def release(self, outcome, latency=None, retry_after=None):
+        """Освобождает место и корректирует лимит по исходу запроса."""
+        now = time.monotonic()
+        with self._cond:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if outcome == OVERLOAD:
+                self.overloads += 1
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                self._decrease(now, 0.5)
+            elif outcome == OK:
+                if self._congested(latency):
+                    self._decrease(now, 0.9)
+                elif saturated:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                    self.highest = max(self.highest, int(self.limit))
+            self._notify()
+
+    def note_retry(self):
+        with self._cond:
+            self.retries += 1
+
+    def _decrease(self, now, factor):
+        # Ответы на запросы, отправленные до прошлого уменьшения, не уменьшают лимит повторно
+        if now - self._last_decrease < max(MIN_DECREASE_INTERVAL, self._latency or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.lowest = min(self.lowest, int(self.limit))
+
+    def _congested(self, latency):
+        if not self.use_latency or latency is None:
+            return False
+        self._recent.append(latency)
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+        if len(self._recent) < 10:
+            return False
+        best = min(self._recent)
+        return self._latency > best * LATENCY_FACTOR and self._latency - best > LATENCY_MIN_DELTA
+
+    def describe(self):
+        with self._cond:
+            return (f"{self.name}: лимит {int(self.limit)} (был от {self.lowest} до {self.highest}), "
+                    f"запросов {self.requests}, перегрузок {self.overloads}, повторов {self.retries}")
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_limiter(name, **options):
+    """Общий для процесса ограничитель операции; options применяются при создании."""
+    with _registry_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = AdaptiveLimiter(name, **options)
+        return limiter
+
+
+def all_limiters():
+    with _registry_lock:
+        return list(_limiters.values())
+
+
+def report_limits():
+    """Итоги по операциям, на которых сервер ограничивал запросы (ничего, если не ограничивал)."""
+    busy = [limiter for limiter in all_limiters() if limiter.overloads or limiter.retries]
+    if busy:
+        print("\nСервер ограничивал запросы, число одновременных запросов подобрано по его ответам:")
+        for limiter in busy:
+            print(f"  {limiter.describe()}")
+
+
+def request_with_retries(limiter, send, idempotent=True, retries=DEFAULT_RETRIES, network_errors=(), log=print):
+    """
+    Выполняет send() через ограничитель с повторами. send() каждый раз
+    отправляет запрос заново и возвращает ответ (status_code, headers,
+    close()). Возвращает последний ответ; ошибка сети пробрасывается, если
+    запрос неидемпотентный или повторы исчерпаны.
+    """
+    attempt = 0
+    while True:
+        limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = send()
+        except network_errors as e:
+            limiter.release(ERROR)
+            if not idempotent or attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            log(f"Ошибка сети ({limiter.name}): {e}; повтор {attempt + 1}/{retries} через {delay:.1f} с")
+        except BaseException:
+            limiter.release(ERROR)
+            raise
+        else:
+            status = response.status_code
+            retryable, retry_after = _settle(limiter, status, response.headers, time.monotonic() - started,
+                                             idempotent)
+            if not retryable or attempt >= retries:
+                return response
+            response.close()
+            delay = backoff_delay(attempt, retry_after)
+            log(f"Сервер ответил {status} ({limiter.name}); повтор {attempt + 1}/{retries} через {delay:.1f} с")
+        limiter.note_retry()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def request_with_retries_async(limiter, send, idempotent=True, retries=DEFAULT_RETRIES, network_errors=(),
+                                     log=print):
+    """
+    request_with_retries для asyncio: send() - корутина, возвращающая ответ
+    aiohttp (status, headers, release()). Ограничитель и правила повторов те же.
+    """
+    import asyncio
+
+    attempt = 0
+    while True:
+        await limiter.acquire_async()
+        started = time.monotonic()
+        try:
+            response = await send()
+        except network_errors as e:
+            limiter.release(ERROR)
+            if not idempotent or attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            log(f"Ошибка сети ({limiter.name}): {e}; повтор {attempt + 1}/{retries} через {delay:.1f} с")
+        except BaseException:
+            # В том числе отмена задачи (CancelledError): место возвращается
+            limiter.release(ERROR)
+            raise
+        else:
+            status = response.status
+            retryable, retry_after = _settle(limiter, status, response.headers, time.monotonic() - started,
+                                             idempotent)
+            if not retryable or attempt >= retries:
+                return response
+            response.release()
+            delay = backoff_delay(attempt, retry_after)
+            log(f"Сервер ответил {status} ({limiter.name}); повтор {attempt + 1}/{retries} через {delay:.1f} с")
+        limiter.note_retry()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _settle(limiter, status, headers, latency, idempotent):
+    """Отдает ограничителю исход ответа. Возвращает (можно ли повторить, Retry-After)."""
+    retry_after = None
+    if status in OVERLOAD_STATUSES:
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        limiter.release(OVERLOAD, latency, retry_after if status == RATE_LIMITED_STATUS else None)
+    else:
+        limiter.release(ERROR if status >= 500 else OK, latency)
+    return status in OVERLOAD_STATUSES or (idempotent and status in TRANSIENT_STATUSES), retry_after
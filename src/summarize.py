@@ -6,11 +6,21 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 import argparse
 import json
+import threading
 from pathlib import Path
-from summarizer import SummarizerClient
 import config
+from mapreduce import DEFAULT_CHUNK_CHARS, DEFAULT_CHUNK_CONCURRENCY
 
-def main():
+# Модели сервиса саммаризации
+MODELS = ("llama", "gpt4")
+
+# Строки одновременно выполняемых вариантов не должны перемешиваться
+_print_lock = threading.Lock()
+
+# Клиент саммаризации (requests), каталог промптов и журнал (sqlite3) импортируются
+# внутри функций: --help и --set-token не должны платить за сеть
+
+def build_parser():
     description = """
 Инструмент для автоматической саммаризации текста с использованием LLM (GPT-4, Llama).
 Позволяет выбрать готовый промпт или ввести свой собственный.
@@ -31,50 +41,111 @@ def main():
     parser.add_argument("file", nargs="?", help="Путь к текстовому файлу")
     parser.add_argument("--token", help="API Токен (необязательно, если уже сохранен через --set-token)", default=None)
     parser.add_argument("--set-token", help="Сохранить токен в ~/.asr_token для будущего использования и выйти")
-    parser.add_argument("--prompt-id", help="ID промпта (если не указан, будет интерактивный выбор)")
-    parser.add_argument("--model", choices=["gpt4", "llama"], default="llama", help="Модель для саммаризации")
+    parser.add_argument("--prompt-id", action="append",
+                        help="ID промпта или имя файла из папки prompts (если не указан, будет интерактивный выбор). "
+                             "Несколько промптов - через запятую или повтором флага")
+    parser.add_argument("--model", action="append",
+                        help=f"Модель для саммаризации: {', '.join(MODELS)} (по умолчанию: llama). "
+                             f"Несколько моделей - через запятую или повтором флага")
     parser.add_argument("--user-prompt", help="Кастомный промпт пользователя")
     parser.add_argument("--default", action="store_true",
                         help="Использовать параметры по умолчанию без интерактивных вопросов")
     parser.add_argument("--list-prompts", action="store_true",
                         help="Показать список промптов (включая из папки 'prompts' в корне программы) и завершить работу")
-    
-    # Если запуск без аргументов, выводим справку
-    if len(sys.argv) == 1:
-        parser.print_help()
-        sys.exit(0)
-    
-    args = parser.parse_args()
+    parser.add_argument("--refresh-prompts", action="store_true",
+                        help="Обновить кэш списка промптов с сервера (вместе с --list-prompts)")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS,
+                        help=f"Максимальный размер фрагмента в символах; более длинный текст саммаризируется по частям "
+                             f"(по умолчанию: {DEFAULT_CHUNK_CHARS})")
+    parser.add_argument("--chunk-concurrency", type=int, default=DEFAULT_CHUNK_CONCURRENCY,
+                        help=f"Сколько фрагментов обрабатывать одновременно (по умолчанию: {DEFAULT_CHUNK_CONCURRENCY})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать кэш саммаризаций (~/.asr_cache/summary), всегда создавать задачу")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить незавершенные задачи из журнала (~/.asr_jobs.db) и сохранить их результаты")
+    parser.add_argument("--summarizer-url", default=config.SUMMARIZER_BASE_URL,
+                        help=f"Адрес сервиса саммаризации (по умолчанию: {config.SUMMARIZER_BASE_URL})")
+    parser.add_argument("--backends", default=None,
+                        help=f"Файл с несколькими серверами и токенами для распределения задач "
+                             f"(по умолчанию: {config.BACKENDS_FILE}, если он есть)")
 
-    # Если указан --set-token, сохраняем и выходим
-    if args.set_token:
-        config.set_token(args.set_token)
-        sys.exit(0)
+    return parser
 
-    # Получение токена
-    token = config.get_token(args.token)
 
-    # Проверка токена
+def action_set_token(args, token):
+    return 0 if config.set_token(args.set_token) else 1
+
+
+def action_list_prompts(args, token):
+    from prompts_manager import PromptManager
+
+    def make_client():
+        # Клиент (и requests) нужен, только если кэш каталога устарел
+        from backends import make_summarizer_client
+        return make_summarizer_client(args.summarizer_url, token, path=args.backends)
+
+    pm = PromptManager(make_client)
+    prompts = pm.get_all_prompts(refresh=args.refresh_prompts)
+    if prompts:
+        print(json.dumps(prompts, indent=2, ensure_ascii=False))
+    else:
+        print("Не удалось получить список промптов.")
+    print(f"\nПапка с кастомными промптами: {pm.prompts_dir.resolve()}")
+    return 0
+
+
+# Флаги-действия, после которых программа завершается: (атрибут args, нужен ли токен, обработчик)
+ACTIONS = [
+    ("set_token", False, action_set_token),
+    ("list_prompts", True, action_list_prompts),
+]
+
+
+def require_token(args):
+    token = config.get_token(args.token)
     if not token:
         print("Ошибка: Не найден токен.")
         print("Используйте команду: summarize --set-token \"ваш_токен\"")
         sys.exit(1)
-    
-    # Инициализация клиента
-    client = SummarizerClient(token=token)
-
-    # Если запрошен список промптов
-    if args.list_prompts:
-        from prompts_manager import PromptManager
-        pm = PromptManager(client)
-        prompts = pm.get_all_prompts()
-        if prompts:
-            print(json.dumps(prompts, indent=2, ensure_ascii=False))
-        else:
-            print("Не удалось получить список промптов.")
-        print(f"\nПапка с кастомными промптами: {pm.prompts_dir.resolve()}")
+    return token
+
+
+def main():
+    parser = build_parser()
+
+    # Если запуск без аргументов, выводим справку
+    if len(sys.argv) == 1:
+        parser.print_help()
         sys.exit(0)
 
+    args = parser.parse_args()
+
+    unknown = [model for model in split_list(args.model) if model not in MODELS]
+    if unknown:
+        parser.error(f"неизвестная модель: {', '.join(unknown)} (доступны: {', '.join(MODELS)})")
+
+    for attribute, needs_token, action in ACTIONS:
+        if getattr(args, attribute):
+            sys.exit(action(args, require_token(args) if needs_token else None))
+
+    token = require_token(args)
+
+    from backends import make_summarizer_client, report_backends
+    from prompts_manager import PromptManager
+
+    # Инициализация клиента: соединений хватает на все варианты и фрагменты сразу
+    model_count = max(1, len(split_list(args.model)))
+    variant_count = max(1, len(split_list(args.prompt_id))) * model_count
+    client = make_summarizer_client(args.summarizer_url, token, path=args.backends,
+                                    pool_size=max(variant_count, args.chunk_concurrency * model_count))
+
+    # Каталог промптов (с дисковым кэшем) - один на весь запуск
+    pm = PromptManager(client)
+
+    # Продолжение задач, прерванных в предыдущих запусках
+    if args.resume:
+        sys.exit(0 if resume_summaries(client) else 1)
+
     input_file = args.file
     if not input_file:
         print("Ошибка: Не указан входной файл.")
@@ -86,9 +157,15 @@ def main():
         print(f"Ошибка: Файл '{input_file}' не найден.")
         sys.exit(1)
 
-    # Читаем текст из файла
-    with open(input_file, 'r', encoding='utf-8') as f:
-        text = f.read()
+    # Читаем текст из файла (_text.json - потоково, по репликам с дикторами)
+    from transcript import read_summary_input
+
+    text, is_transcript = read_summary_input(input_file)
+    if not text.strip():
+        # Например, транскрипция без сегментов или сегменты без текста
+        kind = "в транскрипции JSON нет реплик" if is_transcript else "файл пуст"
+        print(f"Ошибка: Нечего саммаризировать - {kind}: '{input_file}'.")
+        sys.exit(1)
 
     # Формируем имя выходного файла
     input_path = Path(input_file)
@@ -96,54 +173,37 @@ def main():
 
     print(f"--- Саммаризация ---")
     print(f"Входной файл: {input_file}")
-    print(f"Выходной файл: {output_file}")
+    if is_transcript:
+        print(f"Транскрипция JSON: текст собран по репликам ({len(text)} символов)")
 
-    # Получение промптов, если не указан prompt_id и не установлен --default
-    prompt_id = args.prompt_id
-    user_prompt = args.user_prompt
+    # Промпты: (метка для имени файла, prompt_id, user_prompt)
+    prompts = []
+    for name in split_list(args.prompt_id):
+        # Проверяем, не является ли prompt_id названием файла в папке prompts
+        potential_file, content = pm.find_local_prompt(name)
+        if content:
+            print(f"Используется кастомный промпт из файла: {potential_file.name}")
+            prompts.append((potential_file.stem, "custom", content))
+        else:
+            prompts.append((name, name, args.user_prompt))
 
-    # Проверяем, не является ли prompt_id названием файла в папке prompts
-    if prompt_id:
-        from prompts_manager import PromptManager
-        pm = PromptManager(client)
-        
-        # Ищем файл с таким именем (с расширением .txt или без)
-        potential_file = pm.prompts_dir / f"{prompt_id}.txt"
-        if not potential_file.exists():
-                potential_file = pm.prompts_dir / prompt_id
-        
-        if potential_file.exists() and potential_file.is_file():
-            try:
-                with open(potential_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                if content:
-                    print(f"Используется кастомный промпт из файла: {potential_file.name}")
-                    prompt_id = "custom"
-                    user_prompt = content
-            except Exception as e:
-                print(f"Ошибка чтения файла промпта {potential_file}: {e}")
-
-    if not prompt_id and not args.default:
-        from prompts_manager import PromptManager
-        pm = PromptManager(client)
-        
+    # Получение промптов, если не указан prompt_id и не установлен --default
+    if not prompts and not args.default:
         selected_id, selected_content = pm.select_prompt_interactive()
         
         if selected_id:
-            prompt_id = selected_id
-            if selected_content:
-                user_prompt = selected_content
+            prompts.append((selected_id, selected_id, selected_content or args.user_prompt))
         else:
             print("Используется промпт по умолчанию: meeting_detailed")
-            prompt_id = "meeting_detailed"
-    elif not prompt_id:
+    if not prompts:
         # Если --default и prompt_id не указан, используем meeting_detailed
-        prompt_id = "meeting_detailed"
+        prompts.append(("meeting_detailed", "meeting_detailed", args.user_prompt))
 
-    print(f"\nИспользуется промпт: {prompt_id}")
+    print(f"\nИспользуется промпт: {', '.join(label for label, _, _ in prompts)}")
     
     # Выбор модели (если не указана через аргумент и не установлен --default)
-    if not args.default and (not args.model or args.model == "llama"):
+    models = split_list(args.model)
+    if not models and not args.default:
         try:
             model_choice = input("\nВыберите модель (1 - llama [по умолчанию], 2 - gpt4, Enter для llama): ").strip()
             
@@ -153,7 +213,7 @@ def main():
                 model = "gpt4"
             else:
                 # Если введено название модели напрямую
-                if model_choice.lower() in ["llama", "gpt4"]:
+                if model_choice.lower() in MODELS:
                     model = model_choice.lower()
                 else:
                     print("Неверный выбор, используется llama по умолчанию")
@@ -161,57 +221,256 @@ def main():
         except (KeyboardInterrupt, EOFError):
             print("\nОтменено пользователем")
             sys.exit(1)
-    else:
-        model = args.model
+        models = [model]
+    elif not models:
+        models = ["llama"]
     
-    print(f"Модель: {model}")
+    print(f"Модель: {', '.join(models)}")
+
+    # Все сочетания промпта и модели; у одного варианта - прежнее имя <base>_sum.md
+    variants = []
+    for label, prompt_id, user_prompt in prompts:
+        for model in models:
+            variants.append({
+                "label": label,
+                "prompt_id": prompt_id,
+                "user_prompt": user_prompt,
+                "model": model,
+                "output_file": output_file if len(prompts) * len(models) == 1
+                else input_path.parent / variant_file_name(input_path.stem, label, model),
+            })
+    if len(variants) == 1:
+        print(f"Выходной файл: {output_file}")
+    else:
+        print(f"\nВариантов: {len(variants)}, выполняются одновременно:")
+        for variant in variants:
+            print(f"  {variant['label']} / {variant['model']} -> {variant['output_file'].name}")
+        print()
+
+    done = summarize_variants(client, pm, text, variants, args, input_file)
+    report_backends(client)
+    if len(variants) == 1:
+        if not done:
+            sys.exit(1)
+        print(f"\n✓ Готово! Результат сохранен в: {output_file}")
+        return
+
+    print(f"\n--- Итоги: готово {len(done)} из {len(variants)} ---")
+    for variant in variants:
+        mark = "✓" if variant in done else "✗"
+        print(f"{mark} {variant['label']} / {variant['model']}: {variant['output_file']}")
+    if len(done) < len(variants):
+        sys.exit(1)
+
+
+def split_list(values):
+    """Значения флага, заданного несколько раз и/или через запятую (без повторов)."""
+    items = []
+    for value in values or []:
+        for item in value.split(","):
+            item = item.strip()
+            if item and item not in items:
+                items.append(item)
+    return items
+
+
+def variant_file_name(stem, label, model):
+    """Имя результата варианта: <base>_sum.<промпт>.<модель>.md"""
+    safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label).strip("_") or "prompt"
+    return f"{stem}_sum.{safe_label}.{model}.md"
+
+
+def variant_log(variant, single):
+    """Вывод варианта: при нескольких вариантах строки помечаются промптом и моделью."""
+    if single:
+        return print
+    prefix = f"[{variant['label']}/{variant['model']}]"
+
+    def log(message):
+        with _print_lock:
+            print(f"{prefix} {message.lstrip()}")
+    return log
+
+
+def summarize_variants(client, pm, text, variants, args, input_file):
+    """
+    Саммаризация одного текста всеми вариантами (промпт x модель).
+    Задачи всех вариантов создаются сразу, статусы опрашивает общий цикл
+    клиента (PollScheduler), поэтому общее время - время самого долгого
+    варианта, а не сумма. Для длинного текста этап map выполняется один раз
+    на модель и используется всеми ее промптами.
+    Возвращает список сохраненных вариантов.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from journal import JobJournal
+    from mapreduce import MapReduceSummarizer
+
+    single = len(variants) == 1
+    for variant in variants:
+        variant["log"] = variant_log(variant, single)
+
+    # Тот же текст с тем же промптом и моделью уже саммаризирован - задача на сервере не нужна
+    summary_cache = None
+    if not args.no_cache:
+        from cache import open_summary_cache, summary_key
+
+        summary_cache = open_summary_cache()
+    done = []
+    pending = []
+    for variant in variants:
+        variant["cache_key"] = None
+        if summary_cache is not None:
+            resolved, prompt_info = (True, None) if variant["user_prompt"] else \
+                pm.resolve_api_prompt(variant["prompt_id"])
+            if resolved:
+                variant["cache_key"] = summary_key(text, variant["prompt_id"], variant["model"],
+                                                   user_prompt=variant["user_prompt"], prompt_info=prompt_info,
+                                                   chunk_chars=args.chunk_chars)
+            else:
+                # Без каталога ключ не учитывал бы содержимое промпта API
+                variant["log"]("Каталог промптов недоступен, кэш саммаризаций не используется.")
+        if variant["cache_key"] is not None:
+            cached_text = summary_cache.get_text(variant["cache_key"])
+            if cached_text is not None:
+                with open(variant["output_file"], 'w', encoding='utf-8') as f:
+                    f.write(cached_text)
+                variant["log"]("Саммаризация найдена в кэше, задача на сервере не создается.")
+                done.append(variant)
+                continue
+        pending.append(variant)
+    if not pending:
+        return done
+
+    # Длинный текст не помещается в контекст модели - саммаризация по частям
+    condensed = {}
+    if len(text) > args.chunk_chars:
+        print(f"Текст длинный ({len(text)} символов), саммаризация по частям...")
+        models = list(dict.fromkeys(variant["model"] for variant in pending))
+
+        def condense(model):
+            log = print if len(models) == 1 else variant_log({"label": "map", "model": model}, False)
+            summarizer = MapReduceSummarizer(client, chunk_chars=args.chunk_chars,
+                                             concurrency=args.chunk_concurrency, log=log)
+            return summarizer.condense(text, model)
+
+        with ThreadPoolExecutor(max_workers=len(models)) as executor:
+            condensed = dict(zip(models, executor.map(condense, models)))
+
+    def run(variant):
+        variant_text = condensed.get(variant["model"], text)
+        if variant_text is None:
+            variant["log"]("Ошибка: Не удалось выполнить саммаризацию.")
+            return False
+        if variant_text is not text:
+            variant["log"]("Этап reduce: итоговая саммаризация...")
+        return run_variant(client, journal, variant, variant_text, input_file, summary_cache)
+
+    with JobJournal() as journal, ThreadPoolExecutor(max_workers=len(pending)) as executor:
+        results = list(executor.map(run, pending))
+    done.extend(variant for variant, ok in zip(pending, results) if ok)
+    return done
+
+
+def run_variant(client, journal, variant, text, input_file, summary_cache=None):
+    """Задача саммаризации одного варианта: создание, журнал, ожидание и сохранение."""
+    from journal import STATE_DONE, STATE_FAILED
+    from polling import TaskFailed
+
+    log = variant["log"]
+    output_file = variant["output_file"]
 
     # Создание задачи
-    print("Создание задачи саммаризации...")
-    task_id = client.create_task(text, prompt_id, model=model, user_prompt=user_prompt)
+    log("Создание задачи саммаризации...")
+    task_id = client.create_task(text, variant["prompt_id"], model=variant["model"],
+                                 user_prompt=variant["user_prompt"])
     
     if not task_id:
-        print("Ошибка: Не удалось создать задачу.")
-        sys.exit(1)
+        log("Ошибка: Не удалось создать задачу.")
+        return False
 
     # Если вернулся словарь, извлекаем task_id
     if isinstance(task_id, dict):
         task_id = task_id.get("task_id") or task_id.get("id") or task_id
 
-    print(f"ID задачи: {task_id}")
+    log(f"ID задачи: {task_id}")
+
+    # Запоминаем задачу сразу, чтобы ее можно было подхватить после сбоя
+    journal_id = journal.add("summary", task_id, input_file,
+                             {"output_file": str(output_file.resolve()), "prompt_id": variant["prompt_id"],
+                              "model": variant["model"]})
+
+    try:
+        if not finish_summary(client, task_id, output_file, log=log):
+            return False
+    except TaskFailed as e:
+        # Задача завершилась с ошибкой или истекла на сервере - --resume ее не подхватывает
+        journal.update(journal_id, STATE_FAILED, str(e))
+        return False
+    journal.update(journal_id, STATE_DONE)
+    if summary_cache is not None and variant["cache_key"] is not None and output_file.stat().st_size:
+        summary_cache.put(variant["cache_key"], output_file)
+    return True
+
+
+def finish_summary(client, task_id, output_file, log=print):
+    """
+    Ожидание задачи саммаризации, получение результата и сохранение в Markdown.
+    TaskFailed - задача завершилась с ошибкой или истекла на сервере.
+    """
+    from summarizer import extract_summary_text
 
     # Ожидание завершения
-    print("Ожидание завершения...")
-    status = client.wait_for_completion(task_id)
+    log("Ожидание завершения...")
+    status = client.wait_for_completion(task_id, log=log, raise_failed=True)
     
     if not status:
-        print("Ошибка: Задача не завершена.")
-        sys.exit(1)
+        log("Ошибка: Задача не завершена.")
+        return False
 
     # Получение результата
-    print("Получение результата...")
+    log("Получение результата...")
     result = client.get_result(task_id)
     
     if not result:
-        print("Ошибка: Не удалось получить результат.")
-        sys.exit(1)
+        log("Ошибка: Не удалось получить результат.")
+        return False
 
     # Извлечение текста саммаризации
-    if isinstance(result, dict) and "summary" in result:
-        # Если результат - JSON с ключом summary, извлекаем его
-        result_text = result["summary"]
-    elif isinstance(result, str):
-        # Если результат - строка, используем как есть
-        result_text = result
-    else:
-        # Иначе сохраняем как JSON
-        result_text = json.dumps(result, indent=2, ensure_ascii=False)
+    result_text = extract_summary_text(result)
     
     # Сохранение результата как Markdown
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(result_text)
-    
-    print(f"\n✓ Готово! Результат сохранен в: {output_file}")
+    return True
+
+
+def resume_summaries(client):
+    """Продолжение незавершенных задач саммаризации из журнала."""
+    from journal import JobJournal, STATE_DONE, STATE_FAILED
+    from polling import TaskFailed
+
+    with JobJournal() as journal:
+        entries = journal.pending("summary")
+        if not entries:
+            print("Незавершенных задач саммаризации нет.")
+            return True
+
+        all_ok = True
+        for entry in entries:
+            output_file = Path(entry["params"]["output_file"])
+            print(f"\n--- Продолжение задачи {entry['task_id']} ---")
+            print(f"Выходной файл: {output_file}")
+            try:
+                finished = finish_summary(client, entry["task_id"], output_file)
+            except TaskFailed as e:
+                journal.update(entry["id"], STATE_FAILED, str(e))
+                finished = False
+            if finished:
+                journal.update(entry["id"], STATE_DONE)
+                print(f"✓ Результат сохранен в: {output_file}")
+            else:
+                all_ok = False
+        return all_ok
 
 if __name__ == "__main__":
     main()
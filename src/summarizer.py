@@ -1,27 +1,108 @@
+import json
 import requests
-import time
+from urllib.parse import urlparse
+import config
+from polling import PollScheduler, TaskFailed, StatusUnavailable
+from http_pool import REQUEST_TIMEOUT, STATUS_TIMEOUT, make_session
+from ratelimit import DEFAULT_RETRIES, get_limiter, request_with_retries
+
+# Ошибки сети, после которых идемпотентный запрос можно повторить
+NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+def extract_summary_text(result):
+    """Текст саммаризации из ответа get_result (словарь с summary, строка или иной JSON)."""
+    if isinstance(result, dict) and "summary" in result:
+        return result["summary"]
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, indent=2, ensure_ascii=False)
+
 
 class SummarizerClient:
-    def __init__(self, base_url="https://bit-summarize.1bitai.ru", token=None):
+    def __init__(self, base_url=config.SUMMARIZER_BASE_URL, token=None, pool_size=None, name=None):
         self.base_url = base_url.rstrip('/')
         self.token = token
-        self.session = requests.Session()
-        if self.token:
-            self.session.headers.update({"authorization": f"Bearer {self.token}"})
+        # Сессия на общем для процесса пуле соединений (см. http_pool)
+        self.session = make_session(pool_size, headers={"authorization": f"Bearer {self.token}"} if self.token else None)
+        # Общий цикл опроса статусов: параллельные wait_for_completion не плодят отдельных циклов
+        self.poller = PollScheduler("summary", self.get_status)
+        # Размер текста задачи (символы) - для прогноза времени обработки
+        self._task_sizes = {}
+        # Лимиты одновременных запросов по ответам сервера (общие для процесса, см. ratelimit).
+        # name различает токены одного сервера в пуле (см. backends): у каждого своя квота
+        host = name or urlparse(self.base_url).netloc or self.base_url
+        self.create_limiter = get_limiter(f"summary/create@{host}")
+        self.status_limiter = get_limiter(f"summary/status@{host}")
+        self.result_limiter = get_limiter(f"summary/result@{host}")
+
+    def _get(self, limiter, url, retries=DEFAULT_RETRIES, timeout=REQUEST_TIMEOUT, **kwargs):
+        """GET через ограничитель с повторами (retries=0 - без повторов)."""
+        return request_with_retries(limiter, lambda: self.session.get(url, timeout=timeout, **kwargs),
+                                    retries=retries, network_errors=NETWORK_ERRORS)
+
+    def health_check(self):
+        """Проверка доступности сервиса."""
+        try:
+            response = self.session.get(f"{self.base_url}/health", timeout=STATUS_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            print(f"Ошибка Health Check: {e}")
+            return None
 
     def get_prompts(self):
         """Получить список доступных промптов."""
         url = f"{self.base_url}/api/v1/prompts"
         try:
-            response = self.session.get(url)
+            response = self._get(self.result_limiter, url)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             print(f"Ошибка получения промптов: {e}")
             return None
 
+    def fetch_prompts(self, etag=None, last_modified=None):
+        """
+        Условный запрос списка промптов (If-None-Match / If-Modified-Since).
+        Возвращает словарь {"not_modified", "prompts", "etag", "last_modified"} или None при ошибке.
+        """
+        url = f"{self.base_url}/api/v1/prompts"
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            response = self._get(self.result_limiter, url, headers=headers)
+            if response.status_code == 304:
+                return {"not_modified": True, "prompts": None, "etag": etag, "last_modified": last_modified}
+            response.raise_for_status()
+            return {
+                "not_modified": False,
+                "prompts": response.json(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        except requests.RequestException as e:
+            print(f"Ошибка получения промптов: {e}")
+            return None
+
     def create_task(self, text, prompt_id, model="llama", user_prompt=None):
         """Создать задачу саммаризации."""
+        try:
+            return self.send_task(text, prompt_id, model=model, user_prompt=user_prompt)
+        except requests.RequestException as e:
+            print(f"Ошибка создания задачи: {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Ответ сервера: {e.response.text}")
+            return None
+
+    def send_task(self, text, prompt_id, model="llama", user_prompt=None):
+        """
+        Создание задачи, как create_task, но ошибки запроса не перехватываются
+        (requests.RequestException): по ним пул серверов решает, отправлять ли
+        задачу на другой сервер.
+        """
         url = f"{self.base_url}/api/v1/tasks"
         data = {
             "text": text,
@@ -31,21 +112,26 @@ class SummarizerClient:
         if user_prompt:
             data["user_prompt"] = user_prompt
         
-        try:
-            response = self.session.post(url, json=data)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Ошибка создания задачи: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Ответ сервера: {e.response.text}")
-            return None
+        # 429/503 - задача не создана, повтор безопасен; обрыв связи - нет
+        response = request_with_retries(self.create_limiter,
+                                        lambda: self.session.post(url, json=data, timeout=REQUEST_TIMEOUT),
+                                        idempotent=False, network_errors=NETWORK_ERRORS)
+        response.raise_for_status()
+        result = response.json()
+        task_id = result.get("task_id") or result.get("id") if isinstance(result, dict) else result
+        if isinstance(task_id, (str, int)):
+            self._task_sizes[str(task_id)] = len(text)
+        return result
 
     def get_status(self, task_id):
         """Получить статус задачи."""
         url = f"{self.base_url}/api/v1/tasks/{task_id}/status"
         try:
-            response = self.session.get(url)
+            # Без повторов: цикл опроса сам повторит запрос позже, Retry-After учитывается ограничителем
+            response = self._get(self.status_limiter, url, retries=0, timeout=STATUS_TIMEOUT)
+            if response.status_code == 404:
+                # Задачи на сервере нет (истек срок хранения): ждать ее бессмысленно
+                return {"status": "expired"}
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
@@ -56,35 +142,50 @@ class SummarizerClient:
         """Получить результат саммаризации."""
         url = f"{self.base_url}/api/v1/tasks/{task_id}/result"
         try:
-            response = self.session.get(url)
+            response = self._get(self.result_limiter, url)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             print(f"Ошибка получения результата: {e}")
             return None
 
-    def wait_for_completion(self, task_id, poll_interval=5, timeout=300):
-        """Ожидание завершения задачи с polling."""
-        start_time = time.time()
-        while True:
-            if time.time() - start_time > timeout:
-                print("Превышено время ожидания")
-                return None
-            
-            status = self.get_status(task_id)
-            if not status:
-                return None
-            
-            # Статус может быть строкой или словарем
-            status_str = status if isinstance(status, str) else status.get("status", status)
-            print(f"Статус: {status_str}")
-            
-            status_lower = str(status_str).lower() if status_str else ""
-            
-            if status_lower in ["ready", "completed", "done", "finished", "success"]:
-                return status
-            elif status_lower in ["error", "failed", "failure"]:
-                print("Задача завершилась с ошибкой")
-                return None
-            
-            time.sleep(poll_interval)
+    def wait_for_completion(self, task_id, poll_interval=None, timeout=300, log=print, raise_failed=False):
+        """
+        Ожидание завершения задачи.
+        Интервал опроса подбирается адаптивно по истории времени обработки;
+        poll_interval - не опрашивать чаще, чем раз в столько секунд.
+        raise_failed=True - ошибка задачи на сервере (failed, expired) пробрасывается
+        как TaskFailed, чтобы вызывающий мог отметить задачу в журнале.
+        """
+        def on_status(status, polls):
+            log(f"Статус: {status}")
+
+        size = self._task_sizes.pop(str(task_id), None)
+        try:
+            status, polls = self.poller.wait(task_id, size=size, on_status=on_status, timeout=timeout,
+                                             min_interval=poll_interval)
+        except TimeoutError:
+            log("Превышено время ожидания")
+            return None
+        except TaskFailed:
+            log("Задача завершилась с ошибкой")
+            if raise_failed:
+                raise
+            return None
+        except StatusUnavailable:
+            return None
+        log(f"Запросов статуса: {polls}")
+        return status
+
+    def summarize(self, text, prompt_id, model="llama", user_prompt=None, timeout=300):
+        """Полный цикл одной задачи: создание, ожидание, результат. Возвращает текст или None."""
+        task = self.create_task(text, prompt_id, model=model, user_prompt=user_prompt)
+        if not task:
+            return None
+        task_id = task.get("task_id") or task.get("id") if isinstance(task, dict) else task
+        if not self.wait_for_completion(task_id, timeout=timeout):
+            return None
+        result = self.get_result(task_id)
+        if not result:
+            return None
+        return extract_summary_text(result)
@@ -4,16 +4,884 @@ import sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
-import time
 import argparse
-import shutil
-import re
+import time
 from pathlib import Path
-from client import ASRClient
 import config
-from normalization import normalize_telemost_filename
+from batch import (JobError, TaskFailedError, TranscribeJob, collect_input_files, format_duration, print_report,
+                   write_report_json)
 
-def main():
+# Тяжелые модули (requests, sqlite3, shutil и т.п.) импортируются внутри функций,
+# которым они нужны: --help, --set-token и "cache" не должны платить за сеть.
+# Импорты быстрых команд проверяет benchmarks/check_import_time.py (входит в benchmarks/run_checks.py)
+
+# Параметры распознавания (входят в ключ кэша результатов)
+ASR_PARAMS = {"diarize": True, "remove_timestamps": True}
+
+# Максимум одновременно ожидающих распознавания файлов
+MAX_POLL_WORKERS = 256
+# То же в режиме --watch: файлы приходят по одному, число потоков не зависит от пакета
+WATCH_POLL_WORKERS = 32
+
+# Одновременные загрузки без --jobs: начинаем с DEFAULT_JOBS и подбираем по
+# ответам сервера (429/503 уменьшают число, успешные ответы увеличивают) до AUTO_MAX_JOBS
+DEFAULT_JOBS = 4
+AUTO_MAX_JOBS = 16
+
+# Части длинной записи распознаются с метками времени: по ним результаты склеиваются
+CHUNK_ASR_PARAMS = {"diarize": True, "remove_timestamps": False}
+# Сколько раз отправлять одну часть, прежде чем считать файл неудачным
+CHUNK_ATTEMPTS = 3
+
+
+def prepare_input(job):
+    """Нормализует имя исходного файла (переименование на месте)."""
+    from normalization import normalize_telemost_filename
+
+    input_path = job.source
+    original_filename = input_path.name
+    parent_dir = input_path.parent
+
+    # Нормализуем имя файла (если это файл из Телемоста)
+    normalized_filename = normalize_telemost_filename(original_filename)
+
+    # Если имя изменилось, переименовываем файл НА МЕСТЕ
+    if normalized_filename != original_filename:
+        new_path = parent_dir / normalized_filename
+        if new_path.exists() and not new_path.samefile(input_path):
+            # Другой файл с таким именем не перезаписываем
+            job.log(f"Имя '{normalized_filename}' уже занято, файл обрабатывается без переименования")
+        else:
+            job.log(f"Переименование: '{original_filename}' -> '{normalized_filename}'")
+            input_path.rename(new_path)
+            input_path = new_path
+
+    job.input_path = input_path
+
+
+def make_upload_progress(job, step_percent=25):
+    """Колбэк прогресса загрузки: пишет в лог каждые step_percent процентов."""
+    state = {"next": step_percent}
+
+    def callback(sent, total, bytes_per_second):
+        job.upload_bytes = sent
+        job.upload_speed = bytes_per_second
+        percent = sent * 100 // total if total else 100
+        if percent >= state["next"]:
+            job.log(f"Загружено: {percent}% ({sent / 1024 / 1024:.1f} МБ, {bytes_per_second / 1024 / 1024:.2f} МБ/с)")
+            state["next"] = (percent // step_percent + 1) * step_percent
+
+    return callback
+
+
+def asr_cache_params(args, chunked=False):
+    """Параметры ключа кэша: при предобработке и делении на части сервер получает другие файлы."""
+    params = dict(ASR_PARAMS)
+    if args.preprocess:
+        from preprocess import PREPROCESS_VERSION
+        params["preprocess"] = PREPROCESS_VERSION
+    if chunked:
+        params["chunk_minutes"] = args.chunk_minutes
+    return params
+
+
+def preprocess_for_upload(job, work_dir):
+    """
+    Моно 16 кГц и обрезка тишины перед загрузкой (только WAV).
+    Возвращает путь к файлу для загрузки: обработанный или исходный.
+    """
+    from preprocess import preprocess_wav
+
+    if job.input_path.suffix.lower() != ".wav":
+        job.log("Предобработка пропущена: поддерживается только WAV.")
+        return job.input_path
+    job.log("Предобработка аудио...")
+    result = preprocess_wav(job.input_path, work_dir)
+    if result is None:
+        job.log("Предобработка не уменьшает файл, загружается исходный.")
+        return job.input_path
+    job.log(f"Предобработка: {result.describe()}")
+    job.offset_map = result.offset_map
+    job.bytes_saved = result.bytes_saved
+    return result.path
+
+
+def submit_chunk(job, ctx, chunk):
+    """Отправляет одну часть записи (при --preprocess - после предобработки)."""
+    from preprocess import preprocess_wav
+
+    chunk.attempts += 1
+    chunk.task_id = None
+    upload_path = chunk.path
+    if ctx.options(job).preprocess and chunk.offset_map is None:
+        result = preprocess_wav(chunk.path, Path(job.chunk_dir) / "pre")
+        if result is not None:
+            chunk.offset_map = result.offset_map
+            chunk.path = upload_path = result.path
+            job.bytes_saved += result.bytes_saved
+    result = ctx.client.start_transcribing(str(upload_path), **CHUNK_ASR_PARAMS)
+    if not result:
+        chunk.error = "не удалось запустить задачу"
+        return
+    chunk.task_id = result.get("task_id") or result.get("id") if isinstance(result, dict) else result
+    chunk.error = None
+
+
+def submit_chunks(job, ctx, chunks):
+    """Параллельная отправка частей (одновременных загрузок не больше, чем разрешает ограничитель клиента)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    for chunk in chunks:
+        if chunk.attempts >= CHUNK_ATTEMPTS:
+            raise JobError(f"Не удалось распознать {chunk.name}: {chunk.error} (попыток: {chunk.attempts}).")
+    with ThreadPoolExecutor(max_workers=max(1, ctx.args.jobs or AUTO_MAX_JOBS)) as executor:
+        list(executor.map(lambda chunk: submit_chunk(job, ctx, chunk), chunks))
+
+
+def upload_chunks(job, ctx):
+    """Делит длинную запись на части по тихим местам и отправляет их параллельно."""
+    import tempfile
+    from chunking import plan_chunks, write_chunks
+
+    args = ctx.options(job)
+    job.chunk_dir = tempfile.mkdtemp(prefix="asr_chunks_")
+    (Path(job.chunk_dir) / "pre").mkdir()
+    try:
+        job.chunks = plan_chunks(job.input_path, args.chunk_minutes * 60)
+        job.log(f"Длинная запись: {len(job.chunks)} частей по ~{args.chunk_minutes} мин")
+        write_chunks(job.input_path, job.chunks, job.chunk_dir)
+        submit_chunks(job, ctx, job.chunks)
+    except BaseException:
+        cleanup_chunks(job)
+        raise
+    # Части, которые не удалось отправить, повторяются на этапе ожидания
+    sent = sum(1 for chunk in job.chunks if chunk.task_id)
+    job.log(f"Отправлено частей: {sent} из {len(job.chunks)}")
+
+
+def wait_for_chunks(job, ctx):
+    """Ожидание всех частей; неудачные части отправляются заново по отдельности."""
+    from polling import StatusUnavailable, TaskFailed
+
+    pending = list(job.chunks)
+    while pending:
+        unsent = [chunk for chunk in pending if chunk.task_id is None]
+        if unsent:
+            submit_chunks(job, ctx, unsent)
+            continue
+
+        futures = [(chunk, ctx.client.poller.submit(chunk.task_id, size=chunk.end - chunk.start))
+                   for chunk in pending]
+        pending = []
+        for chunk, future in futures:
+            try:
+                future.result()
+            except (TaskFailed, StatusUnavailable, TimeoutError) as e:
+                chunk.error = str(e)
+                chunk.task_id = None
+                pending.append(chunk)
+                job.log(f"{chunk.name}: {e}, повторная отправка")
+            job.polls += future.polls
+    job.log(f"Все части распознаны, запросов статуса: {job.polls}")
+
+
+def download_chunks(job, ctx, output_file):
+    """Скачивает результаты частей и склеивает их в один _text.json."""
+    from chunking import merge_chunk_files
+    from preprocess import remap_transcript_file
+
+    for chunk in job.chunks:
+        chunk.result_path = Path(job.chunk_dir) / f"part{chunk.index + 1:03d}.json"
+        # Сетевые ошибки get_file повторяет сам (request_with_retries)
+        if not ctx.client.get_file(chunk.task_id, str(chunk.result_path)):
+            raise JobError(f"Ошибка при скачивании результата ({chunk.name}).")
+        if chunk.offset_map:
+            remap_transcript_file(chunk.result_path, chunk.offset_map)
+    try:
+        merge_chunk_files(job.chunks, output_file)
+    except (ValueError, OSError) as e:
+        raise JobError(f"Не удалось склеить результаты частей: {e}")
+    job.log(f"Результаты {len(job.chunks)} частей склеены")
+
+
+def cleanup_chunks(job):
+    import shutil
+
+    if job.chunk_dir:
+        shutil.rmtree(job.chunk_dir, ignore_errors=True)
+        job.chunk_dir = None
+
+
+def wait_for_task(job, client):
+    """Ожидание завершения задачи ASR через общий планировщик опроса клиента."""
+    from polling import StatusUnavailable, TaskFailed
+
+    job.log("Ожидание завершения обработки...")
+
+    def on_status(status, polls):
+        job.polls = polls
+        job.log(f"Текущий статус: {status}")
+
+    try:
+        _, polls = client.poller.wait(job.task_id, size=job.audio_seconds, on_status=on_status)
+    except TaskFailed:
+        raise TaskFailedError("Задача завершилась с ошибкой.")
+    except StatusUnavailable:
+        raise JobError("Не удалось получить статус задачи (продолжить позже: transcribe --resume).")
+    job.polls = polls
+    job.log(f"Задача готова, запросов статуса: {polls}")
+
+
+def configure_upload_limit(client, jobs):
+    """--jobs фиксирует число одновременных загрузок, без него оно подбирается автоматически."""
+    # У пула серверов (см. backends) лимит свой у каждого сервера
+    for member in getattr(client, "clients", [client]):
+        if jobs:
+            member.upload_limiter.configure(initial=jobs, max_limit=jobs)
+        else:
+            member.upload_limiter.configure(initial=DEFAULT_JOBS, max_limit=AUTO_MAX_JOBS)
+
+
+def open_asr_client(args, token):
+    """
+    Клиент ASR на весь запуск (пул серверов, если их несколько в файле серверов).
+    Возвращает tuple (клиент, сколько файлов может загружаться одновременно).
+    """
+    from backends import backend_count, make_asr_client
+
+    per_backend = max(1, args.jobs or AUTO_MAX_JOBS)
+    client = make_asr_client(args.asr_url, token, pool_size=max(per_backend, args.download_jobs),
+                             path=args.backends)
+    configure_upload_limit(client, args.jobs)
+    count = backend_count(client)
+    if count > 1:
+        print(f"Серверы ASR: доступно {client.check_health()} из {count}")
+    return client, per_backend * count
+
+
+def journal_params(args, plan=None):
+    """Параметры запуска, которые нужны для продолжения задачи через --resume."""
+    return {
+        "plan": plan,
+        "output_dir": str(Path(args.output_dir).resolve()) if args.output_dir else None,
+        "keep_original": args.keep_original,
+        "pretty_json": args.pretty_json,
+        "summarize": args.summarize,
+        "prompt_id": args.prompt_id,
+        "model": args.model,
+        "preprocess": args.preprocess,
+    }
+
+
+def resolve_summary_choice(args, pm, interactive):
+    """
+    Выбор промпта и модели саммаризации (до начала обработки файлов).
+    Возвращает запись плана или None, если пользователь отменил выбор.
+    """
+    # Определяем prompt_id
+    prompt_id = args.prompt_id
+    user_prompt = None
+
+    # Проверяем, не является ли prompt_id названием файла в папке prompts
+    # Это нужно для batch_process.ps1, который передает имя файла
+    potential_file, content = pm.find_local_prompt(prompt_id)
+    if content:
+        print(f"Используется кастомный промпт из файла: {potential_file.name}")
+        prompt_id = "custom"
+        user_prompt = content
+
+    # Если prompt_id не был явно указан и не установлен --default, спрашиваем
+    if prompt_id == "meeting_detailed" and "--prompt-id" not in sys.argv and interactive and not user_prompt:
+        selected_id, selected_content = pm.select_prompt_interactive()
+
+        if selected_id:
+            prompt_id = selected_id
+            if selected_content:
+                user_prompt = selected_content
+        else:
+            # Если отменили или ошибка, используем дефолт
+            print("Используется промпт по умолчанию: meeting_detailed")
+            prompt_id = "meeting_detailed"
+
+    if not prompt_id:
+        return None
+
+    # Определяем модель
+    model = args.model
+
+    # Если модель не была явно указана и не установлен --default, спрашиваем
+    if model == "llama" and "--model" not in sys.argv and interactive:
+        try:
+            model_choice = input("\nВыберите модель (1 - llama [по умолчанию], 2 - gpt4, Enter для llama): ").strip()
+
+            if not model_choice or model_choice == "1":
+                model = "llama"
+            elif model_choice == "2":
+                model = "gpt4"
+            else:
+                if model_choice.lower() in ["llama", "gpt4"]:
+                    model = model_choice.lower()
+                else:
+                    print("Неверный выбор, используется llama по умолчанию")
+                    model = "llama"
+        except (KeyboardInterrupt, EOFError):
+            print("\nОтменено пользователем, пропускаем саммаризацию.")
+            return None
+
+    from plan import RunPlan
+    return RunPlan.make_entry(prompt_id, model, user_prompt)
+
+
+def probe_jobs(jobs):
+    """
+    Проба заголовков всех файлов до первой загрузки. Пустые и поврежденные
+    файлы отклоняются сразу, остальные упорядочиваются от самых длинных к
+    самым коротким: длинная запись, начатая последней, растягивала бы весь
+    пакет. Возвращает задания для конвейера.
+    """
+    from probe import ProbeError, probe_file
+
+    runnable = []
+    for job in jobs:
+        try:
+            job.audio = probe_file(job.source)
+        except ProbeError as e:
+            job.status = "failed"
+            job.error = f"Файл отклонен: {e}"
+            print(f"Ошибка: Файл '{job.source}' отклонен: {e}")
+            continue
+        runnable.append(job)
+    runnable.sort(key=lambda job: job.expected_duration, reverse=True)
+    return runnable
+
+
+def plan_run(jobs, args, ctx):
+    """
+    Этап планирования: промпт и модель для каждого файла выбираются до
+    первой загрузки, чтобы запуск не останавливался на вопросах посреди работы.
+    """
+    from plan import RunPlan
+
+    if args.plan:
+        try:
+            plan = RunPlan.load(args.plan)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка: Не удалось прочитать план '{args.plan}': {e}")
+            sys.exit(1)
+        print(f"Используется план: {args.plan}")
+    else:
+        plan = RunPlan()
+        # Выбор делается один раз и применяется ко всем новым файлам
+        pending = [job for job in jobs if ctx.options(job).summarize and job.plan is None]
+        if pending:
+            print("\n--- Планирование саммаризации ---")
+            plan.default = resolve_summary_choice(args, ctx.prompt_manager, interactive=not args.default)
+            if plan.default:
+                print(f"Промпт: {plan.default['prompt_id']}, модель: {plan.default['model']} (файлов: {len(pending)})")
+
+    for job in jobs:
+        if job.plan is None:
+            job.plan = plan.get(job.source)
+        if job.plan is not None:
+            plan.set(job.source, job.plan)
+
+    if args.save_plan:
+        plan.save(args.save_plan)
+        print(f"План сохранен: {args.save_plan} (повторить без вопросов: --plan {args.save_plan})")
+
+
+class RunContext:
+    """Общие объекты запуска: клиенты, кэш, журнал и параметры по умолчанию."""
+
+    def __init__(self, args, token, client, cache=None, journal=None):
+        self.args = args
+        self.token = token
+        self.client = client
+        self.cache = cache
+        self.journal = journal
+        self._sum_client = None
+        self._prompt_manager = None
+        self._summary_cache = None
+
+    def options(self, job):
+        """Параметры для файла (при --resume - сохраненные в журнале)."""
+        return job.options or self.args
+
+    @property
+    def prompt_manager(self):
+        if self._prompt_manager is None:
+            from prompts_manager import PromptManager
+            self._prompt_manager = PromptManager(self.sum_client)
+        return self._prompt_manager
+
+    @property
+    def summary_cache(self):
+        """Кэш готовых саммаризаций (None при --no-cache)."""
+        if self._summary_cache is None and not self.args.no_cache:
+            from cache import open_summary_cache
+            self._summary_cache = open_summary_cache()
+        return self._summary_cache
+
+    @property
+    def sum_client(self):
+        # Клиент саммаризации создается лениво: без --summarize он не нужен
+        if self._sum_client is None:
+            from backends import make_summarizer_client
+            self._sum_client = make_summarizer_client(self.args.summarizer_url, self.token,
+                                                      pool_size=self.args.summarize_jobs, path=self.args.backends)
+        return self._sum_client
+
+
+def stage_upload(job, ctx):
+    """Этап 1: нормализация имени, проверка кэша и загрузка файла на сервер."""
+    import shutil
+    import tempfile
+
+    resumed = job.task_id is not None
+    if not resumed:
+        prepare_input(job)
+    input_path = job.input_path
+
+    # Очищаем имя файла от пробелов в начале и конце для будущего использования
+    job.base_name = input_path.stem.strip()  # Имя файла без расширения
+
+    # Файл для транскрибации - это текущий файл (возможно переименованный)
+    file_to_transcribe = str(input_path)
+
+    job.log(f"--- Начало работы ---")
+    job.log(f"Файл: {file_to_transcribe}")
+    if job.audio is not None:
+        job.log(f"Аудио: {job.audio.describe()}")
+
+    if resumed:
+        job.log(f"Продолжение задачи {job.task_id} (без повторной загрузки)")
+        return
+
+    # Длинная WAV-запись распознается по частям (--chunk-minutes)
+    args = ctx.options(job)
+    chunked = False
+    if args.chunk_minutes:
+        from chunking import should_chunk
+        chunked = should_chunk(input_path, args.chunk_minutes * 60)
+
+    # Кэш результатов: ключ - хэш содержимого аудио + параметры распознавания
+    if ctx.cache is not None:
+        job.cache_key = ctx.cache.key_for_file(input_path, **asr_cache_params(args, chunked))
+        job.cached_result = ctx.cache.get(job.cache_key)
+        if job.cached_result:
+            job.log("Найден готовый результат в кэше, загрузка не требуется.")
+            return
+
+    if chunked:
+        upload_chunks(job, ctx)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="asr_upload_") if args.preprocess else None
+    try:
+        if work_dir:
+            file_to_transcribe = str(preprocess_for_upload(job, work_dir))
+
+        # 1. Запуск транскрибации
+        job.log("Запуск транскрибации...")
+        result = ctx.client.start_transcribing(file_to_transcribe, progress_callback=make_upload_progress(job),
+                                               **ASR_PARAMS)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not result:
+        job.bytes_saved = 0
+        raise JobError("Не удалось запустить задачу.")
+
+    if job.bytes_saved and job.upload_speed:
+        job.upload_seconds_saved = job.bytes_saved / job.upload_speed
+        job.log(f"Предобработка сэкономила {job.bytes_saved / 1024 / 1024:.1f} МБ "
+                f"и ~{job.upload_seconds_saved:.1f} с загрузки")
+
+    # Обработка ответа (ожидаем task_id)
+    task_id = result
+    if isinstance(result, dict):
+        task_id = result.get("task_id") or result.get("id")
+    job.task_id = task_id
+
+    job.log(f"ID задачи: {task_id}")
+
+    # Запоминаем задачу сразу, чтобы ее можно было подхватить после сбоя
+    if ctx.journal is not None:
+        params = journal_params(args, job.plan)
+        params["offset_map"] = job.offset_map
+        job.journal_id = ctx.journal.add("asr", task_id, input_path, params)
+
+
+def stage_poll(job, ctx):
+    """Этап 2: ожидание завершения распознавания."""
+    from journal import STATE_FAILED
+
+    if job.chunks:
+        try:
+            wait_for_chunks(job, ctx)
+        except BaseException:
+            cleanup_chunks(job)
+            raise
+        return
+    if job.task_id is None:
+        return
+    try:
+        wait_for_task(job, ctx.client)
+    except TaskFailedError as e:
+        if ctx.journal is not None and job.journal_id:
+            ctx.journal.update(job.journal_id, STATE_FAILED, str(e))
+        raise
+
+
+def stage_download(job, ctx):
+    """Этап 3: перенос аудио в папку результатов и скачивание транскрипции."""
+    import shutil
+    from client import pretty_print_json_file
+    from journal import STATE_DONE
+    from placement import place_file
+
+    args = ctx.options(job)
+    input_path = job.input_path
+    base_name = job.base_name
+    file_ext = input_path.suffix  # Расширение файла
+
+    # --- УСПЕХ: Создание папки и перемещение файлов ---
+
+    # Определяем папку для результатов
+    if args.output_dir:
+        output_folder = Path(args.output_dir).resolve()
+    else:
+        # Используем очищенное имя для папки
+        output_folder = input_path.parent / base_name
+
+    # Создаем папку для результатов
+    output_folder.mkdir(parents=True, exist_ok=True)
+    job.output_folder = output_folder
+    job.log(f"Папка для результатов: {output_folder}")
+
+    # Определяем путь к файлу в новой папке (используем очищенное имя)
+    target_audio_path = output_folder / f"{base_name}{file_ext}"
+
+    # Перемещаем или копируем файл (жесткая ссылка, клон или копирование в ядре, см. placement.py)
+    if not input_path.exists() and target_audio_path.exists():
+        # Файл уже перенесен в предыдущем (прерванном) запуске
+        job.log("Файл уже находится в целевой папке.")
+    elif input_path == target_audio_path:
+        # Например, output_dir = parent_dir
+        job.log("Файл уже находится в целевой папке.")
+    else:
+        action = "Копирование" if args.keep_original else "Перемещение"
+        started = time.monotonic()
+        job.placement = place_file(input_path, target_audio_path, keep_original=args.keep_original)
+        if job.placement == "in-place":
+            job.log("Файл уже находится в целевой папке.")
+        else:
+            job.log(f"{action} файла в папку результатов: {job.placement}, {time.monotonic() - started:.1f} с")
+
+    # Формирование имени выходного файла
+    output_file = output_folder / f"{base_name}_text.json"
+    job.output_file = output_file
+    job.log(f"Выходной файл: {output_file}")
+
+    # 3. Скачивание результата (или копирование из кэша)
+    if job.cached_result:
+        shutil.copyfile(job.cached_result, output_file)
+        job.log(f"Результат взят из кэша: {output_file}")
+    elif job.chunks:
+        job.log("Скачивание результатов частей...")
+        try:
+            download_chunks(job, ctx, output_file)
+        finally:
+            cleanup_chunks(job)
+        if ctx.cache is not None and job.cache_key:
+            ctx.cache.put(job.cache_key, output_file)
+    else:
+        job.log("Скачивание результата...")
+        if not ctx.client.get_file(job.task_id, str(output_file)):
+            raise JobError("Ошибка при скачивании файла.")
+        if job.offset_map:
+            # Сервер распознавал обрезанный файл - возвращаем метки на шкалу исходной записи
+            from preprocess import remap_transcript_file
+            remap_transcript_file(output_file, job.offset_map)
+        if ctx.journal is not None and job.journal_id:
+            ctx.journal.update(job.journal_id, STATE_DONE)
+        if ctx.cache is not None:
+            if job.cache_key is None:
+                job.cache_key = ctx.cache.key_for_file(target_audio_path, **asr_cache_params(args))
+            ctx.cache.put(job.cache_key, output_file)
+
+    if args.pretty_json:
+        pretty_print_json_file(output_file)
+
+    job.log(f"\n✓ Транскрибация завершена!")
+    job.log(f"  - Аудио: {target_audio_path.name}")
+    job.log(f"  - Текст: {output_file.name}")
+
+
+def stage_summarize(job, ctx):
+    """Этап 4: саммаризация (если включена). Ошибки не прерывают обработку файла."""
+    if ctx.options(job).summarize:
+        if job.plan is None:
+            job.log("Саммаризация пропущена: промпт не выбран.")
+            return
+        summarize_transcript(job, ctx)
+
+
+def stage_write(job, ctx):
+    """Этап 5: сохранение саммаризации и итоговое сообщение."""
+    from journal import STATE_DONE
+
+    if job.summary_text is not None:
+        with open(job.summary_file, 'w', encoding='utf-8') as f:
+            f.write(job.summary_text)
+        if ctx.journal is not None and job.summary_journal_id:
+            ctx.journal.update(job.summary_journal_id, STATE_DONE)
+        job.log(f"  - Саммаризация: {job.summary_file.name}")
+
+    job.log(f"\n✓ Готово! Результаты сохранены в папке: {job.output_folder}")
+
+
+def summarize_transcript(job, ctx):
+    """
+    Саммаризация готовой транскрипции: результат кладется в job.summary_text,
+    файл записывает этап stage_write.
+    """
+    args = ctx.options(job)
+    job.log(f"\n--- Саммаризация ---")
+    try:
+        from journal import STATE_FAILED
+        from polling import TaskFailed
+        from summarizer import extract_summary_text
+        from mapreduce import MapReduceSummarizer
+        from transcript import read_transcript_text
+
+        # Читаем транскрипцию потоково: реплика на строку, с префиксом диктора
+        text = read_transcript_text(job.output_file)
+
+        if not text.strip():
+            job.log("Предупреждение: Текст для саммаризации пуст, пропускаем.")
+            return
+
+        # Клиент саммаризации общий для всего запуска
+        sum_client = ctx.sum_client
+
+        # Промпт и модель выбраны заранее, на этапе планирования
+        prompt_id = job.plan["prompt_id"]
+        user_prompt = job.plan.get("user_prompt")
+        model = job.plan["model"]
+
+        job.log(f"\nПромпт: {prompt_id}")
+        job.log(f"Модель: {model}")
+
+        summary_file = job.output_folder / f"{job.base_name}_sum.md"
+
+        # Тот же текст с тем же промптом и моделью уже саммаризирован - сервер не нужен
+        summary_cache = ctx.summary_cache
+        sum_cache_key = None
+        if summary_cache is not None:
+            from cache import summary_key
+
+            resolved, prompt_info = (True, None) if user_prompt else \
+                ctx.prompt_manager.resolve_api_prompt(prompt_id)
+            if resolved:
+                sum_cache_key = summary_key(text, prompt_id, model, user_prompt=user_prompt,
+                                            prompt_info=prompt_info, chunk_chars=args.chunk_chars)
+            else:
+                # Без каталога ключ не учитывал бы содержимое промпта API
+                job.log("Каталог промптов недоступен, кэш саммаризаций не используется.")
+        if sum_cache_key is not None:
+            cached_text = summary_cache.get_text(sum_cache_key)
+            if cached_text is not None:
+                job.log("Саммаризация найдена в кэше, задача на сервере не создается.")
+                job.summary_file = summary_file
+                job.summary_text = cached_text
+                job.summary_cached = True
+                return
+
+        # Длинный текст не помещается в контекст модели - саммаризация по частям
+        if len(text) > args.chunk_chars:
+            job.log(f"Текст длинный ({len(text)} символов), саммаризация по частям...")
+            summarizer = MapReduceSummarizer(sum_client, chunk_chars=args.chunk_chars,
+                                             concurrency=args.chunk_concurrency, log=job.log)
+            summary_text = summarizer.summarize(text, prompt_id, model=model, user_prompt=user_prompt)
+            if summary_text is None:
+                job.log("Ошибка: Не удалось выполнить саммаризацию.")
+                return
+            job.summary_file = summary_file
+            job.summary_text = summary_text
+            if sum_cache_key is not None and summary_text.strip():
+                summary_cache.put_text(sum_cache_key, summary_text)
+            return
+
+        # Создание задачи саммаризации
+        job.log("Создание задачи саммаризации...")
+        sum_task_id = sum_client.create_task(text, prompt_id, model=model, user_prompt=user_prompt)
+
+        if not sum_task_id:
+            job.log("Ошибка: Не удалось создать задачу саммаризации.")
+            return
+
+        # Извлекаем task_id если вернулся словарь
+        if isinstance(sum_task_id, dict):
+            sum_task_id = sum_task_id.get("task_id") or sum_task_id.get("id") or sum_task_id
+
+        job.log(f"ID задачи саммаризации: {sum_task_id}")
+
+        if ctx.journal is not None:
+            job.summary_journal_id = ctx.journal.add(
+                "summary", sum_task_id, job.output_file,
+                {"output_file": str(summary_file), "prompt_id": prompt_id, "model": model})
+
+        # Ожидание завершения
+        job.log("Ожидание завершения саммаризации...")
+        try:
+            sum_status = sum_client.wait_for_completion(sum_task_id, raise_failed=True)
+        except TaskFailed as e:
+            if ctx.journal is not None and job.summary_journal_id:
+                ctx.journal.update(job.summary_journal_id, STATE_FAILED, str(e))
+            sum_status = None
+
+        if not sum_status:
+            job.log("Ошибка: Задача саммаризации не завершена.")
+            return
+
+        # Получение результата
+        job.log("Получение результата саммаризации...")
+        sum_result = sum_client.get_result(sum_task_id)
+
+        if not sum_result:
+            job.log("Ошибка: Не удалось получить результат саммаризации.")
+            return
+
+        # Извлечение текста саммаризации
+        job.summary_file = summary_file
+        job.summary_text = extract_summary_text(sum_result)
+        if sum_cache_key is not None and isinstance(job.summary_text, str) and job.summary_text.strip():
+            summary_cache.put_text(sum_cache_key, job.summary_text)
+
+    except ImportError:
+        job.log("Ошибка: Модуль summarizer.py не найден. Пропускаем саммаризацию.")
+    except Exception as e:
+        job.log(f"Ошибка при саммаризации: {e}")
+
+def watch_jobs(watcher, index, plan, args, rejected):
+    """
+    Генератор заданий режима --watch: готовые файлы из папки проходят пробу
+    и получают выбор промпта (отклоненные пробой попадают в rejected).
+    Ctrl+C останавливает прием новых файлов.
+    """
+    from probe import ProbeError, probe_file
+
+    try:
+        for path, identity, first_seen in watcher.files():
+            job = TranscribeJob(path)
+            job.show_prefix = True
+            job.watch_key = identity
+            job.detected = first_seen
+            job.log(f"Новый файл (запись завершена через {time.time() - first_seen:.0f} с после появления)")
+            if not args.no_probe:
+                try:
+                    job.audio = probe_file(path)
+                except ProbeError as e:
+                    job.status = "failed"
+                    job.error = f"Файл отклонен: {e}"
+                    job.log(f"Ошибка: {job.error}")
+                    index.record(identity, path, job.status, job.error)
+                    rejected.append(job)
+                    continue
+            job.plan = plan.get(path)
+            yield job
+    except KeyboardInterrupt:
+        print("\nОстановка наблюдения: дожидаемся файлов в работе (повторный Ctrl+C - прервать)...")
+    except OSError as e:
+        print(f"Ошибка: Папка '{watcher.directory}' недоступна: {e}")
+
+
+def run_watch(args, token, journal):
+    """
+    Режим --watch: новые записи в папке обрабатываются тем же конвейером
+    (нормализация имени -> загрузка -> папка результатов) по мере появления.
+    Возвращает код выхода.
+    """
+    from backends import report_backends
+    from cache import ResultCache
+    from ratelimit import report_limits
+    from pipeline import Pipeline, Stage
+    from plan import RunPlan
+    from watcher import FolderWatcher, WatchIndex
+
+    watch_dir = Path(args.watch).resolve()
+    if not watch_dir.is_dir():
+        print(f"Ошибка: Папка '{args.watch}' не найдена.")
+        return 1
+    if args.files or args.resume:
+        print("Ошибка: --watch нельзя совмещать с файлами и --resume.")
+        return 1
+    if args.recursive:
+        print("Предупреждение: в режиме --watch вложенные папки не отслеживаются (там лежат результаты).")
+
+    client, upload_workers = open_asr_client(args, token)
+    cache = None if args.no_cache else ResultCache()
+    ctx = RunContext(args, token, client, cache, journal)
+
+    # Вопросы о саммаризации - один раз до начала наблюдения
+    if args.plan:
+        try:
+            plan = RunPlan.load(args.plan)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка: Не удалось прочитать план '{args.plan}': {e}")
+            return 1
+    else:
+        plan = RunPlan()
+        if args.summarize:
+            print("\n--- Планирование саммаризации ---")
+            plan.default = resolve_summary_choice(args, ctx.prompt_manager, interactive=not args.default)
+
+    index = WatchIndex()
+    watcher = FolderWatcher(watch_dir, settle=args.watch_settle, use_inotify=not args.watch_poll,
+                            skip=lambda identity: not index.claim(identity))
+    if watcher.fallback_reason and not args.watch_poll:
+        print(f"Предупреждение: {watcher.fallback_reason}, используется опрос папки.")
+    print(f"Наблюдение за папкой: {watch_dir} ({watcher.mode}, файл считается записанным "
+          f"через {args.watch_settle:g} с без изменений). Остановка: Ctrl+C")
+
+    latencies = []
+    rejected = []
+
+    def on_finish(job):
+        index.record(job.watch_key, job.input_path or job.source, job.status, job.error)
+        latency = job.finished - job.detected
+        latencies.append(latency)
+        job.log(f"От появления файла до результата: {format_duration(latency)}")
+
+    pipeline = Pipeline([
+        Stage("upload", lambda job: stage_upload(job, ctx), concurrency=upload_workers),
+        Stage("poll", lambda job: stage_poll(job, ctx), concurrency=WATCH_POLL_WORKERS),
+        Stage("download", lambda job: stage_download(job, ctx), concurrency=args.download_jobs),
+        Stage("summarize", lambda job: stage_summarize(job, ctx), concurrency=args.summarize_jobs),
+        Stage("write", lambda job: stage_write(job, ctx), concurrency=1),
+    ], on_finish=on_finish)
+    try:
+        jobs = pipeline.run(watch_jobs(watcher, index, plan, args, rejected))
+    except KeyboardInterrupt:
+        print("\nПрервано. Незавершенные задачи можно продолжить: transcribe --resume")
+        return 130
+
+    jobs = rejected + jobs
+    if jobs:
+        print_report(jobs)
+    report_limits()
+    report_backends(client, ctx._sum_client)
+    if latencies:
+        latencies.sort()
+        print(f"Медиана от появления файла до результата: {format_duration(latencies[len(latencies) // 2])}")
+    if args.report_json:
+        write_report_json(jobs, args.report_json)
+    return 0
+
+
+def build_parser():
     description = """
 Универсальный инструмент для транскрибации аудио и последующей саммаризации.
 Автоматически обрабатывает файлы, поддерживает переименование записей Телемоста
@@ -30,13 +898,22 @@ def main():
   
   После этого токен будет сохранен в ~/.asr_token и вы сможете
   использовать команды без указания --token.
+
+Кэш результатов и саммаризаций (~/.asr_cache):
+  transcribe cache stats     - размер и количество записей
+  transcribe cache prune     - удалить давно не использованные записи
+
+Массовое переименование по шаблонам (filename_patterns.json и Телемост):
+  transcribe rename-preview ПАПКА   - показать новые имена и конфликты
+  transcribe rename-apply ПАПКА     - переименовать
 """
     parser = argparse.ArgumentParser(
         description=description,
         epilog=epilog,
         formatter_class=argparse.RawTextHelpFormatter
     )
-    parser.add_argument("file", nargs="?", help="Путь к аудиофайлу")
+    parser.add_argument("files", nargs="*", metavar="file",
+                        help="Пути к аудиофайлам, папкам или glob-шаблонам (например, \"records/*.mp3\")")
     parser.add_argument("--token", help="API Токен (необязательно, если уже сохранен через --set-token)", default=None)
     parser.add_argument("--set-token", help="Сохранить токен в ~/.asr_token для будущего использования и выйти")
     parser.add_argument("--keep-original", action="store_true", 
@@ -52,311 +929,257 @@ def main():
                         help="Использовать параметры по умолчанию для саммаризации без интерактивных вопросов")
     parser.add_argument("--list-prompts", action="store_true",
                         help="Показать список промптов (включая из папки 'prompts' в корне программы) и завершить работу")
-    
-    # Если запуск без аргументов, выводим справку
-    if len(sys.argv) == 1:
-        parser.print_help()
-        sys.exit(0)
-    
-    args = parser.parse_args()
+    parser.add_argument("--refresh-prompts", action="store_true",
+                        help="Обновить кэш списка промптов с сервера (вместе с --list-prompts)")
+    parser.add_argument("--plan", metavar="FILE",
+                        help="Взять промпт и модель для каждого файла из сохраненного плана (без вопросов)")
+    parser.add_argument("--save-plan", metavar="FILE",
+                        help="Сохранить выбранные промпт и модель в план для повторных запусков")
+    parser.add_argument("--chunk-chars", type=int, default=24000,
+                        help="Максимальный размер фрагмента для саммаризации в символах; более длинный текст "
+                             "саммаризируется по частям (по умолчанию: 24000)")
+    parser.add_argument("--chunk-concurrency", type=int, default=4,
+                        help="Сколько фрагментов саммаризировать одновременно (по умолчанию: 4)")
+    parser.add_argument("--pretty-json", action="store_true",
+                        help="Переформатировать _text.json с отступами (по умолчанию сохраняется ответ сервера как есть)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать локальный кэш результатов и саммаризаций "
+                             "(всегда загружать файл и создавать задачи заново)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить незавершенные задачи из журнала (~/.asr_jobs.db) без повторной загрузки")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help=f"Сколько файлов загружать на сервер одновременно (по умолчанию: подбирается "
+                             f"по ответам сервера 429/503, от 1 до {AUTO_MAX_JOBS}; при нескольких серверах - "
+                             f"на каждый)")
+    parser.add_argument("--download-jobs", type=int, default=4,
+                        help="Сколько результатов скачивать одновременно (по умолчанию: 4)")
+    parser.add_argument("--summarize-jobs", type=int, default=2,
+                        help="Сколько саммаризаций выполнять одновременно (по умолчанию: 2)")
+    parser.add_argument("--recursive", action="store_true",
+                        help="Искать аудиофайлы во вложенных папках")
+    parser.add_argument("--no-probe", action="store_true",
+                        help="Не читать заголовки файлов перед загрузкой (без проверки файлов "
+                             "и без упорядочивания пакета по длительности)")
+    parser.add_argument("--chunk-minutes", type=float, default=None, metavar="N",
+                        help="Делить длинные WAV-записи на части примерно по N минут (по тихим местам), "
+                             "распознавать их параллельно и склеивать результат")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Перед загрузкой конвертировать WAV в моно 16 кГц и обрезать тишину в начале и конце "
+                             "(нужен numpy)")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="Следить за папкой и обрабатывать новые записи по мере появления "
+                             "(обработанные файлы запоминаются в ~/.asr_watch_index.json)")
+    parser.add_argument("--watch-settle", type=float, default=10, metavar="SEC",
+                        help="Сколько секунд файл не должен меняться, чтобы считаться записанным (по умолчанию: 10)")
+    parser.add_argument("--watch-poll", action="store_true",
+                        help="Опрашивать папку вместо inotify (нужно для сетевых папок NFS/SMB)")
+    parser.add_argument("--report-json", metavar="FILE",
+                        help="Сохранить итоги по файлам в JSON (время этапов, опросы, ошибки)")
+    parser.add_argument("--asr-url", default=config.ASR_BASE_URL,
+                        help=f"Адрес сервиса ASR (по умолчанию: {config.ASR_BASE_URL})")
+    parser.add_argument("--summarizer-url", default=config.SUMMARIZER_BASE_URL,
+                        help=f"Адрес сервиса саммаризации (по умолчанию: {config.SUMMARIZER_BASE_URL})")
+    parser.add_argument("--backends", default=None,
+                        help=f"Файл с несколькими серверами и токенами для распределения задач "
+                             f"(по умолчанию: {config.BACKENDS_FILE}, если он есть)")
 
-    # Если указан --set-token, сохраняем и выходим
-    if args.set_token:
-        config.set_token(args.set_token)
-        sys.exit(0)
+    return parser
+
+
+def command_cache(argv):
+    """transcribe cache stats|prune"""
+    from cache import run_cache_command
+    run_cache_command(argv)
+    return 0
+
+
+def command_rename_preview(argv):
+    """transcribe rename-preview ПУТИ - показать переименования по шаблонам"""
+    from normalization import run_rename_command
+    return run_rename_command(argv, apply=False)
+
+
+def command_rename_apply(argv):
+    """transcribe rename-apply ПУТИ - переименовать файлы по шаблонам"""
+    from normalization import run_rename_command
+    return run_rename_command(argv, apply=True)
 
-    # Получение токена
-    token = config.get_token(args.token)
 
-    # Проверка токена
+def action_set_token(args, token):
+    return 0 if config.set_token(args.set_token) else 1
+
+
+def action_list_prompts(args, token):
+    import json
+    from prompts_manager import PromptManager
+
+    def make_client():
+        # Клиент (и requests) нужен, только если кэш каталога устарел
+        from backends import make_summarizer_client
+        return make_summarizer_client(args.summarizer_url, token, path=args.backends)
+
+    try:
+        pm = PromptManager(make_client)
+        prompts = pm.get_all_prompts(refresh=args.refresh_prompts)
+        if prompts:
+            print(json.dumps(prompts, indent=2, ensure_ascii=False))
+        else:
+            print("Не удалось получить список промптов.")
+        print(f"\nПапка с кастомными промптами: {pm.prompts_dir.resolve()}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+    return 0
+
+
+# Подкоманды (первое слово командной строки): обработчик получает остальные аргументы
+SUBCOMMANDS = {
+    "cache": command_cache,
+    "rename-preview": command_rename_preview,
+    "rename-apply": command_rename_apply,
+}
+
+# Флаги-действия, после которых программа завершается: (атрибут args, нужен ли токен, обработчик)
+ACTIONS = [
+    ("set_token", False, action_set_token),
+    ("list_prompts", True, action_list_prompts),
+]
+
+
+def require_token(args):
+    token = config.get_token(args.token)
     if not token:
         print("Ошибка: Не найден токен.")
         print("Используйте команду: transcribe --set-token \"ваш_токен\"")
         sys.exit(1)
+    return token
 
-    # Если запрошен список промптов
-    if args.list_prompts:
-        try:
-            from prompts_manager import PromptManager
-            from summarizer import SummarizerClient
-            import json
-            sum_client = SummarizerClient(token=token)
-            pm = PromptManager(sum_client)
-            prompts = pm.get_all_prompts()
-            if prompts:
-                print(json.dumps(prompts, indent=2, ensure_ascii=False))
-            else:
-                print("Не удалось получить список промптов.")
-            print(f"\nПапка с кастомными промптами: {pm.prompts_dir.resolve()}")
-        except ImportError:
-            print("Ошибка: Модуль summarizer.py не найден.")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-        sys.exit(0)
 
-    # Проверяем, что файл указан
-    if not args.file:
-        print("Ошибка: Не указан файл для транскрибации.")
-        print("\nИспользование:")
+def main():
+    parser = build_parser()
+
+    # Если запуск без аргументов, выводим справку
+    if len(sys.argv) == 1:
         parser.print_help()
-        sys.exit(1)
+        sys.exit(0)
 
-    input_file = args.file
-    if not os.path.exists(input_file):
-        print(f"Ошибка: Файл '{input_file}' не найден.")
-        sys.exit(1)
+    command = SUBCOMMANDS.get(sys.argv[1])
+    if command is not None:
+        sys.exit(command(sys.argv[2:]))
 
-    # Получаем абсолютный путь к исходному файлу
-    input_path = Path(input_file).resolve()
-    original_filename = input_path.name
-    parent_dir = input_path.parent
+    args = parser.parse_args()
 
-    # Нормализуем имя файла (если это файл из Телемоста)
-    normalized_filename = normalize_telemost_filename(original_filename)
-    
-    # Если имя изменилось, переименовываем файл НА МЕСТЕ
-    if normalized_filename != original_filename:
-        new_path = parent_dir / normalized_filename
-        print(f"Переименование: '{original_filename}' -> '{normalized_filename}'")
-        input_path.rename(new_path)
-        input_path = new_path
-    
-    # Очищаем имя файла от пробелов в начале и конце для будущего использования
-    base_name = input_path.stem.strip()  # Имя файла без расширения
-    file_ext = input_path.suffix  # Расширение файла
+    for attribute, needs_token, action in ACTIONS:
+        if getattr(args, attribute):
+            sys.exit(action(args, require_token(args) if needs_token else None))
 
-    # Файл для транскрибации - это текущий файл (возможно переименованный)
-    file_to_transcribe = str(input_path)
+    token = require_token(args)
 
-    print(f"--- Начало работы ---")
-    print(f"Файл: {file_to_transcribe}")
-    
-    # Инициализация клиента
-    client = ASRClient(token=token)
+    from journal import JobJournal
 
-    # 1. Запуск транскрибации
-    print("Запуск транскрибации...")
-    result = client.start_transcribing(file_to_transcribe)
+    # Журнал закрывается и в долгоживущем демоне, где main() вызывается на каждый запрос
+    with JobJournal() as journal:
+        run_jobs(parser, args, token, journal)
 
-    if not result:
-        print("Ошибка: Не удалось запустить задачу.")
-        sys.exit(1)
 
-    # Обработка ответа (ожидаем task_id)
-    task_id = result
-    if isinstance(result, dict):
-        task_id = result.get("task_id") or result.get("id")
+def run_jobs(parser, args, token, journal):
+    """Обработка файлов (или --resume, --watch) с открытым журналом задач. Завершается через sys.exit."""
+    from backends import report_backends
+    from cache import ResultCache
+    from ratelimit import report_limits
+    from pipeline import Pipeline, Stage
 
-    print(f"ID задачи: {task_id}")
-
-    # 2. Ожидание завершения (Polling)
-    print("Ожидание завершения обработки...")
-    while True:
-        status_resp = client.get_status(task_id)
-        
-        # Статус может быть строкой или словарем
-        status = status_resp
-        if isinstance(status_resp, dict):
-            status = status_resp.get("status", status_resp)
-        
-        print(f"Текущий статус: {status}")
-
-        # Приводим к нижнему регистру для сравнения
-        status_lower = str(status).lower() if status else ""
-        
-        if status_lower in ["ready", "completed", "done", "finished", "success"]:
-            break
-        elif status_lower in ["error", "failed", "failure"]:
-            print("Ошибка: Задача завершилась с ошибкой.")
-            sys.exit(1)
-        
-        time.sleep(5) # Пауза 5 секунд
+    if args.preprocess:
+        from preprocess import numpy_available
+        if not numpy_available():
+            print("Предупреждение: для --preprocess нужен numpy (pip install numpy), файлы загружаются как есть.")
+            args.preprocess = False
 
-    # --- УСПЕХ: Создание папки и перемещение файлов ---
-    
-    # Определяем папку для результатов
-    if args.output_dir:
-        output_folder = Path(args.output_dir).resolve()
+    if args.watch:
+        sys.exit(run_watch(args, token, journal))
+
+    if args.resume:
+        # Продолжение задач, созданных в прерванных запусках
+        jobs = []
+        for entry in journal.pending("asr"):
+            job = TranscribeJob(entry["input_file"])
+            job.input_path = job.source
+            job.task_id = entry["task_id"]
+            job.journal_id = entry["id"]
+            params = dict(entry["params"])
+            job.plan = params.pop("plan", None)
+            job.offset_map = params.pop("offset_map", None)
+            job.options = argparse.Namespace(**{**vars(args), **params})
+            jobs.append(job)
+        pending_summaries = len(journal.pending("summary"))
+        if pending_summaries:
+            print(f"Незавершенных саммаризаций: {pending_summaries} (продолжить: summarize --resume)")
+        if not jobs:
+            print("Незавершенных задач транскрибации нет.")
+            sys.exit(0)
+        print(f"Продолжение задач из журнала: {len(jobs)}")
     else:
-        # Используем очищенное имя для папки
-        output_folder = parent_dir / base_name
+        # Проверяем, что файлы указаны
+        if not args.files:
+            print("Ошибка: Не указан файл для транскрибации.")
+            print("\nИспользование:")
+            parser.print_help()
+            sys.exit(1)
 
-    # Создаем папку для результатов
-    output_folder.mkdir(parents=True, exist_ok=True)
-    print(f"Папка для результатов: {output_folder}")
+        input_files, missing = collect_input_files(args.files, recursive=args.recursive)
+        for item in missing:
+            print(f"Ошибка: Файл '{item}' не найден.")
+        if not input_files:
+            sys.exit(1)
 
-    # Определяем путь к файлу в новой папке (используем очищенное имя)
-    target_audio_path = output_folder / f"{base_name}{file_ext}"
-    
-    # Перемещаем или копируем файл
-    if args.keep_original:
-        print(f"Копирование файла в папку результатов...")
-        shutil.copy2(input_path, target_audio_path)
-    else:
-        print(f"Перемещение файла в папку результатов...")
-        # Если файл уже там (например, output_dir = parent_dir), move может ругаться, поэтому проверяем
-        if input_path != target_audio_path:
-            shutil.move(str(input_path), str(target_audio_path))
-        else:
-            print("Файл уже находится в целевой папке.")
+        jobs = [TranscribeJob(path) for path in input_files]
 
-    # Формирование имени выходного файла
-    output_file = output_folder / f"{base_name}_text.json"
-    print(f"Выходной файл: {output_file}")
-
-    # 3. Скачивание результата
-    print("Скачивание результата...")
-    if client.get_file(task_id, str(output_file)):
-        print(f"\n✓ Транскрибация завершена!")
-        print(f"  - Аудио: {target_audio_path.name}")
-        print(f"  - Текст: {output_file.name}")
-        
-        # 4. Саммаризация (если включена)
-        if args.summarize:
-            print(f"\n--- Саммаризация ---")
-            try:
-                from summarizer import SummarizerClient
-                import json
-                
-                # Читаем транскрипцию
-                with open(output_file, 'r', encoding='utf-8') as f:
-                    transcription_data = json.load(f)
-                
-                # Извлекаем текст из транскрипции
-                if isinstance(transcription_data, list):
-                    # Если это список сегментов, объединяем текст
-                    text = " ".join([segment.get("text", "") for segment in transcription_data if isinstance(segment, dict)])
-                elif isinstance(transcription_data, dict):
-                    # Если это словарь, ищем поле text
-                    text = transcription_data.get("text", str(transcription_data))
-                else:
-                    text = str(transcription_data)
-                
-                if not text.strip():
-                    print("Предупреждение: Текст для саммаризации пуст, пропускаем.")
-                else:
-                    # Инициализация клиента саммаризации
-                    sum_client = SummarizerClient(token=token)
-                    
-                    # Определяем prompt_id
-                    prompt_id = args.prompt_id
-                    user_prompt = None
-
-                    # Проверяем, не является ли prompt_id названием файла в папке prompts
-                    # Это нужно для batch_process.ps1, который передает имя файла
-                    from prompts_manager import PromptManager
-                    pm = PromptManager(sum_client)
-                    
-                    # Ищем файл с таким именем (с расширением .txt или без)
-                    potential_file = pm.prompts_dir / f"{prompt_id}.txt"
-                    if not potential_file.exists():
-                         potential_file = pm.prompts_dir / prompt_id
-                    
-                    if potential_file.exists() and potential_file.is_file():
-                        try:
-                            with open(potential_file, 'r', encoding='utf-8') as f:
-                                content = f.read().strip()
-                            if content:
-                                print(f"Используется кастомный промпт из файла: {potential_file.name}")
-                                prompt_id = "custom"
-                                user_prompt = content
-                        except Exception as e:
-                            print(f"Ошибка чтения файла промпта {potential_file}: {e}")
-
-                    # Если prompt_id не был явно указан и не установлен --default, спрашиваем
-                    if prompt_id == "meeting_detailed" and "--prompt-id" not in sys.argv and not args.default and not user_prompt:
-                        selected_id, selected_content = pm.select_prompt_interactive()
-                        
-                        if selected_id:
-                            prompt_id = selected_id
-                            if selected_content:
-                                user_prompt = selected_content
-                        else:
-                            # Если отменили или ошибка, используем дефолт
-                            print("Используется промпт по умолчанию: meeting_detailed")
-                            prompt_id = "meeting_detailed"
-                    
-                    if prompt_id:
-                        # Определяем модель
-                        model = args.model
-                        
-                        # Если модель не была явно указана и не установлен --default, спрашиваем
-                        if model == "llama" and "--model" not in sys.argv and not args.default:
-                            try:
-                                model_choice = input("\nВыберите модель (1 - llama [по умолчанию], 2 - gpt4, Enter для llama): ").strip()
-                                
-                                if not model_choice or model_choice == "1":
-                                    model = "llama"
-                                elif model_choice == "2":
-                                    model = "gpt4"
-                                else:
-                                    if model_choice.lower() in ["llama", "gpt4"]:
-                                        model = model_choice.lower()
-                                    else:
-                                        print("Неверный выбор, используется llama по умолчанию")
-                                        model = "llama"
-                            except (KeyboardInterrupt, EOFError):
-                                print("\nОтменено пользователем, пропускаем саммаризацию.")
-                                model = None
-                        
-                        if model:
-                            print(f"\nПромпт: {prompt_id}")
-                            print(f"Модель: {model}")
-                            
-                            # Создание задачи саммаризации
-                            print("Создание задачи саммаризации...")
-                            # Передаем user_prompt если он был задан (инициализируем None если нет)
-                            if 'user_prompt' not in locals():
-                                user_prompt = None
-                                
-                            sum_task_id = sum_client.create_task(text, prompt_id, model=model, user_prompt=user_prompt)
-                            
-                            if sum_task_id:
-                                # Извлекаем task_id если вернулся словарь
-                                if isinstance(sum_task_id, dict):
-                                    sum_task_id = sum_task_id.get("task_id") or sum_task_id.get("id") or sum_task_id
-                                
-                                print(f"ID задачи саммаризации: {sum_task_id}")
-                                
-                                # Ожидание завершения
-                                print("Ожидание завершения саммаризации...")
-                                sum_status = sum_client.wait_for_completion(sum_task_id)
-                                
-                                if sum_status:
-                                    # Получение результата
-                                    print("Получение результата саммаризации...")
-                                    sum_result = sum_client.get_result(sum_task_id)
-                                    
-                                    if sum_result:
-                                        # Извлечение текста саммаризации
-                                        if isinstance(sum_result, dict) and "summary" in sum_result:
-                                            summary_text = sum_result["summary"]
-                                        elif isinstance(sum_result, str):
-                                            summary_text = sum_result
-                                        else:
-                                            summary_text = json.dumps(sum_result, indent=2, ensure_ascii=False)
-                                        
-                                        # Сохранение саммаризации
-                                        summary_file = output_folder / f"{base_name}_sum.md"
-                                        with open(summary_file, 'w', encoding='utf-8') as f:
-                                            f.write(summary_text)
-                                        
-                                        print(f"  - Саммаризация: {summary_file.name}")
-                                    else:
-                                        print("Ошибка: Не удалось получить результат саммаризации.")
-                                else:
-                                    print("Ошибка: Задача саммаризации не завершена.")
-                            else:
-                                print("Ошибка: Не удалось создать задачу саммаризации.")
-                        
-            except ImportError:
-                print("Ошибка: Модуль summarizer.py не найден. Пропускаем саммаризацию.")
-            except Exception as e:
-                print(f"Ошибка при саммаризации: {e}")
-        
-        print(f"\n✓ Готово! Результаты сохранены в папке: {output_folder}")
-    else:
-        print("Ошибка при скачивании файла.")
+    batch_mode = len(jobs) > 1
+
+    # Проба заголовков: отклонение пустых и битых файлов, сначала - самые длинные
+    runnable = jobs if args.resume or args.no_probe else probe_jobs(jobs)
+    if not runnable:
+        if batch_mode:
+            print_report(jobs)
+        sys.exit(1)
+
+    if batch_mode:
+        total = sum(job.expected_duration or 0 for job in runnable)
+        duration = f", общая длительность: ~{format_duration(total)}" if total else ""
+        print(f"Найдено файлов: {len(jobs)}{duration}, одновременно загружаются: "
+              f"{args.jobs or f'подбирается по ответам сервера (до {AUTO_MAX_JOBS})'}")
+
+    # Один клиент (и пул соединений) на весь запуск
+    client, upload_workers = open_asr_client(args, token)
+
+    cache = None if args.no_cache else ResultCache()
+    ctx = RunContext(args, token, client, cache, journal)
+
+    # Каталог промптов загружается в фоне, параллельно с загрузкой аудио
+    if args.summarize or any(job.options and job.options.summarize for job in runnable):
+        ctx.prompt_manager.prefetch()
+
+    # Все вопросы - до первой загрузки
+    plan_run(runnable, args, ctx)
+
+    # Конвейер: у каждого этапа свой лимит параллельности (ASR и LLM имеют разную емкость).
+    # Ожидание статуса не нагружает сервер (опрос общий), поэтому там лимит - число файлов.
+    pipeline = Pipeline([
+        Stage("upload", lambda job: stage_upload(job, ctx), concurrency=upload_workers),
+        Stage("poll", lambda job: stage_poll(job, ctx), concurrency=min(len(runnable), MAX_POLL_WORKERS)),
+        Stage("download", lambda job: stage_download(job, ctx), concurrency=args.download_jobs),
+        Stage("summarize", lambda job: stage_summarize(job, ctx), concurrency=args.summarize_jobs),
+        Stage("write", lambda job: stage_write(job, ctx), concurrency=1),
+    ])
+    pipeline.run(runnable)
+
+    if batch_mode:
+        print_report(jobs)
+    report_limits()
+    report_backends(client, ctx._sum_client)
+    if args.report_json:
+        write_report_json(jobs, args.report_json)
+
+    if any(job.status != "ok" for job in jobs):
         sys.exit(1)
 
 if __name__ == "__main__":
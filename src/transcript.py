@@ -0,0 +1,210 @@
+"""
+Потоковое чтение транскрипции (_text.json) для саммаризации.
+
+Файл не загружается целиком через json.load: сегменты разбираются по
+одному из буфера, который подчитывается по мере разбора, поэтому в памяти
+одновременно находятся только буфер чтения, текущий сегмент и итоговый
+текст. Поддерживаются ответы ASR в виде списка сегментов, словаря с
+ключом segments и словаря с полем text.
+
+Для модели текст собирается по репликам: подряд идущие сегменты одного
+диктора объединяются в строку "SPEAKER_00: текст". Строка - это реплика,
+поэтому саммаризация по частям (mapreduce.split_transcript) не разрывает
+реплики между фрагментами.
+"""
+import io
+import json
+from pathlib import Path
+
+# Сколько символов читать из файла за раз
+READ_CHUNK = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class _Stream:
+    """Текст JSON-файла, который подчитывается по мере разбора."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self, size=READ_CHUNK):
+        # Разобранное начало буфера больше не нужно
+        if self.pos > READ_CHUNK and self.pos * 2 > len(self.buffer):
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        data = self.f.read(size)
+        if data:
+            self.buffer += data
+        else:
+            self.eof = True
+        return bool(data)
+
+    def peek(self):
+        """Следующий значащий символ ("" в конце файла)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"ожидался символ '{char}', найден '{found or 'конец файла'}'")
+        self.pos += 1
+
+    def value(self):
+        """Следующее JSON-значение целиком."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # Число в конце буфера могло быть прочитано не полностью
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Значение не поместилось в буфер: читаем вдвое больше, чтобы
+            # длинное значение разбиралось за линейное время
+            self._read(max(READ_CHUNK, len(self.buffer) - self.pos))
+
+    def array(self):
+        """Элементы массива по одному (открывающая скобка уже прочитана)."""
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"ожидался символ ',' или ']', найден '{char or 'конец файла'}'")
+
+
+def _as_segment(item):
+    if isinstance(item, dict):
+        return item
+    if isinstance(item, str):
+        return {"text": item}
+    return None
+
+
+def _object_segments(stream):
+    """Сегменты из словаря: ключ segments, иначе поле text одним сегментом."""
+    stream.expect("{")
+    text = None
+    found = False
+    if stream.peek() == "}":
+        stream.pos += 1
+        return
+    while True:
+        key = stream.value()
+        if not isinstance(key, str):
+            raise ValueError("ключ объекта должен быть строкой")
+        stream.expect(":")
+        if key == "segments" and stream.peek() == "[":
+            stream.pos += 1
+            for item in stream.array():
+                segment = _as_segment(item)
+                if segment is not None:
+                    found = True
+                    yield segment
+        else:
+            value = stream.value()
+            if key == "text" and isinstance(value, str):
+                text = value
+        char = stream.peek()
+        stream.pos += 1
+        if char == "}":
+            break
+        if char != ",":
+            raise ValueError(f"ожидался символ ',' или '}}', найден '{char or 'конец файла'}'")
+    if not found and text is not None:
+        yield {"text": text}
+
+
+def iter_segments(path):
+    """
+    Сегменты транскрипции по одному, без загрузки всего файла.
+    ValueError - файл не является JSON-транскрипцией.
+    """
+    with open(path, "r", encoding="utf-8-sig") as f:
+        stream = _Stream(f)
+        char = stream.peek()
+        if char == "[":
+            stream.pos += 1
+            for item in stream.array():
+                segment = _as_segment(item)
+                if segment is not None:
+                    yield segment
+        elif char == "{":
+            yield from _object_segments(stream)
+        else:
+            segment = _as_segment(stream.value())
+            if segment is not None:
+                yield segment
+        if stream.peek():
+            raise ValueError("после JSON в файле есть лишние данные")
+
+
+def iter_turns(segments):
+    """Реплики (диктор или None, текст): подряд идущие сегменты одного диктора объединяются."""
+    speaker = None
+    parts = []
+    for segment in segments:
+        text = str(segment.get("text") or "").strip()
+        if not text:
+            continue
+        current = segment.get("speaker")
+        if parts and current != speaker:
+            yield speaker, " ".join(parts)
+            parts = []
+        speaker = current
+        parts.append(text)
+    if parts:
+        yield speaker, " ".join(parts)
+
+
+def read_transcript_text(path, speakers=True):
+    """
+    Текст транскрипции для модели: реплика на строку, с префиксом диктора
+    (если он есть в сегментах и speakers=True). ValueError - не JSON.
+    """
+    out = io.StringIO()
+    for speaker, text in iter_turns(iter_segments(path)):
+        if out.tell():
+            out.write("\n")
+        if speakers and speaker is not None:
+            out.write(f"{speaker}: ")
+        out.write(text)
+    return out.getvalue()
+
+
+def read_summary_input(path):
+    """
+    Текст для саммаризации из файла: JSON-транскрипция собирается по
+    репликам, любой другой файл читается как есть.
+    Возвращает tuple (текст, True если файл - JSON-транскрипция).
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8-sig") as f:
+        head = f.read(4096).lstrip()
+    if head[:1] in ("[", "{") or path.suffix.lower() == ".json":
+        try:
+            return read_transcript_text(path), True
+        except ValueError:
+            # Например, текстовая расшифровка с метками "[00:00] ..."
+            pass
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return f.read(), False
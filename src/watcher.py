@@ -0,0 +1,301 @@
+"""
+Наблюдение за папкой входящих записей (transcribe --watch).
+
+Новые аудиофайлы замечаются через inotify (Linux, через ctypes - без
+внешних зависимостей), в остальных случаях - опросом папки. Файл отдается
+в обработку, только когда запись в него закончилась: в течение settle
+секунд не было событий изменения (при опросе - не менялись размер и время
+изменения). Пустые файлы (заготовка браузера до начала скачивания) ждут
+дальше.
+
+inotify видит только изменения, сделанные на этой машине: для сетевых
+папок (NFS, SMB), куда файлы пишут другие компьютеры, нужен опрос
+(--watch-poll).
+
+Обработанные файлы запоминаются в индексе (~/.asr_watch_index.json) по
+устройству, inode, размеру и времени изменения, поэтому файл, оставленный
+на месте (--keep-original) или переименованный при нормализации имени, не
+обрабатывается повторно - в том числе после перезапуска. Измененный файл
+(другой размер или время изменения) считается новым.
+"""
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import config
+from batch import AUDIO_EXTENSIONS
+
+# Сколько секунд файл не должен меняться, чтобы считаться записанным
+WATCH_SETTLE_SECONDS = 10
+# Интервал опроса папки без inotify
+WATCH_POLL_INTERVAL = 2.0
+# Через сколько дней забывать записи индекса
+INDEX_RETENTION_DAYS = 90
+
+# Флаги inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def file_identity(stat_result):
+    """Ключ файла в индексе: не меняется при переименовании, меняется при изменении содержимого."""
+    return f"{stat_result.st_dev}:{stat_result.st_ino}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+
+
+def is_candidate(name):
+    """Аудиофайл, который стоит отслеживать (скрытые и временные .part/.crdownload - нет)."""
+    return not name.startswith(".") and Path(name).suffix.lower() in AUDIO_EXTENSIONS
+
+
+class WatchIndex:
+    """
+    Индекс обработанных файлов на диске и набор файлов, которые
+    обрабатываются сейчас. Потокобезопасен: записи добавляются из потоков
+    конвейера.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or config.WATCH_INDEX_FILE)
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, ValueError, AttributeError):
+            self.files = {}
+        cutoff = time.time() - INDEX_RETENTION_DAYS * 86400
+        self.files = {key: entry for key, entry in self.files.items() if entry.get("finished", 0) >= cutoff}
+
+    def claim(self, identity):
+        """Берет файл в работу; False, если он уже обработан или обрабатывается."""
+        with self._lock:
+            if identity in self.files or identity in self._in_flight:
+                return False
+            self._in_flight.add(identity)
+            return True
+
+    def record(self, identity, path, status, error=None):
+        """Запоминает результат обработки файла (в том числе ошибку: повтор - после изменения файла)."""
+        with self._lock:
+            self._in_flight.discard(identity)
+            self.files[identity] = {"path": str(path), "status": status, "error": error, "finished": time.time()}
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.files}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Предупреждение: Не удалось сохранить индекс {self.path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+
+class _InotifySource:
+    """События inotify для одной папки."""
+
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1: {os.strerror(error)}")
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), self.MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch: {os.strerror(error)}")
+
+    def wait(self, timeout):
+        """(имена измененных файлов, нужно ли пересканировать папку) за время не больше timeout."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set(), False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set(), False
+        names, rescan = set(), False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].split(b"\0", 1)[0]
+            offset += _EVENT_HEADER.size + length
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                raise FileNotFoundError("папка удалена или перемещена")
+            if mask & IN_Q_OVERFLOW:
+                # Очередь событий переполнена - часть изменений потеряна
+                rescan = True
+            elif name and not mask & IN_ISDIR:
+                names.add(os.fsdecode(name))
+        return names, rescan
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Pending:
+    def __init__(self, signature, changed, first_seen):
+        self.signature = signature
+        self.changed = changed
+        self.first_seen = first_seen
+
+
+class FolderWatcher:
+    """
+    Отдает новые аудиофайлы папки (без вложенных папок), когда запись в
+    них закончилась. skip(identity) -> True пропускает уже известные файлы.
+    """
+
+    def __init__(self, directory, settle=WATCH_SETTLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL,
+                 use_inotify=True, skip=None):
+        self.directory = Path(directory)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.skip = skip or (lambda identity: False)
+        self.source = None
+        self.fallback_reason = None
+        if not use_inotify:
+            self.fallback_reason = "выбран опрос (--watch-poll)"
+        elif not sys.platform.startswith("linux"):
+            self.fallback_reason = "inotify есть только в Linux"
+        else:
+            try:
+                self.source = _InotifySource(self.directory)
+            except (OSError, AttributeError) as e:
+                # AttributeError: в libc нет функций inotify
+                self.fallback_reason = f"inotify недоступен: {e}"
+        self._pending = {}
+        # Файлы, уже отданные или пропущенные: имя -> (размер, время изменения)
+        self._seen = {}
+        self._stopped = threading.Event()
+
+    @property
+    def mode(self):
+        return "inotify" if self.source is not None else f"опрос каждые {self.poll_interval:g} с"
+
+    def stop(self):
+        self._stopped.set()
+
+    def _scan(self, startup=False):
+        """Обход папки. При опросе изменения определяются по размеру и времени изменения."""
+        now = time.monotonic()
+        for entry in os.scandir(self.directory):
+            if not is_candidate(entry.name):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._seen.get(entry.name) == signature:
+                continue
+            pending = self._pending.get(entry.name)
+            if pending is None:
+                # Файл, который не менялся settle секунд до запуска, готов сразу
+                old = startup and time.time() - stat.st_mtime >= self.settle
+                self._pending[entry.name] = _Pending(signature, now - self.settle if old else now, time.time())
+            elif pending.signature != signature:
+                pending.signature = signature
+                pending.changed = now
+
+    def _touch(self, name):
+        """Событие inotify: файл изменился только что."""
+        self._seen.pop(name, None)
+        pending = self._pending.get(name)
+        if pending is None:
+            self._pending[name] = _Pending(None, time.monotonic(), time.time())
+        else:
+            pending.changed = time.monotonic()
+
+    def _ready(self):
+        """Файлы, запись в которые закончилась: [(путь, ключ индекса, время появления)]."""
+        now = time.monotonic()
+        ready = []
+        for name, pending in list(self._pending.items()):
+            if now - pending.changed < self.settle:
+                continue
+            path = self.directory / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self._pending[name]
+                self._seen.pop(name, None)
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if pending.signature is not None and signature != pending.signature:
+                pending.signature = signature
+                pending.changed = now
+                continue
+            if stat.st_size == 0:
+                # Пустая заготовка: ждем, пока в файл начнут писать
+                pending.signature = signature
+                pending.changed = now
+                continue
+            del self._pending[name]
+            self._seen[name] = signature
+            identity = file_identity(stat)
+            if not self.skip(identity):
+                ready.append((path, identity, pending.first_seen))
+        return ready
+
+    def _timeout(self):
+        """Сколько ждать событий до следующей проверки."""
+        limit = self.poll_interval if self.source is None else 1.0
+        if not self._pending:
+            return limit
+        now = time.monotonic()
+        nearest = min(pending.changed for pending in self._pending.values()) + self.settle
+        return max(0.05, min(limit, nearest - now))
+
+    def files(self):
+        """
+        Генератор готовых файлов: (путь, ключ индекса, время появления).
+        Работает до stop(); OSError - папка недоступна.
+        """
+        try:
+            self._scan(startup=True)
+            while not self._stopped.is_set():
+                yield from self._ready()
+                timeout = self._timeout()
+                if self.source is None:
+                    if self._stopped.wait(timeout):
+                        break
+                    self._scan()
+                    continue
+                names, rescan = self.source.wait(timeout)
+                for name in names:
+                    if is_candidate(name):
+                        self._touch(name)
+                if rescan:
+                    self._scan()
+        finally:
+            if self.source is not None:
+                self.source.close()
+                self.source = None